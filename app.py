@@ -1,18 +1,24 @@
 import streamlit as st
-import cv2
 import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
-import io
-import base64
 import os
+import uuid
 
-# Import custom modules
-from path_extraction import extract_paths_from_sketch, visualize_paths
+# Import custom modules (heavy libraries inside them load on first use)
+from lazy_imports import lazy_import, warm_up
+from path_extraction import extract_paths_from_sketch, visualize_paths, paths_from_shapes, IncrementalExtractor
 from krl_generator import KRLGenerator
 from file_utils import get_download_link, create_zip_download
 from drawing_canvas import DrawingCanvas
 from path_visualization import visualize_robot_path, get_visualization_as_image, overlay_path_on_image
+from session_store import get_image_store
+from cpu_governor import get_governor
+from color_layers import LAYER_PALETTE, LAYER_TOOLS, extract_color_layers, flatten_layers
+from variant_explorer import explore_variants
+from conversion import MOTION_TYPES, START_POSITIONS
+from progressive import PREVIEW_MAX_SIDE, extract_preview, downscale_image, RefinementJob
+from auto_tune import extract_paths_auto
+
+cv2 = lazy_import("cv2")
 
 # Set page configuration
 st.set_page_config(
@@ -21,6 +27,15 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def start_warm_up():
+    """Preload heavy libraries once per server process in the background"""
+    return warm_up(background=True)
+
+# Optional warm-up so the first upload doesn't pay the import cost
+if os.environ.get("SKETCH_TO_KRL_WARMUP", "").lower() in ("1", "true", "yes"):
+    start_warm_up()
+
 # App title and description
 st.title("Sketch-to-KRL Code Generator")
 st.markdown("""
@@ -28,8 +43,8 @@ Upload or draw a sketch of robot paths, and this app will help you generate KUKA
 """)
 
 # Global variables to store app state
-if 'processed_image' not in st.session_state:
-    st.session_state.processed_image = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if 'extracted_paths' not in st.session_state:
     st.session_state.extracted_paths = None
 if 'current_step' not in st.session_state:
@@ -50,12 +65,85 @@ if 'extract_dimensions' not in st.session_state:
     st.session_state.extract_dimensions = False
 if 'path_simplification' not in st.session_state:
     st.session_state.path_simplification = 50
-if 'original_image' not in st.session_state:
-    st.session_state.original_image = None
+if 'dedupe_tolerance' not in st.session_state:
+    st.session_state.dedupe_tolerance = None
+if 'vector_shapes' not in st.session_state:
+    st.session_state.vector_shapes = None
+if 'cpu_wait' not in st.session_state:
+    st.session_state.cpu_wait = None
+if 'color_layers' not in st.session_state:
+    st.session_state.color_layers = None
+if 'variants' not in st.session_state:
+    st.session_state.variants = None
+if 'upload_key' not in st.session_state:
+    st.session_state.upload_key = None
+if 'refinement' not in st.session_state:
+    st.session_state.refinement = None
+if 'extraction_params' not in st.session_state:
+    st.session_state.extraction_params = None
+
+# Large images live in the shared compressed store instead of session state
+image_store = get_image_store()
+
+def store_image(key, image):
+    """Keep an image for this session in the shared image store"""
+    image_store.put(st.session_state.session_id, key, image)
+
+def load_image(key):
+    """Decode an image of this session (None if missing or evicted)"""
+    return image_store.get(st.session_state.session_id, key)
+
+# Heavy OpenCV/Matplotlib calls share the cores fairly across sessions
+governor = get_governor()
+
+def governed(func, *args, **kwargs):
+    """Run a heavy call inside a CPU slot and remember how long it queued"""
+    result, ticket = governor.run(st.session_state.session_id, func, *args, **kwargs)
+    st.session_state.cpu_wait = ticket.wait_time
+    return result
+
+# Large images are shown downscaled; the browser cannot display more anyway
+DISPLAY_MAX_SIDE = 1024
+
+# Longest wait for a background refinement before the page reruns to check on it
+REFINEMENT_POLL_SECONDS = 1.0
+
+def show_image(image, **kwargs):
+    """Display an image, downscaled to keep the page light"""
+    st.image(downscale_image(image, DISPLAY_MAX_SIDE)[0], **kwargs)
+
+def cancel_refinement():
+    """Stop a pending full-resolution extraction that is no longer wanted"""
+    if st.session_state.refinement is not None:
+        st.session_state.refinement.cancel()
+        st.session_state.refinement = None
+    st.session_state.upload_key = None
+
+def apply_refinement(wait=False):
+    """Replace the preview with the full-resolution result once it is ready"""
+    job = st.session_state.refinement
+    if job is None or (not wait and not job.done()):
+        return
+    st.session_state.refinement = None
+    try:
+        result = job.result()
+    except Exception as e:
+        # The preview paths are still usable, just less precise
+        st.warning(f"Full-resolution extraction failed, keeping the preview paths: {e}")
+        return
+    if result is None:
+        return
+    if job.ticket is not None:
+        st.session_state.cpu_wait = job.ticket.wait_time
+    processed_image, paths = result
+    store_image("processed_image", processed_image)
+    st.session_state.extracted_paths = paths
+    st.session_state.variants = None
 
 # Function to reset app state
 def reset_app():
-    st.session_state.processed_image = None
+    cancel_refinement()
+    image_store.drop_session(st.session_state.session_id)
     st.session_state.extracted_paths = None
     st.session_state.current_step = "upload"
     st.session_state.start_position = "HOME"
@@ -66,7 +154,11 @@ def reset_app():
     st.session_state.path_smoothing = False
     st.session_state.extract_dimensions = False
     st.session_state.path_simplification = 50
-    st.session_state.original_image = None
+    st.session_state.dedupe_tolerance = None
+    st.session_state.vector_shapes = None
+    st.session_state.color_layers = None
+    st.session_state.variants = None
+    st.session_state.extraction_params = None
 
 # Main app logic based on current step
 if st.session_state.current_step == "upload":
@@ -77,23 +169,87 @@ if st.session_state.current_step == "upload":
         st.header("Upload Sketch")
         uploaded_file = st.file_uploader("Choose an image file", type=["jpg", "jpeg", "png"])
         
-        if uploaded_file is not None:
-            # Read and process the uploaded image
-            file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-            image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-            
-            # Store original image
-            st.session_state.original_image = image.copy()
-            
-            # Process the sketch
-            processed_image, paths = extract_paths_from_sketch(image)
+        with st.expander("Extraction options"):
+            join_strokes = st.checkbox(
+                "Join fragmented strokes",
+                value=False,
+                help="Merge stroke pieces separated by small gaps into longer paths"
+            )
+            join_gap = st.slider("Largest gap to bridge (px)", 2, 30, 8, disabled=not join_strokes)
+            separate_layers = st.checkbox(
+                "Separate color layers",
+                value=False,
+                help="Black, red, green and blue strokes become separate sub-programs, each with its own tool"
+            )
+            progressive = st.checkbox(
+                "Quick preview for large images",
+                value=True,
+                help="Show paths from a downscaled copy first and refine them at full resolution in the background"
+            )
+            tune_extraction = st.checkbox(
+                "Auto-tune extraction parameters",
+                value=False,
+                help="Try many blur and threshold settings on a small copy and extract with the best one",
+                disabled=separate_layers
+            )
+        
+        if uploaded_file is None:
+            cancel_refinement()
+        else:
+            # Only process the image again when the file or the options change
+            upload_key = (uploaded_file.file_id, join_strokes, join_gap, separate_layers, progressive, tune_extraction)
+            if st.session_state.upload_key != upload_key:
+                cancel_refinement()
+                
+                # Read and process the uploaded image
+                file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
+                image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+                
+                # Store original image
+                store_image("original_image", image)
+                
+                # Process the sketch
+                layers = None
+                params = None
+                if separate_layers:
+                    processed_image, layers = governed(
+                        extract_color_layers, image, LAYER_PALETTE, True, join_strokes, join_gap
+                    )
+                    paths = flatten_layers(layers)
+                elif tune_extraction:
+                    # The tuning pool only uses the cores this CPU slot is entitled to
+                    processed_image, paths, params = governed(
+                        extract_paths_auto, image, join_strokes, join_gap, max_workers=governor.threads_per_job
+                    )
+                elif progressive and max(image.shape[:2]) > PREVIEW_MAX_SIDE:
+                    processed_image, paths = governed(extract_preview, image, PREVIEW_MAX_SIDE, join_strokes, join_gap)
+                    st.session_state.refinement = RefinementJob(
+                        upload_key, st.session_state.session_id, image, join_strokes, join_gap
+                    )
+                else:
+                    processed_image, paths = governed(extract_paths_from_sketch, image, join_strokes, join_gap)
+                
+                # Store in session state
+                store_image("processed_image", processed_image)
+                st.session_state.extracted_paths = paths
+                st.session_state.variants = None
+                st.session_state.color_layers = layers
+                st.session_state.extraction_params = params
+                st.session_state.vector_shapes = None
+                st.session_state.upload_key = upload_key
             
-            # Store in session state
-            st.session_state.processed_image = processed_image
-            st.session_state.extracted_paths = paths
+            apply_refinement()
             
             # Display the processed image
-            st.image(processed_image, caption="Processed Sketch", use_column_width=True)
+            processed_image = load_image("processed_image")
+            if st.session_state.refinement is not None:
+                show_image(processed_image, caption="Preview (refining at full resolution...)", use_column_width=True)
+            elif processed_image is not None:
+                show_image(processed_image, caption="Processed Sketch", use_column_width=True)
+            if st.session_state.extraction_params:
+                st.caption("Tuned parameters: " + ", ".join(
+                    f"{name.replace('_', ' ')} {value}" for name, value in st.session_state.extraction_params.items()
+                ))
             
             # Move to the next step
             if st.button("Continue with this sketch"):
@@ -103,29 +259,80 @@ if st.session_state.current_step == "upload":
     with col2:
         st.header("Draw Sketch")
         
+        use_vectors = st.checkbox(
+            "Use exact shape geometry (skip image processing)",
+            value=True,
+            help="Lines and rectangles become LIN moves and circles become CIRC moves"
+        )
+        canvas_layers = st.checkbox(
+            "Separate color layers",
+            value=False,
+            disabled=use_vectors,
+            key="canvas_layers",
+            help="Each pen color becomes its own sub-program with its own tool"
+        ) and not use_vectors
+        
         # Create drawing canvas
         canvas = DrawingCanvas(width=500, height=500)
         drawn_image = canvas.render()
         
+        # Every drawing operation is recorded as a shape, so without shapes the canvas is blank
+        canvas_paths = []
+        if not use_vectors and not canvas_layers:
+            # Keep the extracted paths current, re-processing only the edited region
+            if 'canvas_extractor' not in st.session_state:
+                st.session_state.canvas_extractor = IncrementalExtractor()
+            canvas_paths = governed(st.session_state.canvas_extractor.sync_canvas, canvas.buffer)
+            # Remember that the dirty regions were consumed
+            canvas.save()
+            st.caption(f"{len(canvas_paths)} path(s) extracted from the drawing")
+        
         if drawn_image is not None:
+            # The drawing replaces any uploaded image still being refined
+            cancel_refinement()
+            
             # Store original image
-            st.session_state.original_image = drawn_image.copy()
+            store_image("original_image", drawn_image)
             
-            # Process the drawn image
-            processed_image, paths = extract_paths_from_sketch(drawn_image)
+            shapes = canvas.get_drawing_shapes()
+            st.session_state.color_layers = None
+            st.session_state.extraction_params = None
+            if use_vectors and shapes:
+                # Use the recorded primitives directly
+                paths = paths_from_shapes(shapes)
+                processed_image = visualize_paths(drawn_image, paths)
+                st.session_state.vector_shapes = list(shapes)
+            elif canvas_layers:
+                # The canvas buffer is RGB
+                processed_image, layers = governed(extract_color_layers, drawn_image, LAYER_PALETTE, False)
+                paths = flatten_layers(layers)
+                st.session_state.color_layers = layers
+                st.session_state.vector_shapes = None
+            else:
+                # The incremental extractor is already up to date with the drawing
+                paths = list(canvas_paths)
+                processed_image = visualize_paths(drawn_image, paths)
+                st.session_state.vector_shapes = None
             
             # Store in session state
-            st.session_state.processed_image = processed_image
+            store_image("processed_image", processed_image)
             st.session_state.extracted_paths = paths
+            st.session_state.variants = None
             
             # Move to the next step
             st.session_state.current_step = "qa"
             st.experimental_rerun()
 
 elif st.session_state.current_step == "qa":
+    apply_refinement()
+    
     # Display the processed image
-    if st.session_state.processed_image is not None:
-        st.image(st.session_state.processed_image, caption="Processed Sketch", width=400)
+    processed_image = load_image("processed_image")
+    if processed_image is not None:
+        show_image(processed_image, caption="Processed Sketch", width=400)
+    if st.session_state.refinement is not None:
+        st.info("Showing preview paths. The full-resolution paths replace them when ready "
+                "and are always used for code generation.")
     
     # Q&A section
     st.header("Configure Robot Path")
@@ -133,14 +340,25 @@ elif st.session_state.current_step == "qa":
     # Start position
     st.session_state.start_position = st.radio(
         "Select start position:",
-        ["HOME", "Anywhere"]
+        START_POSITIONS,
+        index=START_POSITIONS.index(st.session_state.start_position)
     )
     
+    if st.session_state.color_layers:
+        st.info("Each color layer becomes its own sub-program: " + ", ".join(
+            f"{name} (tool {LAYER_TOOLS[name]}, {len(paths)} paths)"
+            for name, paths in st.session_state.color_layers.items()
+        ))
+    
+    if st.session_state.vector_shapes:
+        st.info("Canvas shapes are converted directly: lines and rectangles as LIN, circles as CIRC. "
+                "The motion type selection below is not used.")
+    
     # Motion types
     motion_options = st.multiselect(
         "Select motion type(s):",
-        ["LIN", "PTP", "CIRC", "SPLINE"],
-        default=["LIN"]
+        MOTION_TYPES,
+        default=st.session_state.motion_types
     )
     
     if motion_options:
@@ -149,7 +367,7 @@ elif st.session_state.current_step == "qa":
     # Use coordinates
     st.session_state.use_coordinates = st.checkbox(
         "Use exact coordinates from sketch",
-        value=False
+        value=st.session_state.use_coordinates
     )
     
     # Additional clarifications
@@ -157,6 +375,64 @@ elif st.session_state.current_step == "qa":
         st.session_state.path_smoothing = st.checkbox("Enable path smoothing", value=False)
         st.session_state.extract_dimensions = st.checkbox("Extract dimensions from sketch", value=False)
         st.session_state.path_simplification = st.slider("Path simplification", 0, 100, 50)
+        merge_points = st.checkbox(
+            "Merge duplicate points",
+            value=st.session_state.dedupe_tolerance is not None,
+            help="Points closer than the tolerance share one declaration in the .dat file"
+        )
+        merge_tolerance = st.slider(
+            "Merge tolerance (px)", 0.0, 10.0,
+            st.session_state.dedupe_tolerance if st.session_state.dedupe_tolerance is not None else 1.0,
+            0.5, disabled=not merge_points
+        )
+        st.session_state.dedupe_tolerance = merge_tolerance if merge_points else None
+    
+    # Generate every option combination side by side instead of regenerating by hand
+    if not st.session_state.vector_shapes:
+        with st.expander("Explore variants"):
+            if st.button("Rank option combinations"):
+                with st.spinner("Generating variants..."):
+                    apply_refinement(wait=True)
+                    # The pool only uses the cores this CPU slot is entitled to
+                    st.session_state.variants = governed(
+                        explore_variants,
+                        st.session_state.extracted_paths,
+                        None,
+                        st.session_state.color_layers,
+                        governor.threads_per_job
+                    )
+            
+            if st.session_state.variants:
+                st.dataframe(
+                    [
+                        {
+                            "Rank": variant["rank"],
+                            "Motion types": ", ".join(variant["motion_types"]),
+                            "Start": variant["start_position"],
+                            "Merge (px)": variant["dedupe_tolerance"],
+                            "Points": variant["points"],
+                            "DAT bytes": variant["dat_bytes"],
+                            "Path length (px)": round(variant["path_length"]),
+                            "PTP share": f"{variant['ptp_share']:.0%}",
+                            "Missed points": variant["missed_points"],
+                            "Score": variant["score"]
+                        }
+                        for variant in st.session_state.variants
+                    ],
+                    hide_index=True,
+                    use_container_width=True
+                )
+                st.caption(
+                    "Points, DAT size and path length are relative to the best variant and the PTP share is "
+                    "added; 3.0 is best on all of them. Variants that miss source points rank last."
+                )
+                
+                if st.button("Use best variant"):
+                    best = st.session_state.variants[0]
+                    st.session_state.start_position = best["start_position"]
+                    st.session_state.motion_types = list(best["motion_types"])
+                    st.session_state.dedupe_tolerance = best["dedupe_tolerance"]
+                    st.experimental_rerun()
     
     # Navigation buttons
     col1, col2 = st.columns(2)
@@ -166,16 +442,34 @@ elif st.session_state.current_step == "qa":
             st.experimental_rerun()
     with col2:
         if st.button("Generate KRL Code"):
+            # Generate from the full-resolution paths, not the preview
+            if st.session_state.refinement is not None:
+                with st.spinner("Finishing full-resolution extraction..."):
+                    apply_refinement(wait=True)
+            
             # Create KRL generator
-            krl_gen = KRLGenerator()
+            krl_gen = KRLGenerator(dedupe_tolerance=st.session_state.dedupe_tolerance)
             
             # Generate KRL code
-            src_code = krl_gen.generate_src_code(
-                st.session_state.extracted_paths,
-                st.session_state.start_position,
-                st.session_state.motion_types,
-                st.session_state.use_coordinates
-            )
+            if st.session_state.vector_shapes:
+                src_code = krl_gen.generate_src_code_from_shapes(
+                    st.session_state.vector_shapes,
+                    st.session_state.start_position
+                )
+            elif st.session_state.color_layers:
+                src_code = krl_gen.generate_layered_src_code(
+                    st.session_state.color_layers,
+                    st.session_state.start_position,
+                    st.session_state.motion_types,
+                    LAYER_TOOLS
+                )
+            else:
+                src_code = krl_gen.generate_src_code(
+                    st.session_state.extracted_paths,
+                    st.session_state.start_position,
+                    st.session_state.motion_types,
+                    st.session_state.use_coordinates
+                )
             
             # Generate DAT code
             dat_code = krl_gen.generate_dat_code(st.session_state.use_coordinates)
@@ -201,7 +495,8 @@ elif st.session_state.current_step == "output":
         with viz_tab1:
             # Create 2D visualization
             if st.session_state.extracted_paths:
-                fig = visualize_robot_path(
+                fig = governed(
+                    visualize_robot_path,
                     st.session_state.extracted_paths,
                     st.session_state.motion_types
                 )
@@ -209,9 +504,11 @@ elif st.session_state.current_step == "output":
         
         with viz_tab2:
             # Create overlay visualization
-            if st.session_state.original_image is not None and st.session_state.extracted_paths:
-                overlay_image = overlay_path_on_image(
-                    st.session_state.original_image,
+            original_image = load_image("original_image")
+            if original_image is not None and st.session_state.extracted_paths:
+                overlay_image = governed(
+                    overlay_path_on_image,
+                    original_image,
                     st.session_state.extracted_paths,
                     st.session_state.motion_types
                 )
@@ -304,7 +601,30 @@ with st.sidebar:
         ```
         """)
     
+    # Report image memory held for this session and the whole server
+    session_memory = image_store.session_stats(st.session_state.session_id)
+    store_memory = image_store.stats()
+    st.caption(
+        f"Image memory: {session_memory['bytes'] / 1024:.0f} KB this session, "
+        f"{store_memory['bytes'] / (1024 * 1024):.1f} of "
+        f"{store_memory['global_budget_bytes'] / (1024 * 1024):.0f} MB in use"
+    )
+    
+    # Report how long this session queued for CPU and the server-wide tail
+    cpu_stats = governor.stats()
+    last_wait = st.session_state.cpu_wait
+    last_wait_text = f"last wait {last_wait * 1000:.0f} ms, " if last_wait is not None else ""
+    st.caption(
+        f"CPU queue: {last_wait_text}p99 wait {cpu_stats['wait_ms']['p99']:.0f} ms, "
+        f"{cpu_stats['running']}/{cpu_stats['max_jobs']} slots busy, {cpu_stats['queued']} waiting"
+    )
+    
     # Add a reset button
     if st.button("Reset Application"):
         reset_app()
-        st.experimental_rerun()
\ No newline at end of file
+        st.experimental_rerun()
+
+# Check back on a background refinement so the full-resolution paths replace the preview by themselves
+if st.session_state.refinement is not None:
+    st.session_state.refinement.wait(REFINEMENT_POLL_SECONDS)
+    st.experimental_rerun()
\ No newline at end of file
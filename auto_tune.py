@@ -0,0 +1,387 @@
+"""
+Automatic tuning of the extraction parameters per sketch
+
+Pencil sketches, marker drawings and photographed paper need different
+blur, threshold and filtering settings. A parameter grid is evaluated on a
+downscaled copy across a process pool, every candidate is scored on stroke
+continuity, fragment count and point count, and the winner is scaled back
+up and used for a single full-resolution extraction. Candidates are scored
+with the same stroke joining as that final extraction. Winners are cached
+by image fingerprint and tuning settings so the same sketch is never tuned
+twice with the same grid.
+
+Usage:
+    python auto_tune.py sketch.png --top 5
+    python auto_tune.py sketch.png --cache-dir .tune_cache --save sketch.skpaths [--join]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from path_extraction import (
+    extract_paths_from_sketch, binarize_sketch, skeletonize, find_skeleton_contours,
+    simplify_contours, extraction_params, join_paths, paths_from_arrays
+)
+from progressive import downscale_image
+from path_store import image_fingerprint, save_paths
+
+cv2 = lazy_import("cv2")
+
+# Longest side of the copy the grid is evaluated on
+TUNE_MAX_SIDE = 512
+
+# Candidate values, in pixels of the downscaled copy
+TUNE_GRID = {
+    "blur_kernel": (3, 5, 7),
+    "block_size": (11, 21, 31),
+    "threshold_c": (2, 5, 10),
+    "morph_iterations": (0, 1, 2),
+    "min_contour_points": (5, 10, 20)
+}
+
+# Weight of each term in a candidate's score (lower scores win)
+DEFAULT_SCORE_WEIGHTS = {
+    "continuity": 1.0,   # Stroke end points per skeleton pixel
+    "fragments": 1.0,    # Number of paths
+    "points": 0.5,       # Number of path vertices
+    "coverage": 2.0      # Deviation of the traced stroke length from the typical candidate
+}
+
+# Tuned parameters kept in memory, by cache_key
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def grid_candidates(grid=TUNE_GRID):
+    """
+    Expand a parameter grid into candidate parameter sets
+    
+    Args:
+        grid: Mapping of parameter name to candidate values
+    
+    Returns:
+        candidates: List of complete parameter dictionaries
+    """
+    names = list(grid)
+    return [extraction_params(dict(zip(names, values))) for values in product(*(grid[name] for name in names))]
+
+def _group_by_binarization(candidates):
+    """Group candidates that differ only in min_contour_points"""
+    groups = OrderedDict()
+    for params in candidates:
+        key = tuple((name, value) for name, value in sorted(params.items()) if name != "min_contour_points")
+        groups.setdefault(key, []).append(params)
+    return list(groups.values())
+
+def evaluate_candidates(image, candidates, join_strokes=False, join_gap=8.0):
+    """
+    Extract with every candidate and measure the result
+    
+    Candidates that differ only in min_contour_points share one
+    binarization and thinning pass (and, when joining, one join).
+    
+    Args:
+        image: Input image as numpy array (BGR format)
+        candidates: List of complete parameter dictionaries
+        join_strokes: Measure the paths after joining fragmented strokes, as
+            extract_paths_from_sketch does with join_strokes
+        join_gap: Largest gap in pixels of this image bridged when joining
+    
+    Returns:
+        results: One dictionary per candidate with its "params" and the
+            "endpoint_density", "fragments", "points" and "stroke_length" metrics
+    """
+    kernel = np.ones((3, 3), np.float32)
+    results = []
+    for group in _group_by_binarization(candidates):
+        skeleton = skeletonize(binarize_sketch(image, group[0]))
+        on = (skeleton > 0).astype(np.uint8)
+        
+        # A stroke end is a skeleton pixel with exactly one neighbour
+        neighbours = cv2.filter2D(on, -1, kernel, borderType=cv2.BORDER_CONSTANT)
+        endpoints = int(np.count_nonzero(on & (neighbours == 2)))
+        skeleton_pixels = max(1, int(on.sum()))
+        
+        contours = find_skeleton_contours(skeleton)
+        lengths = np.array([len(contour) for contour in contours], dtype=np.int64)
+        
+        if join_strokes:
+            # Join once without a length limit; each candidate then drops what is too short for it
+            coords, offsets = simplify_contours(contours, min_points=0, open_strokes=True)
+            joined = join_paths(paths_from_arrays(coords, offsets), join_gap)
+            joined_lengths = np.array([
+                np.hypot(*np.diff(np.asarray(path, dtype=float), axis=0).T).sum() for path in joined
+            ])
+            vertices = np.array([len(path) for path in joined], dtype=np.int64)
+            for params in group:
+                kept = joined_lengths >= params["min_contour_points"]
+                results.append({
+                    "params": params,
+                    "endpoint_density": endpoints / skeleton_pixels,
+                    "fragments": int(kept.sum()),
+                    "points": int(vertices[kept].sum()),
+                    "stroke_length": int(round(joined_lengths[kept].sum()))
+                })
+            continue
+        
+        for params in group:
+            coords, offsets = simplify_contours(contours, min_points=params["min_contour_points"])
+            results.append({
+                "params": params,
+                "endpoint_density": endpoints / skeleton_pixels,
+                "fragments": len(offsets) - 1,
+                "points": len(coords),
+                "stroke_length": int(lengths[lengths > params["min_contour_points"]].sum())
+            })
+    return results
+
+def _evaluate_chunk(image, candidates, join_strokes, join_gap):
+    """Evaluate several candidates in one worker call so the image is sent once"""
+    return evaluate_candidates(image, candidates, join_strokes, join_gap)
+
+def _init_worker():
+    """Keep each worker process to one OpenCV thread so the pool uses exactly max_workers cores"""
+    cv2.setNumThreads(1)
+
+def rank_candidates(results, weights=None):
+    """
+    Score evaluated candidates, best first
+    
+    Every metric is divided by its median over the grid, so the score is
+    independent of the sketch's size and stroke density. The coverage term
+    penalizes candidates whose traced stroke length is far from the median
+    in either direction: thresholds that wipe out strokes and thresholds
+    that trace paper texture are both rejected.
+    
+    Args:
+        results: Evaluated candidates as returned by evaluate_candidates
+        weights: Mapping of score term to weight (defaults to DEFAULT_SCORE_WEIGHTS)
+    
+    Returns:
+        ranked: The results sorted by "score" (lower is better)
+    """
+    weights = weights or DEFAULT_SCORE_WEIGHTS
+    usable = [result for result in results if result["fragments"] > 0]
+    
+    def median(metric):
+        if not usable:
+            return 1.0
+        return float(np.median([result[metric] for result in usable])) or 1.0
+    
+    medians = {metric: median(metric) for metric in ("endpoint_density", "fragments", "points", "stroke_length")}
+    
+    for result in results:
+        if result["fragments"] == 0:
+            result["score"] = math.inf
+            continue
+        result["score"] = round(
+            weights["continuity"] * result["endpoint_density"] / medians["endpoint_density"]
+            + weights["fragments"] * result["fragments"] / medians["fragments"]
+            + weights["points"] * result["points"] / medians["points"]
+            + weights["coverage"] * abs(math.log(max(1, result["stroke_length"]) / medians["stroke_length"])),
+            4
+        )
+    
+    return sorted(results, key=lambda result: result["score"])
+
+def scale_params(params, factor):
+    """
+    Convert parameters tuned on a resized copy to another resolution
+    
+    Kernel and block sizes stay odd; closing iterations scale with the
+    stroke width but never drop to zero; the threshold offset is independent
+    of scale.
+    
+    Args:
+        params: Complete parameter dictionary
+        factor: Ratio of the target resolution to the tuning resolution
+    
+    Returns:
+        params: Scaled parameter dictionary
+    """
+    def odd(value, minimum):
+        value = max(minimum, int(round(value)))
+        return value if value % 2 else value + 1
+    
+    scaled = dict(params)
+    scaled["blur_kernel"] = odd(params["blur_kernel"] * factor, 1)
+    scaled["block_size"] = odd(params["block_size"] * factor, 3)
+    if params["morph_iterations"] > 0:
+        scaled["morph_iterations"] = max(1, int(round(params["morph_iterations"] * factor)))
+    scaled["min_contour_points"] = max(2, int(round(params["min_contour_points"] * factor)))
+    return scaled
+
+def cache_key(image, grid=TUNE_GRID, max_side=TUNE_MAX_SIDE, weights=None, join_strokes=False, join_gap=8.0):
+    """
+    Identify a tuning run by the image and every setting that affects its winner
+    
+    Args:
+        image: Input image as numpy array (BGR format)
+        grid: Mapping of parameter name to candidate values
+        max_side: Longest side of the copy the grid is evaluated on
+        weights: Mapping of score term to weight (None for DEFAULT_SCORE_WEIGHTS)
+        join_strokes: Whether candidates are scored after joining strokes
+        join_gap: Largest joined gap in full-resolution pixels (ignored without joining)
+    
+    Returns:
+        key: Hex digest usable as a file name
+    """
+    settings = json.dumps({
+        "grid": {name: list(values) for name, values in grid.items()},
+        "max_side": max_side,
+        "weights": weights or DEFAULT_SCORE_WEIGHTS,
+        "join_gap": float(join_gap) if join_strokes else None
+    }, sort_keys=True)
+    return hashlib.sha256((image_fingerprint(image) + settings).encode()).hexdigest()
+
+def _cache_get(key, cache_dir):
+    """Look up tuned parameters in memory, then on disk"""
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return dict(_cache[key])
+    
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, key + ".json")
+        if os.path.exists(cache_file):
+            with open(cache_file) as f:
+                params = json.load(f)
+            _cache_put(key, params, None)
+            return params
+    return None
+
+def _cache_put(key, params, cache_dir):
+    """Remember tuned parameters in memory and, if configured, on disk"""
+    with _cache_lock:
+        _cache[key] = dict(params)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, key + ".json"), "w") as f:
+            json.dump(params, f)
+
+def auto_tune(image, grid=TUNE_GRID, max_side=TUNE_MAX_SIDE, max_workers=None, weights=None, cache_dir=None,
+              join_strokes=False, join_gap=8.0):
+    """
+    Find the best extraction parameters for an image
+    
+    Args:
+        image: Input image as numpy array (BGR format)
+        grid: Mapping of parameter name to candidate values at tuning resolution
+        max_side: Longest side of the copy the grid is evaluated on
+        max_workers: Worker processes, each limited to one OpenCV thread
+            (defaults to the CPU count; callers holding a CPU governor slot
+            pass its threads_per_job)
+        weights: Mapping of score term to weight
+        cache_dir: Directory that persists tuned parameters across processes
+        join_strokes: Score candidates on joined strokes, for an extraction
+            that will join them
+        join_gap: Largest gap in full-resolution pixels bridged when joining
+    
+    Returns:
+        params: Parameters for the full-resolution image
+        ranked: Scored candidates at tuning resolution, best first
+            (empty when the parameters came from the cache)
+    """
+    key = cache_key(image, grid, max_side, weights, join_strokes, join_gap)
+    params = _cache_get(key, cache_dir)
+    if params is not None:
+        return params, []
+    
+    small_image, scale = downscale_image(image, max_side)
+    candidates = grid_candidates(grid)
+    small_gap = max(1.0, join_gap * scale)
+    
+    # Candidates sharing a binarization stay in one chunk; one chunk per worker
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(candidates)))
+    if workers == 1:
+        results = evaluate_candidates(small_image, candidates, join_strokes, small_gap)
+    else:
+        groups = _group_by_binarization(candidates)
+        chunks = [[params for group in groups[i::workers] for params in group] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            chunk_results = executor.map(
+                _evaluate_chunk, [small_image] * workers, chunks, [join_strokes] * workers, [small_gap] * workers
+            )
+            results = [result for chunk in chunk_results for result in chunk]
+    
+    ranked = rank_candidates(results, weights)
+    params = scale_params(ranked[0]["params"], 1.0 / scale)
+    _cache_put(key, params, cache_dir)
+    return params, ranked
+
+def extract_paths_auto(image, join_strokes=False, join_gap=8.0, **tune_options):
+    """
+    Tune the extraction parameters for an image, then extract once at full resolution
+    
+    Args:
+        image: Input image as numpy array (BGR format)
+        join_strokes: Open single-line strokes and merge fragments separated by small gaps
+        join_gap: Largest gap in pixels bridged when joining strokes
+        **tune_options: Passed on to auto_tune
+    
+    Returns:
+        processed_image: Visualization of the processed image
+        paths: List of extracted paths as coordinate points
+        params: The extraction parameters that were used
+    """
+    params, _ = auto_tune(image, join_strokes=join_strokes, join_gap=join_gap, **tune_options)
+    processed_image, paths = extract_paths_from_sketch(image, join_strokes, join_gap, params=params)
+    return processed_image, paths, params
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune extraction parameters for a sketch")
+    parser.add_argument("image", help="Sketch image")
+    parser.add_argument("--top", type=int, default=5, help="Number of candidates to print")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--cache-dir", help="Directory that persists tuned parameters")
+    parser.add_argument("--save", help="Extract with the winner and write a path file")
+    parser.add_argument("--join", action="store_true", help="Tune for, and extract with, joined strokes")
+    parser.add_argument("--join-gap", type=float, default=8.0, help="Largest gap in pixels bridged when joining")
+    args = parser.parse_args()
+    
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        parser.error(f"Could not read image: {args.image}")
+    
+    params, ranked = auto_tune(
+        image, max_workers=args.workers, cache_dir=args.cache_dir, join_strokes=args.join, join_gap=args.join_gap
+    )
+    if ranked:
+        print(f"{'score':>7}  {'blur':>4}  {'block':>5}  {'C':>3}  {'morph':>5}  {'min':>4}  "
+              f"{'paths':>5}  {'points':>6}  {'length':>7}")
+        for result in ranked[:args.top]:
+            candidate = result["params"]
+            print(
+                f"{result['score']:>7.3f}  {candidate['blur_kernel']:>4}  {candidate['block_size']:>5}  "
+                f"{candidate['threshold_c']:>3}  {candidate['morph_iterations']:>5}  "
+                f"{candidate['min_contour_points']:>4}  {result['fragments']:>5}  {result['points']:>6}  "
+                f"{result['stroke_length']:>7}"
+            )
+    else:
+        print("Parameters taken from the cache")
+    print("Full-resolution parameters:", json.dumps(params))
+    
+    if args.save:
+        _, paths = extract_paths_from_sketch(image, args.join, args.join_gap, params=params)
+        header = save_paths(
+            args.save, paths, source_image=image,
+            params={**params, "join_strokes": args.join, "join_gap": args.join_gap, "join_angle": 45.0}
+        )
+        print(f"Wrote {header['num_paths']} paths ({header['num_points']} points) to {args.save}")
+
+if __name__ == "__main__":
+    main()
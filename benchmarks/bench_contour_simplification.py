@@ -0,0 +1,98 @@
+"""
+Benchmark contour simplification as the number of contours grows
+
+Draws synthetic hatching (many short strokes) onto a blank canvas, finds the
+contours and times the serial and threaded paths of simplify_contours against
+the original per-contour tuple loop. "packed" is the array output alone,
+without converting it back into tuple lists.
+
+Usage:
+    python benchmarks/bench_contour_simplification.py [--counts 500 2000 8000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_extraction import simplify_contours, paths_from_arrays
+
+
+def make_hatching(count, seed=0):
+    """
+    Create a binary image containing roughly `count` separate strokes
+    
+    Args:
+        count: Number of strokes to draw
+        seed: Random seed for reproducible layouts
+        
+    Returns:
+        image: Binary uint8 image
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(count) * 40) + 100
+    image = np.zeros((side, side), np.uint8)
+    for _ in range(count):
+        x, y = rng.integers(20, side - 40, size=2)
+        dx, dy = rng.integers(-15, 16, size=2)
+        cv2.line(image, (int(x), int(y)), (int(x + dx), int(y + 20 + dy)), 255, 1)
+    return image
+
+
+def loop_baseline(contours, min_points=10):
+    """The original one-contour-at-a-time loop producing tuple lists"""
+    paths = []
+    for contour in contours:
+        if len(contour) > min_points:
+            epsilon = 0.01 * cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, epsilon, True)
+            paths.append([(point[0][0], point[0][1]) for point in approx])
+    return paths
+
+
+def best_of(func, repeats):
+    """Return the fastest wall time of `repeats` calls in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--counts", type=int, nargs="+", default=[250, 1000, 4000, 16000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    
+    print(f"{'strokes':>8} {'contours':>9} {'loop ms':>9} {'packed ms':>10} "
+          f"{'serial ms':>10} {'threaded ms':>12} {'speedup':>8}")
+    for count in args.counts:
+        image = make_hatching(count)
+        contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        
+        loop_ms = best_of(lambda: loop_baseline(contours), args.repeats)
+        packed_ms = best_of(
+            lambda: simplify_contours(contours, max_workers=args.workers),
+            args.repeats
+        )
+        serial_ms = best_of(
+            lambda: paths_from_arrays(*simplify_contours(contours, max_workers=1)),
+            args.repeats
+        )
+        threaded_ms = best_of(
+            lambda: paths_from_arrays(*simplify_contours(contours, max_workers=args.workers)),
+            args.repeats
+        )
+        print(f"{count:>8} {len(contours):>9} {loop_ms:>9.2f} {packed_ms:>10.2f} {serial_ms:>10.2f} "
+              f"{threaded_ms:>12.2f} {loop_ms / threaded_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Track cold-start import time of the project modules
+
+Imports each module in a fresh interpreter with `python -X importtime`,
+reports the cumulative import time and lists any heavy library (OpenCV,
+Matplotlib, Pillow, scikit-image) that was loaded eagerly. With
+--baseline the results are compared against a saved JSON file and the
+script exits non-zero on a regression, so it can run in CI.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --baseline import_baseline.json --update-baseline
+    python benchmarks/bench_import_time.py --baseline import_baseline.json --tolerance 1.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "krl_generator",
+    "path_extraction",
+    "path_visualization",
+    "file_utils",
+    "conversion",
+    "krl_service",
+    "job_queue",
+    "drawing_canvas"
+]
+
+# Libraries that must only load when their stage runs
+HEAVY_MODULES = ["cv2", "matplotlib", "PIL", "skimage"]
+
+
+def measure_import(module, repeats):
+    """
+    Import a module in fresh interpreters and parse the -X importtime output
+    
+    Args:
+        module: Module name to import
+        repeats: Number of interpreter runs; the fastest is kept
+        
+    Returns:
+        result: Dictionary with "cumulative_ms" and the eagerly loaded
+            "heavy" modules, or an "error" message
+    """
+    best = None
+    heavy = set()
+    for _ in range(repeats):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_DIR, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1]}
+        
+        cumulative_us = None
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            fields = [field.strip() for field in line[len("import time:"):].split("|")]
+            if not fields[0].isdigit():
+                continue
+            name = fields[2]
+            if name.strip() == module and not name.startswith(" "):
+                cumulative_us = int(fields[1])
+            if name.strip() in HEAVY_MODULES:
+                heavy.add(name.strip())
+        
+        if cumulative_us is not None and (best is None or cumulative_us < best):
+            best = cumulative_us
+    
+    return {"cumulative_ms": round(best / 1000, 1), "heavy": sorted(heavy)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline", help="JSON file with reference timings")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Allowed slowdown factor against the baseline")
+    args = parser.parse_args()
+    
+    results = {module: measure_import(module, args.repeats) for module in args.modules}
+    
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    
+    failures = []
+    print(f"{'module':<20} {'import ms':>10} {'baseline':>10}  eager heavy imports")
+    for module, result in results.items():
+        if "error" in result:
+            print(f"{module:<20} {'skipped':>10} {'':>10}  {result['error']}")
+            continue
+        
+        reference = baseline.get(module, {}).get("cumulative_ms")
+        print(f"{module:<20} {result['cumulative_ms']:>10.1f} "
+              f"{reference if reference is not None else '-':>10}  {', '.join(result['heavy']) or '-'}")
+        
+        if result["heavy"]:
+            failures.append(f"{module} eagerly imports {', '.join(result['heavy'])}")
+        # Ignore jitter on modules that import in a few milliseconds
+        if reference and result["cumulative_ms"] > max(reference * args.tolerance, reference + 5):
+            failures.append(f"{module} import slowed from {reference} ms to {result['cumulative_ms']} ms")
+    
+    if args.update_baseline and args.baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({m: r for m, r in results.items() if "error" not in r}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark per-edit latency of incremental vs full re-extraction
+
+Adds one short stroke at a time to canvases of growing size and times
+IncrementalExtractor.update against a full extract_paths_from_sketch run.
+Incremental latency should track the edit size, not the canvas size.
+
+Usage:
+    python benchmarks/bench_incremental_extraction.py [--sizes 500 1000 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_extraction import extract_paths_from_sketch, IncrementalExtractor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--edits", type=int, default=10)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    print(f"{'canvas':>8} {'full ms/edit':>13} {'incremental ms/edit':>20} {'speedup':>8}")
+    for size in args.sizes:
+        image = np.full((size, size, 3), 255, np.uint8)
+        extractor = IncrementalExtractor()
+        extractor.reset(image)
+        
+        full_ms = incremental_ms = 0.0
+        for _ in range(args.edits):
+            # Draw a 40-80 px stroke, like a single "Add Line" on the canvas
+            x, y = (int(v) for v in rng.integers(50, size - 100, size=2))
+            dx, dy = (int(v) for v in rng.integers(-40, 41, size=2))
+            end = (x + 40 + dx, y + dy)
+            cv2.line(image, (x, y), end, (0, 0, 0), 3)
+            region = (min(x, end[0]) - 3, min(y, end[1]) - 3, max(x, end[0]) + 4, max(y, end[1]) + 4)
+            
+            start = time.perf_counter()
+            extractor.update(image, [region])
+            incremental_ms += (time.perf_counter() - start) * 1000
+            
+            start = time.perf_counter()
+            extract_paths_from_sketch(image)
+            full_ms += (time.perf_counter() - start) * 1000
+        
+        full_ms /= args.edits
+        incremental_ms /= args.edits
+        print(f"{size:>8} {full_ms:>13.2f} {incremental_ms:>20.2f} {full_ms / incremental_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark stroke joining as the number of fragments grows
+
+Cuts synthetic strokes into short dashes and times join_paths while the
+fragment count doubles. The grid-indexed search should scale near
+linearly, so the script exits non-zero when doubling the fragments costs
+more than --max-ratio times as much, which catches quadratic regressions.
+
+Usage:
+    python benchmarks/bench_join_paths.py [--counts 4000 8000 16000 32000] [--max-ratio 2.4]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_extraction import join_paths
+
+
+def make_dashes(count, seed=0):
+    """
+    Create `count` fragments: strokes cut into one to eight collinear dashes
+    
+    Strokes of a single dash stay unjoined, so the chain walk sees many
+    separate chains.
+    
+    Args:
+        count: Number of fragments
+        seed: Random seed for reproducible layouts
+        
+    Returns:
+        paths: List of paths as coordinate points
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(count / 4) * 120) + 200
+    paths = []
+    while len(paths) < count:
+        x, y = rng.integers(50, side - 150, size=2)
+        angle = rng.uniform(0, np.pi)
+        step = np.array([np.cos(angle), np.sin(angle)])
+        for k in range(int(rng.integers(1, 9))):
+            start = np.array([x, y]) + step * k * 14
+            points = [tuple(np.round(start + step * t).astype(int).tolist()) for t in range(0, 11, 2)]
+            paths.append(points)
+    return paths[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--counts", type=int, nargs="+", default=[4000, 8000, 16000, 32000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-ratio", type=float, default=2.4,
+                        help="Largest allowed time ratio when the fragment count doubles")
+    args = parser.parse_args()
+    
+    print(f"{'fragments':>10} {'joined':>8} {'ms':>9} {'ratio':>6}")
+    previous = None
+    failed = False
+    for count in args.counts:
+        paths = make_dashes(count)
+        # Best of a few runs keeps scheduler noise out of the ratio
+        elapsed = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            joined = join_paths(paths, max_gap=8.0)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        
+        ratio = ""
+        if previous is not None:
+            # Normalize to a doubling so uneven --counts steps compare fairly
+            growth = (elapsed / previous[1]) ** (np.log(2) / np.log(count / previous[0]))
+            ratio = f"{growth:.2f}"
+            failed |= growth > args.max_ratio
+        print(f"{count:>10} {len(joined):>8} {elapsed * 1000:>9.1f} {ratio:>6}")
+        previous = (count, elapsed)
+    
+    if failed:
+        print(f"Joining scales worse than {args.max_ratio}x per doubling")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
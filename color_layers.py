@@ -0,0 +1,194 @@
+"""
+Color layer extraction: one path set per pen color
+
+Operators draw different process steps in different colors. The sketch is
+thresholded once and every pixel is labeled with its nearest palette color
+in a single table lookup; each layer's strokes are then thinned and traced
+in parallel, so the image is never re-decoded or re-thresholded per color.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from path_extraction import binarize_sketch, trace_strokes
+
+cv2 = lazy_import("cv2")
+
+# Canvas pen colors (RGB); a layer's tool number is its position + 1
+LAYER_PALETTE = OrderedDict([
+    ("black", (0, 0, 0)),
+    ("red", (255, 0, 0)),
+    ("green", (0, 255, 0)),
+    ("blue", (0, 0, 255))
+])
+LAYER_TOOLS = {name: i + 1 for i, name in enumerate(LAYER_PALETTE)}
+
+# Colors are looked up with 5 bits per channel
+LUT_BITS = 5
+
+# Layers with fewer stroke pixels than this are treated as noise
+MIN_LAYER_PIXELS = 20
+
+@lru_cache(maxsize=32)
+def _label_table(colors, background, min_chroma, min_contrast):
+    """
+    Build the color -> layer lookup table
+    
+    A stroke pixel is a mix of its pen color with the paper (and with black
+    where the ink is dark), so each color is matched against the plane
+    spanned by the pen and paper colors rather than the pen color alone.
+    Nearly gray pixels go to the first achromatic pen (black) and pixels
+    close to the paper color get no layer at all.
+    
+    Args:
+        colors: Tuple of pen colors in the image's channel order
+        background: Paper color in the image's channel order
+        min_chroma: Smallest distance from the gray axis counted as colored
+        min_contrast: Smallest distance from the paper color counted as ink
+    
+    Returns:
+        table: uint8 array mapping a packed 15-bit color to a layer index
+            (len(colors) for paper)
+    """
+    levels = 1 << LUT_BITS
+    shift = 8 - LUT_BITS
+    grid = np.indices((levels, levels, levels)).reshape(3, -1).T
+    centers = ((grid << shift) + (1 << (shift - 1))).astype(np.float64)
+    
+    background = np.asarray(background, dtype=np.float64)
+    scores = np.empty((len(colors), len(centers)))
+    for i, color in enumerate(colors):
+        basis, r = np.linalg.qr(np.column_stack([background, np.asarray(color, dtype=np.float64)]))
+        if abs(r[1, 1]) < 1e-6:
+            # A gray pen: only the paper direction spans its mixes
+            basis = basis[:, :1]
+            penalty = 0.0
+        else:
+            # Colored pens must beat the gray axis by a margin
+            penalty = float(min_chroma) ** 2
+        projection = centers @ basis @ basis.T
+        scores[i] = ((centers - projection) ** 2).sum(axis=1) + penalty
+    
+    table = np.argmin(scores, axis=0).astype(np.uint8)
+    table[((centers - background) ** 2).sum(axis=1) < float(min_contrast) ** 2] = len(colors)
+    return table
+
+def label_colors(image, palette=LAYER_PALETTE, bgr=True, background=(255, 255, 255), min_chroma=40,
+                 min_contrast=60):
+    """
+    Label every pixel with its nearest palette color
+    
+    Args:
+        image: Input image as numpy array
+        palette: Mapping of layer name to RGB pen color
+        bgr: Whether the image is in BGR (OpenCV) rather than RGB channel order
+        background: Paper color in the image's channel order
+        min_chroma: Smallest distance from the gray axis counted as colored
+        min_contrast: Smallest distance from the paper color counted as ink
+    
+    Returns:
+        labels: uint8 array of palette indices with the image's height and
+            width (len(palette) where the pixel looks like paper)
+    """
+    colors = tuple(tuple(color[::-1]) if bgr else tuple(color) for color in palette.values())
+    table = _label_table(colors, tuple(int(c) for c in background), min_chroma, min_contrast)
+    
+    shift = 8 - LUT_BITS
+    packed = (image[..., 0] >> shift).astype(np.uint16) << (2 * LUT_BITS)
+    packed |= (image[..., 1] >> shift).astype(np.uint16) << LUT_BITS
+    packed |= image[..., 2] >> shift
+    return table[packed]
+
+def estimate_paper_color(image, strokes, step=4):
+    """
+    Estimate the paper color as the median of the non-stroke pixels
+    
+    The result is snapped to the lookup table's grid so similar photos share
+    one cached table.
+    
+    Args:
+        image: Input image as numpy array
+        strokes: Binary stroke mask of the image
+        step: Sample every step-th pixel in each direction
+        
+    Returns:
+        color: Paper color in the image's channel order
+    """
+    sample = image[::step, ::step][strokes[::step, ::step] == 0]
+    if len(sample) == 0:
+        return (255, 255, 255)
+    shift = 8 - LUT_BITS
+    median = np.median(sample, axis=0).astype(int)
+    return tuple(int(c) for c in ((median >> shift) << shift) + (1 << (shift - 1)))
+
+def _trace_layer(mask, join_strokes, join_gap):
+    """Close label gaps inside one layer's strokes and trace them"""
+    kernel = np.ones((3, 3), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=1)
+    return trace_strokes(mask, join_strokes, join_gap)
+
+def extract_color_layers(image, palette=LAYER_PALETTE, bgr=True, join_strokes=False, join_gap=8.0,
+                         max_workers=None):
+    """
+    Extract one path set per pen color
+    
+    Args:
+        image: Input image as numpy array
+        palette: Mapping of layer name to RGB pen color
+        bgr: Whether the image is in BGR (OpenCV) rather than RGB channel order
+        join_strokes: Open single-line strokes and merge fragments separated by small gaps
+        join_gap: Largest gap in pixels bridged when joining strokes
+        max_workers: Threads tracing layers in parallel (defaults to one per layer)
+    
+    Returns:
+        processed_image: Traced strokes drawn in their layer colors on white,
+            in the input's channel order
+        layers: Ordered mapping of layer name to paths, for layers with strokes
+    """
+    # Threshold once and label once for all layers
+    strokes = binarize_sketch(image if bgr else cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    labels = label_colors(image, palette, bgr, estimate_paper_color(image, strokes))
+    
+    names = list(palette)
+    masks = {}
+    for index, name in enumerate(names):
+        mask = np.where(labels == index, strokes, 0).astype(np.uint8)
+        if cv2.countNonZero(mask) >= MIN_LAYER_PIXELS:
+            masks[name] = mask
+    
+    # Thinning and tracing release the GIL, so layers run side by side
+    workers = max_workers or max(1, len(masks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            name: executor.submit(_trace_layer, mask, join_strokes, join_gap)
+            for name, mask in masks.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+    
+    processed_image = np.full_like(image, 255)
+    layers = OrderedDict()
+    for name in names:
+        if name not in results:
+            continue
+        contours, paths = results[name]
+        color = palette[name][::-1] if bgr else palette[name]
+        cv2.drawContours(processed_image, contours, -1, tuple(int(c) for c in color), 2)
+        if paths:
+            layers[name] = paths
+    
+    return processed_image, layers
+
+def flatten_layers(layers):
+    """
+    Concatenate the paths of all layers
+    
+    Args:
+        layers: Mapping of layer name to paths
+    
+    Returns:
+        paths: Single list of paths in layer order
+    """
+    return [path for paths in layers.values() for path in paths]
@@ -0,0 +1,53 @@
+import numpy as np
+
+from lazy_imports import lazy_import
+from path_extraction import extract_paths_from_sketch
+from krl_generator import compile_program, render_src, render_dat
+
+cv2 = lazy_import("cv2")
+
+MOTION_TYPES = ["LIN", "PTP", "CIRC", "SPLINE"]
+START_POSITIONS = ["HOME", "Anywhere"]
+
+def decode_image(image_bytes):
+    """
+    Decode encoded image bytes (PNG, JPEG, ...) into a BGR array
+    
+    Args:
+        image_bytes: Encoded image file contents
+        
+    Returns:
+        image: Decoded image as numpy array (BGR format)
+    """
+    file_bytes = np.frombuffer(image_bytes, dtype=np.uint8)
+    image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image data")
+    return image
+
+def convert_sketch(image_bytes, program_name="PATH_PROGRAM", start_position="HOME", motion_types=None):
+    """
+    Run the full sketch-to-KRL pipeline on encoded image bytes
+    
+    This is a plain module-level function so it can be shipped to worker
+    processes by the HTTP service and the batch job runner.
+    
+    Args:
+        image_bytes: Encoded image file contents
+        program_name: Name of the KRL program
+        start_position: Starting position ("HOME" or "Anywhere")
+        motion_types: List of motion types to use (defaults to LIN)
+        
+    Returns:
+        result: Dictionary with "src" and "dat" code and the "path_count"
+    """
+    image = decode_image(image_bytes)
+    _, paths = extract_paths_from_sketch(image)
+    
+    program = compile_program(paths, start_position, motion_types or ["LIN"], program_name)
+    
+    return {
+        "src": render_src(program),
+        "dat": render_dat(program),
+        "path_count": len(paths)
+    }
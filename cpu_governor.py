@@ -0,0 +1,168 @@
+"""
+Process-wide CPU governor for the heavy image processing calls
+
+Every Streamlit session runs its script on its own thread, and OpenCV
+starts its own thread pool inside each call. Without coordination a few
+simultaneous uploads oversubscribe the cores and every request slows down.
+The governor caps how many heavy jobs run at once, sizes OpenCV's thread
+pool to match, and hands out free slots round-robin across sessions so one
+busy operator cannot starve the others.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+class Ticket:
+    """
+    A queued or running job; records how long it waited and ran
+    """
+    
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.enqueued_at = time.perf_counter()
+        self.wait_time = None
+        self.run_time = None
+
+class CPUGovernor:
+    """
+    Fair, bounded scheduler for CPU-heavy jobs
+    """
+    
+    def __init__(self, max_jobs=None, threads_per_job=None):
+        """
+        Initialize the governor
+        
+        Args:
+            max_jobs: Jobs allowed to run at once (defaults to half the cores)
+            threads_per_job: OpenCV threads per job (defaults to cores / max_jobs)
+        """
+        cores = os.cpu_count() or 1
+        self.max_jobs = max_jobs or max(1, cores // 2)
+        self.threads_per_job = threads_per_job or max(1, cores // self.max_jobs)
+        
+        self._cond = threading.Condition()
+        # session_id -> deque of waiting tickets; sessions are served in rotation
+        self._queues = OrderedDict()
+        self._running = 0
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+        self._threads_configured = False
+    
+    def _is_next(self, ticket):
+        """Check whether a ticket is at the head of the rotation (lock held)"""
+        session_id, queue = next(iter(self._queues.items()))
+        return session_id == ticket.session_id and queue[0] is ticket
+    
+    @contextmanager
+    def slot(self, session_id):
+        """
+        Wait for a CPU slot and hold it for the duration of the block
+        
+        Args:
+            session_id: ID of the requesting session, used for fair queueing
+            
+        Yields:
+            ticket: Ticket whose wait_time is set once the slot is granted
+        """
+        ticket = Ticket(session_id)
+        
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            try:
+                while self._running >= self.max_jobs or not self._is_next(ticket):
+                    self._cond.wait()
+            finally:
+                # Leave the rotation even if the wait was interrupted, so nobody queues behind this ticket
+                queue = self._queues.pop(session_id)
+                queue.remove(ticket)
+                if queue:
+                    self._queues[session_id] = queue
+                self._cond.notify_all()
+            
+            # cv2.setNumThreads is process-wide, so every job gets the same share; set it once.
+            # The flag is only raised after the call succeeded, so no job runs unconfigured
+            if not self._threads_configured:
+                cv2.setNumThreads(self.threads_per_job)
+                self._threads_configured = True
+            
+            # Take the slot; this session is now at the back of the rotation
+            self._running += 1
+            ticket.wait_time = time.perf_counter() - ticket.enqueued_at
+            self._wait_times.append(ticket.wait_time)
+        
+        start = time.perf_counter()
+        try:
+            yield ticket
+        finally:
+            ticket.run_time = time.perf_counter() - start
+            with self._cond:
+                self._running -= 1
+                self._run_times.append(ticket.run_time)
+                self._cond.notify_all()
+    
+    def run(self, session_id, func, *args, **kwargs):
+        """
+        Run a function inside a CPU slot
+        
+        Returns:
+            result: The function's return value
+            ticket: Ticket with the job's wait and run times
+        """
+        with self.slot(session_id) as ticket:
+            result = func(*args, **kwargs)
+        return result, ticket
+    
+    def stats(self):
+        """
+        Summarize load and latency
+        
+        Returns:
+            stats: Dictionary with running/queued counts and wait/run percentiles in ms
+        """
+        with self._cond:
+            waits = sorted(self._wait_times)
+            runs = sorted(self._run_times)
+            queued = sum(len(queue) for queue in self._queues.values())
+            running = self._running
+        
+        def percentile(values, q):
+            if not values:
+                return 0.0
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+        
+        return {
+            "max_jobs": self.max_jobs,
+            "threads_per_job": self.threads_per_job,
+            "running": running,
+            "queued": queued,
+            "wait_ms": {"p50": percentile(waits, 0.5), "p99": percentile(waits, 0.99)},
+            "run_ms": {"p50": percentile(runs, 0.5), "p99": percentile(runs, 0.99)}
+        }
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_governor():
+    """
+    Get the process-wide CPUGovernor, configured from the environment
+    
+    SKETCH_TO_KRL_MAX_JOBS and SKETCH_TO_KRL_THREADS_PER_JOB override the
+    defaults.
+    
+    Returns:
+        governor: The shared CPUGovernor
+    """
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = CPUGovernor(
+                max_jobs=int(os.environ.get("SKETCH_TO_KRL_MAX_JOBS", 0)) or None,
+                threads_per_job=int(os.environ.get("SKETCH_TO_KRL_THREADS_PER_JOB", 0)) or None
+            )
+        return _governor
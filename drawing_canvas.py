@@ -1,13 +1,170 @@
 import streamlit as st
 import numpy as np
-from PIL import Image, ImageDraw
-import cv2
 import base64
-from io import BytesIO
+import uuid
+
+from lazy_imports import lazy_import
+from session_store import get_image_store
+
+cv2 = lazy_import("cv2")
+
+class CanvasBuffer:
+    """
+    RGB canvas held in a NumPy array that tracks which regions changed
+    
+    The PNG encoding of the canvas is cached and only rebuilt after a
+    drawing operation, so Streamlit reruns that don't draw anything reuse
+    the same bytes. state() and restore() split the buffer into its small
+    bookkeeping and its pixels, so the pixels can live outside session state;
+    a restored buffer only decodes its pixels when they are first used.
+    """
+    
+    def __init__(self, width, height, background_color=(255, 255, 255)):
+        """
+        Create a blank canvas
+        
+        Args:
+            width: Canvas width in pixels
+            height: Canvas height in pixels
+            background_color: Canvas background color as RGB tuple
+        """
+        self.width = width
+        self.height = height
+        self.background_color = background_color
+        self._pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self._pixels[:] = background_color
+        self._load_pixels = None
+        
+        # Identifies this canvas across save/restore; clearing makes a new one
+        self.canvas_id = uuid.uuid4().hex
+        # Changed rectangles as (x0, y0, x1, y1), exclusive of x1/y1
+        self.dirty_regions = []
+        self.version = 0
+        self._png = None
+    
+    def state(self):
+        """
+        Get everything except the pixels
+        
+        Returns:
+            state: Small dictionary accepted by restore()
+        """
+        return {
+            "canvas_id": self.canvas_id,
+            "width": self.width,
+            "height": self.height,
+            "background_color": self.background_color,
+            "dirty_regions": list(self.dirty_regions),
+            "version": self.version
+        }
+    
+    @classmethod
+    def restore(cls, state, load_pixels, png=None):
+        """
+        Rebuild a canvas from state() and its pixels
+        
+        Args:
+            state: Dictionary returned by state()
+            load_pixels: Function returning the RGB pixels of the canvas,
+                called the first time the pixels are needed
+            png: PNG encoding of the pixels, if already known
+            
+        Returns:
+            canvas: The restored CanvasBuffer
+        """
+        canvas = cls.__new__(cls)
+        canvas.width = state["width"]
+        canvas.height = state["height"]
+        canvas.background_color = state["background_color"]
+        canvas._pixels = None
+        canvas._load_pixels = load_pixels
+        canvas.canvas_id = state["canvas_id"]
+        canvas.dirty_regions = list(state["dirty_regions"])
+        canvas.version = state["version"]
+        canvas._png = png
+        return canvas
+    
+    @property
+    def pixels(self):
+        """RGB pixels of the canvas, decoded on first use after restore()"""
+        if self._pixels is None:
+            self._pixels = self._load_pixels()
+            self._load_pixels = None
+        return self._pixels
+    
+    def draw_line(self, start, end, color, thickness):
+        """Draw a straight line between two points"""
+        cv2.line(self.pixels, tuple(start), tuple(end), color, thickness)
+        self._mark_dirty([start, end], thickness)
+    
+    def draw_rectangle(self, top_left, bottom_right, color, thickness):
+        """Draw a rectangle outline"""
+        cv2.rectangle(self.pixels, tuple(top_left), tuple(bottom_right), color, thickness)
+        self._mark_dirty([top_left, bottom_right], thickness)
+    
+    def draw_circle(self, center, radius, color, thickness):
+        """Draw a circle outline"""
+        cv2.circle(self.pixels, tuple(center), radius, color, thickness)
+        cx, cy = center
+        self._mark_dirty([(cx - radius, cy - radius), (cx + radius, cy + radius)], thickness)
+    
+    def clear(self):
+        """Fill the whole canvas with the background color"""
+        self.pixels[:] = self.background_color
+        self._mark_dirty([(0, 0), (self.width - 1, self.height - 1)], 0)
+    
+    def _mark_dirty(self, points, thickness):
+        """Record the bounding box of a drawing operation, padded by the stroke width"""
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        pad = thickness // 2 + 1
+        region = (
+            max(0, int(min(xs)) - pad),
+            max(0, int(min(ys)) - pad),
+            min(self.width, int(max(xs)) + pad + 1),
+            min(self.height, int(max(ys)) + pad + 1)
+        )
+        if region[0] < region[2] and region[1] < region[3]:
+            self.dirty_regions.append(region)
+        self.version += 1
+        self._png = None
+    
+    def take_dirty_regions(self):
+        """
+        Return and forget the regions changed since the last call
+        
+        Returns:
+            regions: List of (x0, y0, x1, y1) rectangles
+        """
+        regions = self.dirty_regions
+        self.dirty_regions = []
+        return regions
+    
+    def to_png(self):
+        """
+        Get the canvas encoded as PNG, re-encoding only after changes
+        
+        Returns:
+            png_bytes: PNG file contents
+        """
+        if self._png is None:
+            ok, buffer = cv2.imencode(".png", cv2.cvtColor(self.pixels, cv2.COLOR_RGB2BGR))
+            if not ok:
+                raise RuntimeError("Could not encode canvas as PNG")
+            self._png = buffer.tobytes()
+        return self._png
+    
+    def to_array(self):
+        """Get a copy of the canvas pixels (RGB)"""
+        return self.pixels.copy()
 
 class DrawingCanvas:
     """
     Interactive drawing canvas for Streamlit
+    
+    The canvas pixels are pinned in the shared image store under the
+    "canvas" key, so budgets and session expiry never wipe a drawing;
+    session state only holds CanvasBuffer.state().
     """
     
     def __init__(self, width=500, height=500, background_color=(255, 255, 255)):
@@ -22,9 +179,11 @@ class DrawingCanvas:
         self.width = width
         self.height = height
         self.background_color = background_color
+        self.store = get_image_store()
         
-        # Initialize canvas state if not already in session state
-        if 'canvas_image' not in st.session_state:
+        # Initialize canvas state if not already in session state (or the pixels were evicted)
+        self.buffer = self._load_buffer()
+        if self.buffer is None:
             self.reset_canvas()
         
         if 'drawing_mode' not in st.session_state:
@@ -38,12 +197,52 @@ class DrawingCanvas:
         
         if 'drawing_points' not in st.session_state:
             st.session_state.drawing_points = []
+        
+        if 'drawing_shapes' not in st.session_state:
+            st.session_state.drawing_shapes = []
     
     def reset_canvas(self):
         """Reset the canvas to a blank state"""
-        st.session_state.canvas_image = Image.new('RGB', (self.width, self.height), self.background_color)
-        st.session_state.canvas_draw = ImageDraw.Draw(st.session_state.canvas_image)
+        self.buffer = CanvasBuffer(self.width, self.height, self.background_color)
+        self.save()
         st.session_state.drawing_points = []
+        st.session_state.drawing_shapes = []
+    
+    def _load_buffer(self):
+        """Restore this session's canvas from the image store (None if there is none)"""
+        state = st.session_state.get('canvas_state')
+        if state is None:
+            return None
+        # The store keeps BGR PNGs, so its bytes can be shown as they are
+        png = self.store.get_encoded(st.session_state.session_id, "canvas")
+        if png is None:
+            return None
+        
+        # Reruns that don't draw or extract only display the PNG, so decode on demand
+        def load_pixels():
+            return cv2.cvtColor(cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        
+        return CanvasBuffer.restore(state, load_pixels, png if self.store.image_format == ".png" else None)
+    
+    def save(self):
+        """
+        Write the canvas back: its bookkeeping to session state and, after
+        drawing, its pixels to the image store
+        """
+        state = self.buffer.state()
+        previous = st.session_state.get('canvas_state')
+        if (
+            previous is None
+            or previous["canvas_id"] != state["canvas_id"]
+            or previous["version"] != state["version"]
+        ):
+            self.store.put(
+                st.session_state.session_id, "canvas", cv2.cvtColor(self.buffer.pixels, cv2.COLOR_RGB2BGR),
+                pinned=True
+            )
+            if self.store.image_format == ".png":
+                self.buffer._png = self.store.get_encoded(st.session_state.session_id, "canvas")
+        st.session_state.canvas_state = state
     
     def render(self):
         """
@@ -81,14 +280,10 @@ class DrawingCanvas:
         canvas_col, controls_col = st.columns([3, 1])
         
         with canvas_col:
-            # Display the canvas
-            st.image(st.session_state.canvas_image, caption="Drawing Canvas", use_column_width=True)
-            
-            # Create a placeholder for the canvas
+            # Reserve the canvas slot; it is filled once, after any drawing below
             canvas_placeholder = st.empty()
-            
-            # Display the current canvas
-            canvas_placeholder.image(st.session_state.canvas_image, caption="Drawing Canvas", use_column_width=True)
+        
+        canvas = self.buffer
         
         with controls_col:
             # Drawing controls based on mode
@@ -100,16 +295,19 @@ class DrawingCanvas:
                 end_y = st.slider("End Y", 0, self.height, 3 * self.height // 4)
                 
                 if st.button("Add Line"):
-                    st.session_state.canvas_draw.line(
-                        [(start_x, start_y), (end_x, end_y)],
-                        fill=st.session_state.drawing_color,
-                        width=st.session_state.drawing_thickness
+                    canvas.draw_line(
+                        (start_x, start_y), (end_x, end_y),
+                        st.session_state.drawing_color,
+                        st.session_state.drawing_thickness
                     )
                     # Add points to the drawing points list
                     st.session_state.drawing_points.append((start_x, start_y))
                     st.session_state.drawing_points.append((end_x, end_y))
-                    # Update the canvas display
-                    canvas_placeholder.image(st.session_state.canvas_image, caption="Drawing Canvas", use_column_width=True)
+                    # Record the exact primitive for the vector fast path
+                    st.session_state.drawing_shapes.append({
+                        "type": "line",
+                        "points": [(start_x, start_y), (end_x, end_y)]
+                    })
             
             elif st.session_state.drawing_mode == "rectangle":
                 st.markdown("#### Draw Rectangle")
@@ -119,21 +317,24 @@ class DrawingCanvas:
                 end_y = st.slider("Bottom", 0, self.height, 3 * self.height // 4)
                 
                 if st.button("Add Rectangle"):
-                    st.session_state.canvas_draw.rectangle(
-                        [(start_x, start_y), (end_x, end_y)],
-                        outline=st.session_state.drawing_color,
-                        width=st.session_state.drawing_thickness
+                    canvas.draw_rectangle(
+                        (start_x, start_y), (end_x, end_y),
+                        st.session_state.drawing_color,
+                        st.session_state.drawing_thickness
                     )
                     # Add points to the drawing points list (corners of rectangle)
-                    st.session_state.drawing_points.extend([
+                    corners = [
                         (start_x, start_y),
                         (end_x, start_y),
                         (end_x, end_y),
                         (start_x, end_y),
                         (start_x, start_y)  # Close the rectangle
-                    ])
-                    # Update the canvas display
-                    canvas_placeholder.image(st.session_state.canvas_image, caption="Drawing Canvas", use_column_width=True)
+                    ]
+                    st.session_state.drawing_points.extend(corners)
+                    st.session_state.drawing_shapes.append({
+                        "type": "rectangle",
+                        "points": corners
+                    })
             
             elif st.session_state.drawing_mode == "circle":
                 st.markdown("#### Draw Circle")
@@ -142,11 +343,10 @@ class DrawingCanvas:
                 radius = st.slider("Radius", 5, min(self.width, self.height) // 2, 50)
                 
                 if st.button("Add Circle"):
-                    st.session_state.canvas_draw.ellipse(
-                        [(center_x - radius, center_y - radius), 
-                         (center_x + radius, center_y + radius)],
-                        outline=st.session_state.drawing_color,
-                        width=st.session_state.drawing_thickness
+                    canvas.draw_circle(
+                        (center_x, center_y), radius,
+                        st.session_state.drawing_color,
+                        st.session_state.drawing_thickness
                     )
                     # Add points approximating a circle
                     num_points = 20
@@ -155,8 +355,11 @@ class DrawingCanvas:
                         x = center_x + radius * np.cos(angle)
                         y = center_y + radius * np.sin(angle)
                         st.session_state.drawing_points.append((int(x), int(y)))
-                    # Update the canvas display
-                    canvas_placeholder.image(st.session_state.canvas_image, caption="Drawing Canvas", use_column_width=True)
+                    st.session_state.drawing_shapes.append({
+                        "type": "circle",
+                        "center": (center_x, center_y),
+                        "radius": radius
+                    })
             
             elif st.session_state.drawing_mode == "freehand":
                 st.markdown("#### Freehand Drawing")
@@ -166,12 +369,18 @@ class DrawingCanvas:
             # Clear button
             if st.button("Clear Canvas"):
                 self.reset_canvas()
-                canvas_placeholder.image(st.session_state.canvas_image, caption="Drawing Canvas", use_column_width=True)
+                canvas = self.buffer
+        
+        # Store the pixels only after drawing; the stored PNG is also what gets displayed
+        self.save()
+        
+        # Display the canvas once per rerun; the PNG is only re-encoded after changes
+        canvas_placeholder.image(canvas.to_png(), caption="Drawing Canvas", use_column_width=True)
         
         # Submit button
         if st.button("Use This Drawing"):
             # Convert to numpy array for OpenCV processing
-            return np.array(st.session_state.canvas_image)
+            return canvas.to_array()
         
         return None
     
@@ -184,6 +393,17 @@ class DrawingCanvas:
         """
         return st.session_state.drawing_points
     
+    def get_drawing_shapes(self):
+        """
+        Get the primitives that were drawn on the canvas
+        
+        Returns:
+            shapes: List of shape dictionaries. Lines and rectangles have
+                "points" (rectangles closed back to the first corner),
+                circles have "center" and "radius".
+        """
+        return st.session_state.drawing_shapes
+    
     def get_image_as_base64(self):
         """
         Get the canvas image as a base64 encoded string
@@ -191,7 +411,5 @@ class DrawingCanvas:
         Returns:
             base64_image: Base64 encoded image string
         """
-        buffered = BytesIO()
-        st.session_state.canvas_image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        img_str = base64.b64encode(self.buffer.to_png()).decode()
         return img_str
\ No newline at end of file
@@ -1,7 +1,6 @@
 import base64
 import io
 import zipfile
-import streamlit as st
 
 def get_download_link(file_content, file_name):
     """
@@ -33,15 +32,15 @@ def get_image_download_link(img, file_name):
     img_str = base64.b64encode(buffered.getvalue()).decode()
     return f'<a href="data:file/png;base64,{img_str}" download="{file_name}">Download {file_name}</a>'
 
-def create_zip_download(files_dict):
+def create_zip_bytes(files_dict):
     """
-    Create a download link for a zip file containing multiple files
+    Package multiple files into an in-memory zip archive
     
     Args:
         files_dict: Dictionary of {filename: content}
         
     Returns:
-        download_link: HTML link for downloading the zip file
+        zip_bytes: Contents of the zip file
     """
     zip_buffer = io.BytesIO()
     
@@ -49,8 +48,19 @@ def create_zip_download(files_dict):
         for file_name, file_content in files_dict.items():
             zip_file.writestr(file_name, file_content)
     
-    zip_buffer.seek(0)
-    b64 = base64.b64encode(zip_buffer.getvalue()).decode()
+    return zip_buffer.getvalue()
+
+def create_zip_download(files_dict):
+    """
+    Create a download link for a zip file containing multiple files
+    
+    Args:
+        files_dict: Dictionary of {filename: content}
+        
+    Returns:
+        download_link: HTML link for downloading the zip file
+    """
+    b64 = base64.b64encode(create_zip_bytes(files_dict)).decode()
     
     return f'<a href="data:application/zip;base64,{b64}" download="krl_program.zip">Download All Files (ZIP)</a>'
 
@@ -0,0 +1,241 @@
+"""
+Streaming sketch-to-KRL conversion for a camera watching a whiteboard
+
+Frames come from a video file (or camera index) or an image sequence.
+Each frame is compared with the last processed one; only the regions
+that changed are re-extracted and spliced into the current path set, and
+a new KRL program is emitted only when the paths change meaningfully.
+
+Usage:
+    python frame_stream.py whiteboard.mp4 --out-dir programs
+    python frame_stream.py frames/ --out-dir programs --motion LIN,CIRC
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from path_extraction import IncrementalExtractor
+from krl_generator import KRLGenerator
+
+cv2 = lazy_import("cv2")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def iter_frames(source, step=1):
+    """
+    Yield BGR frames from a video, a camera, a directory or a glob of images
+    
+    Args:
+        source: Video path, camera index (e.g. "0"), directory or glob pattern
+        step: Only yield every `step`-th frame
+        
+    Yields:
+        frame: Image as numpy array (BGR format)
+    """
+    if os.path.isdir(source):
+        files = sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    elif any(char in source for char in "*?["):
+        files = sorted(glob.glob(source))
+    else:
+        files = None
+    
+    if files is not None:
+        for path in files[::step]:
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield frame
+        return
+    
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            if index % step == 0:
+                yield frame
+            index += 1
+    finally:
+        capture.release()
+
+class StreamingExtractor:
+    """
+    Keeps a path set up to date across frames by re-extracting only changed regions
+    """
+    
+    def __init__(self, diff_threshold=30, min_changed_pixels=25, margin=16, full_refresh_ratio=0.5):
+        """
+        Initialize the extractor
+        
+        Args:
+            diff_threshold: Gray level difference that counts as a changed pixel
+            min_changed_pixels: Changed pixels (after cleanup) needed to react to a frame
+            margin: Pixels a re-processed window first grows by (see IncrementalExtractor)
+            full_refresh_ratio: Re-extract the whole frame when more than this
+                fraction of it changed (e.g. the camera moved)
+        """
+        self.diff_threshold = diff_threshold
+        self.min_changed_pixels = min_changed_pixels
+        self.margin = margin
+        self.full_refresh_ratio = full_refresh_ratio
+        
+        self.reference = None
+        self.incremental = IncrementalExtractor(margin)
+        self.paths = []
+    
+    def process(self, frame):
+        """
+        Update the path set for a new frame
+        
+        Args:
+            frame: Image as numpy array (BGR format)
+            
+        Returns:
+            paths: Current list of paths
+            regions: Rectangles that were re-extracted (empty if nothing changed)
+        """
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        height, width = gray.shape
+        
+        if self.reference is None or self.reference.shape != gray.shape:
+            self.paths = self.incremental.reset(frame)
+            self.reference = gray
+            return self.paths, [(0, 0, width, height)]
+        
+        # Pixels that differ from the last processed state, with speckle removed
+        diff = cv2.absdiff(gray, self.reference)
+        _, mask = cv2.threshold(diff, self.diff_threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+        changed = cv2.countNonZero(mask)
+        if changed < self.min_changed_pixels:
+            return self.paths, []
+        
+        if changed > self.full_refresh_ratio * width * height:
+            self.paths = self.incremental.reset(frame)
+            self.reference = gray
+            return self.paths, [(0, 0, width, height)]
+        
+        # Group nearby changes into regions
+        mask = cv2.dilate(mask, np.ones((9, 9), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        regions = [
+            (x, y, x + w, y + h)
+            for x, y, w, h, _ in stats[1:count]
+        ]
+        
+        self.paths = self.incremental.update(frame, regions)
+        
+        # Only the processed regions become the new reference, so slow drift still accumulates
+        for x0, y0, x1, y1 in regions:
+            self.reference[y0:y1, x0:x1] = gray[y0:y1, x0:x1]
+        
+        return self.paths, regions
+
+def path_set_signature(paths, tolerance):
+    """
+    Quantize a path set so small jitter doesn't count as a change
+    
+    Args:
+        paths: List of paths as coordinate points
+        tolerance: Grid size in pixels
+        
+    Returns:
+        signature: Frozenset of quantized paths, independent of order and direction
+    """
+    signature = set()
+    for path in paths:
+        quantized = tuple(tuple(p) for p in np.round(np.asarray(path, dtype=float) / tolerance).astype(int).tolist())
+        signature.add(min(quantized, quantized[::-1]))
+    return frozenset(signature)
+
+def stream_programs(frames, program_name="PATH_PROGRAM", start_position="HOME", motion_types=None,
+                    emit_tolerance=4.0, **extractor_options):
+    """
+    Convert a stream of frames into a stream of KRL programs
+    
+    Args:
+        frames: Iterable of BGR frames, e.g. from iter_frames
+        program_name: Name of the KRL program
+        start_position: Starting position ("HOME" or "Anywhere")
+        motion_types: List of motion types to use (defaults to LIN)
+        emit_tolerance: Grid size in pixels below which path changes are ignored
+        **extractor_options: Passed to StreamingExtractor
+        
+    Yields:
+        update: Dictionary with "frame_index", "paths", "src", "dat" and the
+            sustained "fps" so far, for every frame that changes the program
+    """
+    extractor = StreamingExtractor(**extractor_options)
+    last_signature = None
+    start = time.perf_counter()
+    
+    for frame_index, frame in enumerate(frames):
+        paths, regions = extractor.process(frame)
+        if not regions:
+            continue
+        
+        signature = path_set_signature(paths, emit_tolerance)
+        if signature == last_signature:
+            continue
+        last_signature = signature
+        
+        krl_gen = KRLGenerator(program_name)
+        src_code = krl_gen.generate_src_code(paths, start_position, motion_types or ["LIN"])
+        yield {
+            "frame_index": frame_index,
+            "paths": list(paths),
+            "src": src_code,
+            "dat": krl_gen.generate_dat_code(),
+            "fps": (frame_index + 1) / (time.perf_counter() - start)
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream frames into KRL programs")
+    parser.add_argument("source", help="Video file, camera index, directory or glob of images")
+    parser.add_argument("--out-dir", default="programs")
+    parser.add_argument("--program", default="PATH_PROGRAM")
+    parser.add_argument("--start", default="HOME", choices=["HOME", "Anywhere"])
+    parser.add_argument("--motion", default="LIN", help="Comma separated motion types")
+    parser.add_argument("--step", type=int, default=1, help="Process every n-th frame")
+    parser.add_argument("--emit-tolerance", type=float, default=4.0)
+    args = parser.parse_args()
+    
+    os.makedirs(args.out_dir, exist_ok=True)
+    frame_count = 0
+    
+    def counted(frames):
+        nonlocal frame_count
+        for frame in frames:
+            frame_count += 1
+            yield frame
+    
+    start = time.perf_counter()
+    updates = stream_programs(
+        counted(iter_frames(args.source, args.step)),
+        program_name=args.program,
+        start_position=args.start,
+        motion_types=args.motion.upper().split(","),
+        emit_tolerance=args.emit_tolerance
+    )
+    for update in updates:
+        stem = os.path.join(args.out_dir, f"{args.program}_{update['frame_index']:05d}")
+        with open(f"{stem}.src", "w") as f:
+            f.write(update["src"])
+        with open(f"{stem}.dat", "w") as f:
+            f.write(update["dat"])
+        print(f"frame {update['frame_index']}: {len(update['paths'])} paths -> {stem}.src "
+              f"({update['fps']:.1f} fps)")
+    
+    elapsed = time.perf_counter() - start
+    print(f"Processed {frame_count} frames in {elapsed:.2f}s ({frame_count / max(elapsed, 1e-9):.1f} fps sustained)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Persistent SQLite job queue for resumable batch sketch conversion
+
+Jobs survive worker restarts: a worker claims a job, keeps its lease alive
+with heartbeats and marks it complete or failed. Jobs whose worker stopped
+heartbeating are put back in the queue. Results are written to disk under
+the job's content hash, so resubmitting the same sketch with the same
+options is skipped and a re-run job whose results already exist finishes
+immediately.
+
+Usage:
+    python job_queue.py --db jobs.db submit sketches/ --motion LIN,CIRC
+    python job_queue.py --db jobs.db work --results results --workers 4 --exit-when-empty
+    python job_queue.py --db jobs.db status
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from conversion import convert_sketch
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash TEXT NOT NULL UNIQUE,
+    source_path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    heartbeat_at REAL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result_dir TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+class JobQueue:
+    """
+    SQLite-backed queue of sketch conversion jobs
+    """
+    
+    def __init__(self, db_path, lease_timeout=60.0, max_attempts=3):
+        """
+        Open (and create if needed) the job database
+        
+        Args:
+            db_path: Path of the SQLite database file
+            lease_timeout: Seconds without a heartbeat before a running job is re-queued
+            max_attempts: Attempts allowed before a job is marked failed
+        """
+        self.db_path = db_path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection; each thread and process gets its own"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def submit(self, source_path, options=None):
+        """
+        Add a sketch to the queue unless an identical job already exists
+        
+        An identical job that has failed is put back in the queue with a
+        fresh attempt budget.
+        
+        Args:
+            source_path: Path of the sketch image
+            options: Conversion options passed to convert_sketch
+            
+        Returns:
+            job_id: ID of the new or existing job
+            created: False if the submission was a duplicate of a queued, running or done job
+        """
+        options = options or {}
+        options_json = json.dumps(options, sort_keys=True)
+        
+        with open(source_path, "rb") as f:
+            digest = hashlib.sha256(f.read())
+        digest.update(options_json.encode())
+        content_hash = digest.hexdigest()
+        
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (content_hash, source_path, options, submitted_at) "
+                "VALUES (?, ?, ?, ?)",
+                (content_hash, os.path.abspath(source_path), options_json, time.time())
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            
+            # The UNIQUE hash would otherwise keep a failed job failed forever
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, error = NULL, worker_id = NULL, "
+                "heartbeat_at = NULL, started_at = NULL, finished_at = NULL, source_path = ?, "
+                "submitted_at = ? WHERE content_hash = ? AND state = 'failed'",
+                (os.path.abspath(source_path), time.time(), content_hash)
+            )
+            row = conn.execute("SELECT id FROM jobs WHERE content_hash = ?", (content_hash,)).fetchone()
+            return row["id"], cursor.rowcount == 1
+    
+    def claim(self, worker_id):
+        """
+        Take the oldest queued job and lease it to a worker
+        
+        Args:
+            worker_id: Identifier of the claiming worker
+            
+        Returns:
+            job: Job row as a dictionary, or None if the queue is empty
+        """
+        self.requeue_stale()
+        now = time.time()
+        
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET state = 'running', worker_id = ?, attempts = attempts + 1, "
+                    "heartbeat_at = ?, started_at = ?, error = NULL WHERE id = ?",
+                    (worker_id, now, now, row["id"])
+                )
+                
+                # Return the leased row, not the queued one read above
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        return job
+    
+    def heartbeat(self, job_id, worker_id):
+        """
+        Extend a worker's lease on a running job
+        
+        Returns:
+            alive: False if the job is no longer leased to this worker
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker_id = ? AND state = 'running'",
+                (time.time(), job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+    
+    def complete(self, job_id, worker_id, result_dir):
+        """
+        Mark a job as done
+        
+        Returns:
+            recorded: False if the lease had already been lost
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'done', finished_at = ?, result_dir = ? "
+                "WHERE id = ? AND worker_id = ? AND state = 'running'",
+                (time.time(), result_dir, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+    
+    def fail(self, job_id, worker_id, error):
+        """
+        Record a failed attempt, re-queueing the job while attempts remain
+        
+        Returns:
+            recorded: False if the lease had already been lost
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                "worker_id = NULL, finished_at = ?, error = ? "
+                "WHERE id = ? AND worker_id = ? AND state = 'running'",
+                (self.max_attempts, time.time(), str(error), job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+    
+    def requeue_stale(self):
+        """
+        Re-queue running jobs whose worker stopped sending heartbeats
+        
+        Returns:
+            count: Number of jobs re-queued or failed
+        """
+        now = time.time()
+        cutoff = now - self.lease_timeout
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                "worker_id = NULL, finished_at = ?, error = 'worker lease expired' "
+                "WHERE state = 'running' AND heartbeat_at < ?",
+                (self.max_attempts, now, cutoff)
+            )
+            return cursor.rowcount
+    
+    def status(self, window=300.0):
+        """
+        Summarize the queue
+        
+        Args:
+            window: Seconds of history used for the throughput figure
+            
+        Returns:
+            status: Dictionary with per-state counts, queue depth and throughput
+        """
+        since = time.time() - window
+        with self._connect() as conn:
+            counts = {
+                row["state"]: row["n"]
+                for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state")
+            }
+            finished = conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE state = 'done' AND finished_at >= ?",
+                (since,)
+            ).fetchone()["n"]
+        
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "queue_depth": counts.get("queued", 0) + counts.get("running", 0),
+            "throughput_per_min": round(finished * 60.0 / window, 2)
+        }
+
+class JobWorker:
+    """
+    Worker that pulls conversion jobs from a JobQueue
+    """
+    
+    def __init__(self, queue, results_dir, worker_id=None, heartbeat_interval=None):
+        """
+        Initialize the worker
+        
+        Args:
+            queue: JobQueue to pull from
+            results_dir: Root directory for results, laid out by content hash
+            worker_id: Identifier recorded on claimed jobs
+            heartbeat_interval: Seconds between heartbeats (defaults to a third of the lease)
+        """
+        self.queue = queue
+        self.results_dir = results_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval or queue.lease_timeout / 3
+    
+    def result_dir(self, content_hash):
+        """Directory holding the results for a content hash"""
+        return os.path.join(self.results_dir, content_hash[:2], content_hash)
+    
+    def run(self, exit_when_empty=False, poll_interval=1.0):
+        """
+        Process jobs until interrupted (or until the queue is empty)
+        
+        Returns:
+            processed: Number of jobs this worker handled
+        """
+        processed = 0
+        while True:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if exit_when_empty:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            self.process(job)
+            processed += 1
+    
+    def process(self, job):
+        """Convert one job while a background thread keeps its lease alive"""
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat_loop, args=(job["id"], stop), daemon=True)
+        beat.start()
+        
+        try:
+            result_dir = self.result_dir(job["content_hash"])
+            if not os.path.exists(os.path.join(result_dir, "result.json")):
+                self._convert(job, result_dir)
+        except Exception as e:
+            self.queue.fail(job["id"], self.worker_id, e)
+        else:
+            self.queue.complete(job["id"], self.worker_id, result_dir)
+        finally:
+            stop.set()
+            beat.join()
+    
+    def _heartbeat_loop(self, job_id, stop):
+        """Send heartbeats until the job finishes"""
+        while not stop.wait(self.heartbeat_interval):
+            if not self.queue.heartbeat(job_id, self.worker_id):
+                return
+    
+    def _convert(self, job, result_dir):
+        """Run the conversion and write the results atomically"""
+        with open(job["source_path"], "rb") as f:
+            image_bytes = f.read()
+        
+        options = job["options"]
+        program_name = options.get("program_name", "PATH_PROGRAM")
+        result = convert_sketch(
+            image_bytes,
+            program_name=program_name,
+            start_position=options.get("start_position", "HOME"),
+            motion_types=options.get("motion_types")
+        )
+        
+        # Write into a temporary directory and rename so a crash never leaves partial results
+        tmp_dir = f"{result_dir}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, f"{program_name}.src"), "w") as f:
+            f.write(result["src"])
+        with open(os.path.join(tmp_dir, f"{program_name}.dat"), "w") as f:
+            f.write(result["dat"])
+        with open(os.path.join(tmp_dir, "result.json"), "w") as f:
+            json.dump({
+                "source_path": job["source_path"],
+                "options": options,
+                "path_count": result["path_count"]
+            }, f, indent=2)
+        
+        try:
+            os.rename(tmp_dir, result_dir)
+        except OSError:
+            # Another worker finished the same content first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(result_dir, "result.json")):
+                raise
+
+def iter_image_files(paths):
+    """Expand files and directories into a sorted list of image files"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def _worker_main(db_path, results_dir, exit_when_empty, lease_timeout):
+    """Entry point for worker processes started by the CLI"""
+    worker = JobWorker(JobQueue(db_path, lease_timeout=lease_timeout), results_dir)
+    try:
+        worker.run(exit_when_empty=exit_when_empty)
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent sketch-to-KRL batch jobs")
+    parser.add_argument("--db", default="jobs.db", help="SQLite database path")
+    parser.add_argument("--lease-timeout", type=float, default=60.0)
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    submit = commands.add_parser("submit", help="Queue sketch images or directories")
+    submit.add_argument("paths", nargs="+")
+    submit.add_argument("--program", default="PATH_PROGRAM")
+    submit.add_argument("--start", default="HOME", choices=["HOME", "Anywhere"])
+    submit.add_argument("--motion", default="LIN", help="Comma separated motion types")
+    
+    work = commands.add_parser("work", help="Run workers that process queued jobs")
+    work.add_argument("--results", default="results")
+    work.add_argument("--workers", type=int, default=1)
+    work.add_argument("--exit-when-empty", action="store_true")
+    
+    commands.add_parser("status", help="Show queue depth and throughput")
+    
+    args = parser.parse_args()
+    queue = JobQueue(args.db, lease_timeout=args.lease_timeout)
+    
+    if args.command == "submit":
+        options = {
+            "program_name": args.program,
+            "start_position": args.start,
+            "motion_types": args.motion.upper().split(",")
+        }
+        created = skipped = 0
+        for path in iter_image_files(args.paths):
+            _, is_new = queue.submit(path, options)
+            created += is_new
+            skipped += not is_new
+        print(f"Queued {created} job(s), skipped {skipped} duplicate(s)")
+    
+    elif args.command == "work":
+        processes = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(args.db, args.results, args.exit_when_empty, args.lease_timeout)
+            )
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        print(json.dumps(queue.status(), indent=2))
+    
+    else:
+        print(json.dumps(queue.status(), indent=2))
+
+if __name__ == "__main__":
+    main()
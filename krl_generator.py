@@ -1,109 +1,499 @@
-class KRLGenerator:
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+# Millimetres of robot workspace per sketch pixel (a 500 px sketch spans 1000 mm)
+WORKSPACE_SCALE = 1000 / 500
+
+# Opcodes of the motion program; each command row is (opcode, a, b)
+OP_DEF = 0          # Start routine a
+OP_END = 1          # End the current routine
+OP_INIT = 2         # BAS (#INITMOV,0)
+OP_TOOL = 3         # BAS (#TOOL,a)
+OP_HOME = 4         # PTP HOME
+OP_START = 5        # PTP P0 (start from the current position)
+OP_PTP = 6          # PTP to point a
+OP_LIN = 7          # LIN to point a
+OP_CIRC = 8         # CIRC through point a to point b
+OP_SPLINE = 9       # Start a SPLINE block
+OP_SPL = 10         # SPL to point a
+OP_ENDSPLINE = 11   # End the SPLINE block
+OP_CALL = 12        # Call routine a
+
+class MotionProgram:
     """
-    Class for generating KUKA Robot Language (KRL) code from paths
+    Immutable, hashable motion program
+    
+    A program is a command array, a point array and the routine names the
+    commands refer to. It is compiled once from paths and options and can
+    then be rendered by any number of backends, from any thread, in any
+    order.
     """
     
-    def __init__(self, program_name="PATH_PROGRAM"):
+    __slots__ = ("routines", "commands", "points", "_hash")
+    
+    def __init__(self, routines, commands, points):
         """
-        Initialize the KRL generator
+        Initialize the program
         
         Args:
-            program_name: Name of the KRL program
+            routines: Routine names; the first one is the main program
+            commands: (K, 3) integer array of (opcode, a, b) rows; point
+                operands are 0-based indices into points
+            points: (N, 2) array of (x, y) sketch coordinates
         """
-        self.program_name = program_name
+        commands = np.array(commands, dtype=np.int32).reshape(-1, 3)
+        points = np.array(points, dtype=np.float64).reshape(-1, 2)
+        commands.flags.writeable = False
+        points.flags.writeable = False
+        
+        object.__setattr__(self, "routines", tuple(routines))
+        object.__setattr__(self, "commands", commands)
+        object.__setattr__(self, "points", points)
+        object.__setattr__(self, "_hash", hash((self.routines, commands.tobytes(), points.tobytes())))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("MotionProgram is immutable")
+    
+    def __reduce__(self):
+        return (MotionProgram, (self.routines, self.commands, self.points))
+    
+    def __hash__(self):
+        return self._hash
+    
+    def __eq__(self, other):
+        if not isinstance(other, MotionProgram):
+            return NotImplemented
+        return (
+            self._hash == other._hash
+            and self.routines == other.routines
+            and np.array_equal(self.commands, other.commands)
+            and np.array_equal(self.points, other.points)
+        )
+    
+    @property
+    def name(self):
+        """Name of the main program"""
+        return self.routines[0]
+    
+    def point_list(self):
+        """Get the points as a list of (x, y) tuples"""
+        return list(map(tuple, self.points.tolist()))
+
+class _ProgramBuilder:
+    """
+    Collects commands and the point table while a program is compiled
+    """
+    
+    def __init__(self, program_name, dedupe_tolerance=None, min_path_points=3):
+        self.routines = [program_name]
+        self.commands = []
         self.points = []
+        self.point_index = {}
+        self.dedupe_tolerance = dedupe_tolerance
+        self.min_path_points = min_path_points
     
-    def generate_src_code(self, paths, start_position, motion_types, use_coordinates=False):
+    def emit(self, opcode, a=0, b=0):
+        self.commands.append((opcode, a, b))
+    
+    def routine(self, name):
+        """Register a routine name and get its index"""
+        self.routines.append(name)
+        return len(self.routines) - 1
+    
+    def add_point(self, point):
         """
-        Generate KRL source code (.src file)
+        Add a point to the point table
+        
+        With deduplication enabled, coordinates are quantized to the
+        tolerance and looked up in a hash index of every stored point
+        (including neighbouring cells, so points straddling a cell border
+        still match); the nearest point within tolerance is reused.
         
         Args:
-            paths: List of paths as coordinate points
-            start_position: Starting position ("HOME" or "Anywhere")
-            motion_types: List of motion types to use (LIN, PTP, CIRC, SPLINE)
-            use_coordinates: Whether to use exact coordinates from the sketch
-            
+            point: (x, y) coordinate
+        
         Returns:
-            src_code: Generated KRL source code
+            index: 0-based index of the point in the table
         """
-        # Start with the program header
-        src_code = f"DEF {self.program_name}()\n"
-        src_code += "   BAS (#INITMOV,0)\n"
+        x, y = float(point[0]), float(point[1])
+        if self.dedupe_tolerance is None:
+            self.points.append((x, y))
+            return len(self.points) - 1
         
-        # Add start position
-        if start_position == "HOME":
-            src_code += "   PTP HOME\n"
-        else:
-            src_code += "   PTP P0\n"
+        if self.dedupe_tolerance <= 0:
+            key = (x, y)
+            if key not in self.point_index:
+                self.points.append(key)
+                self.point_index[key] = len(self.points) - 1
+            return self.point_index[key]
         
-        # Reset points list
-        self.points = []
+        # Points within tolerance are at most one cell apart when flooring
+        tolerance = self.dedupe_tolerance
+        cell_x, cell_y = math.floor(x / tolerance), math.floor(y / tolerance)
+        best = None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for index in self.point_index.get((cell_x + dx, cell_y + dy), ()):
+                    px, py = self.points[index]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance <= tolerance ** 2 and (best is None or distance < best[1]):
+                        best = (index, distance)
+        if best is not None:
+            return best[0]
         
-        # Generate motion commands based on extracted paths
-        point_index = 1
+        self.points.append((x, y))
+        self.point_index.setdefault((cell_x, cell_y), []).append(len(self.points) - 1)
+        return len(self.points) - 1
+    
+    def start(self, start_position):
+        """Emit the main program header and the move to the start position"""
+        self.emit(OP_DEF, 0)
+        self.emit(OP_INIT)
+        self.emit(OP_HOME if start_position == "HOME" else OP_START)
+    
+    def finish(self):
+        """Emit the return home and the end of the main program"""
+        self.emit(OP_HOME)
+        self.emit(OP_END)
+    
+    def motions(self, paths, motion_types):
+        """
+        Emit the motion commands for a set of paths
         
-        for path_idx, path in enumerate(paths):
-            if not path:
-                continue
-                
+        Args:
+            paths: List of paths as coordinate points
+            motion_types: List of motion types to use (LIN, PTP, CIRC, SPLINE)
+        """
+        # Distribute motion types along the path
+        motion_types = motion_types or ["LIN"]  # Default to LIN if none selected
+        
+        for path in paths:
             # Skip paths that are too short
-            if len(path) < 3:
+            if len(path) < self.min_path_points:
                 continue
             
-            # Distribute motion types along the path
-            if not motion_types:
-                motion_types = ["LIN"]  # Default to LIN if none selected
-            
             # Process points in the path
             i = 0
             while i < len(path):
                 motion_type = motion_types[i % len(motion_types)]
                 
-                # Store the point for DAT file generation
-                self.points.append(path[i])
-                
-                if motion_type == "CIRC" and i < len(path) - 2:
-                    # CIRC requires two points: auxiliary and end point
-                    aux_point = path[i + 1]
-                    end_point = path[i + 2]
-                    
-                    # Store the auxiliary point
-                    self.points.append(aux_point)
-                    
-                    src_code += f"   CIRC P{point_index}, P{point_index + 1}\n"
-                    point_index += 2
-                    i += 3  # Skip the next two points as they're used for the CIRC
+                if motion_type == "CIRC" and 0 < i < len(path) - 1:
+                    # Arc from the previous point through path[i] (auxiliary) to path[i + 1] (end)
+                    aux = self.add_point(path[i])
+                    end = self.add_point(path[i + 1])
+                    self.emit(OP_CIRC, aux, end)
+                    i += 2
                 
                 elif motion_type == "SPLINE" and i < len(path) - 3:
-                    # Start SPLINE block
-                    src_code += "   SPLINE\n"
-                    
-                    # Add SPL points
+                    # A SPLINE block of the next four points
+                    self.emit(OP_SPLINE)
                     spline_points = min(4, len(path) - i)
                     for j in range(spline_points):
-                        # Store the point
-                        if i + j < len(path):
-                            self.points.append(path[i + j])
-                            src_code += f"      SPL P{point_index}\n"
-                            point_index += 1
-                    
-                    # End SPLINE block
-                    src_code += "   ENDSPLINE\n"
+                        self.emit(OP_SPL, self.add_point(path[i + j]))
+                    self.emit(OP_ENDSPLINE)
                     i += spline_points  # Skip points used in the SPLINE
                 
                 else:
-                    # LIN or PTP
-                    src_code += f"   {motion_type} P{point_index}\n"
-                    point_index += 1
+                    # LIN or PTP; a CIRC onto the first point or a CIRC/SPLINE
+                    # without enough points left becomes a LIN
+                    self.emit(OP_PTP if motion_type == "PTP" else OP_LIN, self.add_point(path[i]))
                     i += 1
+    
+    def build(self):
+        return MotionProgram(self.routines, self.commands, self.points)
+
+def compile_program(paths, start_position, motion_types, program_name="PATH_PROGRAM",
+                    dedupe_tolerance=None, min_path_points=3):
+    """
+    Compile paths into a motion program
+    
+    Args:
+        paths: List of paths as coordinate points
+        start_position: Starting position ("HOME" or "Anywhere")
+        motion_types: List of motion types to use (LIN, PTP, CIRC, SPLINE)
+        program_name: Name of the KRL program
+        dedupe_tolerance: When set, points closer than this many pixels
+            share one point (0 merges exact duplicates only)
+        min_path_points: Paths with fewer points are skipped as noise
+    
+    Returns:
+        program: The compiled MotionProgram
+    """
+    builder = _ProgramBuilder(program_name, dedupe_tolerance, min_path_points)
+    builder.start(start_position)
+    builder.motions(paths, motion_types)
+    builder.finish()
+    return builder.build()
+
+def compile_shapes_program(shapes, start_position, program_name="PATH_PROGRAM", dedupe_tolerance=None):
+    """
+    Compile vector shapes into a motion program
+    
+    Lines and rectangles become LIN moves through their vertices and
+    circles become two half-circle CIRC moves.
+    
+    Args:
+        shapes: Shape dictionaries as returned by DrawingCanvas.get_drawing_shapes
+        start_position: Starting position ("HOME" or "Anywhere")
+        program_name: Name of the KRL program
+        dedupe_tolerance: When set, points closer than this many pixels share one point
+    
+    Returns:
+        program: The compiled MotionProgram
+    """
+    builder = _ProgramBuilder(program_name, dedupe_tolerance)
+    builder.start(start_position)
+    
+    for shape in shapes:
+        if shape["type"] == "circle":
+            cx, cy = shape["center"]
+            r = shape["radius"]
+            
+            # Move onto the circle, then two CIRCs of 180 degrees each
+            builder.emit(OP_LIN, builder.add_point((cx + r, cy)))
+            
+            for aux_point, end_point in [((cx, cy + r), (cx - r, cy)), ((cx, cy - r), (cx + r, cy))]:
+                aux = builder.add_point(aux_point)
+                builder.emit(OP_CIRC, aux, builder.add_point(end_point))
+        
+        else:
+            # Lines and rectangles: LIN through every corner
+            for point in shape["points"]:
+                builder.emit(OP_LIN, builder.add_point(point))
+    
+    builder.finish()
+    return builder.build()
+
+def compile_layered_program(layers, start_position, motion_types, tools=None, program_name="PATH_PROGRAM",
+                            dedupe_tolerance=None, min_path_points=3):
+    """
+    Compile color layers into a main program with one routine per layer
+    
+    Args:
+        layers: Ordered mapping of layer name to paths
+        start_position: Starting position ("HOME" or "Anywhere")
+        motion_types: List of motion types to use (LIN, PTP, CIRC, SPLINE)
+        tools: Mapping of layer name to tool number (defaults to layer order)
+        program_name: Name of the KRL program
+        dedupe_tolerance: When set, points closer than this many pixels share one point
+        min_path_points: Paths with fewer points are skipped as noise
+    
+    Returns:
+        program: The compiled MotionProgram
+    """
+    tools = tools or {name: i + 1 for i, name in enumerate(layers)}
+    builder = _ProgramBuilder(program_name, dedupe_tolerance, min_path_points)
+    routines = [(builder.routine(f"LAYER_{name.upper()}"), name) for name in layers]
+    
+    # Main program: start position, one call per layer, back home
+    builder.start(start_position)
+    for routine, _ in routines:
+        builder.emit(OP_CALL, routine)
+    builder.finish()
+    
+    # Layer routines share the point table
+    for routine, name in routines:
+        builder.emit(OP_DEF, routine)
+        builder.emit(OP_TOOL, tools[name])
+        builder.motions(layers[name], motion_types)
+        builder.emit(OP_END)
+    
+    return builder.build()
+
+@lru_cache(maxsize=128)
+def render_src(program):
+    """
+    Render a motion program as a KRL source file (.src)
+    
+    Args:
+        program: Compiled MotionProgram
+    
+    Returns:
+        src_code: KRL source code
+    """
+    routines = program.routines
+    lines = []
+    for opcode, a, b in program.commands.tolist():
+        if opcode == OP_DEF:
+            # Routines after the main program are separated by a blank line
+            if a > 0:
+                lines.append("\n")
+            lines.append(f"DEF {routines[a]}()\n")
+        elif opcode == OP_END:
+            lines.append("END\n")
+        elif opcode == OP_INIT:
+            lines.append("   BAS (#INITMOV,0)\n")
+        elif opcode == OP_TOOL:
+            lines.append(f"   BAS (#TOOL,{a})\n")
+        elif opcode == OP_HOME:
+            lines.append("   PTP HOME\n")
+        elif opcode == OP_START:
+            lines.append("   PTP P0\n")
+        elif opcode == OP_PTP:
+            lines.append(f"   PTP P{a + 1}\n")
+        elif opcode == OP_LIN:
+            lines.append(f"   LIN P{a + 1}\n")
+        elif opcode == OP_CIRC:
+            lines.append(f"   CIRC P{a + 1}, P{b + 1}\n")
+        elif opcode == OP_SPLINE:
+            lines.append("   SPLINE\n")
+        elif opcode == OP_SPL:
+            lines.append(f"      SPL P{a + 1}\n")
+        elif opcode == OP_ENDSPLINE:
+            lines.append("   ENDSPLINE\n")
+        elif opcode == OP_CALL:
+            lines.append(f"   {routines[a]}()\n")
+    return "".join(lines)
+
+@lru_cache(maxsize=128)
+def render_dat(program):
+    """
+    Render the point table of a motion program as a KRL data file (.dat)
+    
+    Args:
+        program: Compiled MotionProgram
+    
+    Returns:
+        dat_code: KRL data code
+    """
+    # Generate DAT file header
+    lines = [
+        f"&ACCESS RVP\n&REL 1\n&PARAM TEMPLATE = C_PTP\n&PARAM EDITMASK = *\nDEFDAT {program.name}\n\n",
+        "DECL E6POS XHOME={X 0.0,Y 0.0,Z 0.0,A 0.0,B 0.0,C 0.0}\n"
+    ]
+    
+    # Scale coordinates to a reasonable robot workspace (mm);
+    # Z varies between 120, 100 and 80 mm for visual interest
+    z_levels = (120, 100, 80)
+    for i, (x, y) in enumerate(program.points.tolist()):
+        x_scaled = x * WORKSPACE_SCALE
+        y_scaled = y * WORKSPACE_SCALE
+        z = z_levels[i % 3]
+        lines.append(f"DECL E6POS P{i+1}={{X {x_scaled:.1f},Y {y_scaled:.1f},Z {z:.1f},A 0.0,B 90.0,C 0.0}}\n")
+    
+    lines.append("ENDDAT\n")
+    return "".join(lines)
+
+# Output backends by format name; each takes a MotionProgram and returns text
+RENDERERS = {
+    "src": render_src,
+    "dat": render_dat
+}
+
+def render_program(program, formats=("src", "dat"), executor=None):
+    """
+    Render several outputs of one program concurrently
+    
+    Programs are immutable, so backends can run side by side on threads or,
+    since programs pickle, on a process pool.
+    
+    Args:
+        program: Compiled MotionProgram
+        formats: Names of the RENDERERS to run
+        executor: Executor to run them on (defaults to a thread per format)
+    
+    Returns:
+        outputs: Mapping of format name to rendered text
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max(1, len(formats))) as pool:
+            return render_program(program, formats, pool)
+    
+    futures = {name: executor.submit(RENDERERS[name], program) for name in formats}
+    return {name: future.result() for name, future in futures.items()}
+
+class KRLGenerator:
+    """
+    Class for generating KUKA Robot Language (KRL) code from paths
+    
+    The generator compiles a MotionProgram and renders it; `program` and
+    `points` hold the last compiled program so generate_dat_code can follow
+    a generate_src_code call as before.
+    """
+    
+    def __init__(self, program_name="PATH_PROGRAM", dedupe_tolerance=None, min_path_points=3):
+        """
+        Initialize the KRL generator
         
-        # Return to home position
-        src_code += "   PTP HOME\n"
+        Args:
+            program_name: Name of the KRL program
+            dedupe_tolerance: When set, points closer than this many pixels
+                share one DECL in the .dat file (0 merges exact duplicates only)
+            min_path_points: Paths with fewer points are skipped as noise
+        """
+        self.program_name = program_name
+        self.dedupe_tolerance = dedupe_tolerance
+        self.min_path_points = min_path_points
+        self.program = None
+        self.points = []
+    
+    def _use(self, program):
+        """Remember a compiled program and render its source"""
+        self.program = program
+        self.points = program.point_list()
+        return render_src(program)
+    
+    def generate_src_code(self, paths, start_position, motion_types, use_coordinates=False):
+        """
+        Generate KRL source code (.src file)
         
-        # End program
-        src_code += "END\n"
+        Args:
+            paths: List of paths as coordinate points
+            start_position: Starting position ("HOME" or "Anywhere")
+            motion_types: List of motion types to use (LIN, PTP, CIRC, SPLINE)
+            use_coordinates: Whether to use exact coordinates from the sketch
+        
+        Returns:
+            src_code: Generated KRL source code
+        """
+        return self._use(compile_program(
+            paths, start_position, motion_types,
+            self.program_name, self.dedupe_tolerance, self.min_path_points
+        ))
+    
+    def generate_src_code_from_shapes(self, shapes, start_position):
+        """
+        Generate KRL source code directly from vector shapes
+        
+        Lines and rectangles become LIN moves through their vertices and
+        circles become two half-circle CIRC moves, so drawings made on the
+        canvas keep their exact geometry and skip image processing.
+        
+        Args:
+            shapes: Shape dictionaries as returned by DrawingCanvas.get_drawing_shapes
+            start_position: Starting position ("HOME" or "Anywhere")
+        
+        Returns:
+            src_code: Generated KRL source code
+        """
+        return self._use(compile_shapes_program(
+            shapes, start_position, self.program_name, self.dedupe_tolerance
+        ))
+    
+    def generate_layered_src_code(self, layers, start_position, motion_types, tools=None):
+        """
+        Generate KRL source code with one sub-program per layer
+        
+        The main program calls the layer sub-programs in order; each one
+        selects its tool with BAS (#TOOL,n) before its moves. All layers share
+        one point table, so a single .dat file serves the whole program.
         
-        return src_code
+        Args:
+            layers: Ordered mapping of layer name to paths
+            start_position: Starting position ("HOME" or "Anywhere")
+            motion_types: List of motion types to use (LIN, PTP, CIRC, SPLINE)
+            tools: Mapping of layer name to tool number (defaults to layer order)
+        
+        Returns:
+            src_code: Generated KRL source code
+        """
+        return self._use(compile_layered_program(
+            layers, start_position, motion_types, tools,
+            self.program_name, self.dedupe_tolerance, self.min_path_points
+        ))
     
     def generate_dat_code(self, use_coordinates=False):
         """
@@ -111,34 +501,11 @@ class KRLGenerator:
         
         Args:
             use_coordinates: Whether to use exact coordinates from the sketch
-            
+        
         Returns:
             dat_code: Generated KRL data code
         """
-        # Generate DAT file header
-        dat_code = f"&ACCESS RVP\n&REL 1\n&PARAM TEMPLATE = C_PTP\n&PARAM EDITMASK = *\nDEFDAT {self.program_name}\n\n"
-        dat_code += "DECL E6POS XHOME={X 0.0,Y 0.0,Z 0.0,A 0.0,B 0.0,C 0.0}\n"
-        
-        # Add point definitions
-        for i, point in enumerate(self.points):
-            x, y = point
-            
-            # Scale coordinates to a reasonable robot workspace (mm)
-            # Assuming the sketch is in pixel coordinates
-            x_scaled = (x / 500) * 1000  # Scale to 0-1000mm range
-            y_scaled = (y / 500) * 1000
-            z = 100  # Fixed Z height for simplicity
-            
-            # Add some variation to Z for visual interest
-            if i % 3 == 0:
-                z = 120
-            elif i % 3 == 1:
-                z = 100
-            else:
-                z = 80
-            
-            dat_code += f"DECL E6POS P{i+1}={{X {x_scaled:.1f},Y {y_scaled:.1f},Z {z:.1f},A 0.0,B 90.0,C 0.0}}\n"
-        
-        dat_code += "ENDDAT\n"
-        
-        return dat_code
\ No newline at end of file
+        program = self.program
+        if program is None or program.name != self.program_name:
+            program = MotionProgram([self.program_name], [], self.points)
+        return render_dat(program)
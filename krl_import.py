@@ -0,0 +1,431 @@
+"""
+Import existing KRL programs and re-optimize them
+
+Reads .src/.dat pairs in the format KRLGenerator writes (DEF ... PTP/LIN/
+CIRC/SPLINE ... END with DECL E6POS points) back into pixel paths, then runs
+them through the same simplification, joining, ordering and generation
+stages as freshly extracted sketches. Programs that switch tools with
+BAS (#TOOL,n), such as layered programs, are optimized one tool at a time
+and written back with one sub-program per tool.
+
+Usage:
+    python krl_import.py legacy/*.src --out-dir optimized
+    python krl_import.py legacy/ --out-dir optimized --tolerance 2 --dedupe 1 --report report.json
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from path_extraction import simplify_paths, join_paths, order_paths
+from krl_generator import KRLGenerator, WORKSPACE_SCALE
+
+DECL_PATTERN = re.compile(r"^\s*DECL\s+(?:GLOBAL\s+)?E6POS\s+(\w+)\s*=\s*\{([^}]*)\}", re.IGNORECASE)
+FIELD_PATTERN = re.compile(r"([A-Za-z]\w*)\s+(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)")
+DEF_PATTERN = re.compile(r"^\s*(?:GLOBAL\s+)?DEF\s+(\w+)\s*\(", re.IGNORECASE)
+CALL_PATTERN = re.compile(r"^\s*(\w+)\s*\(\s*\)\s*$")
+TOOL_PATTERN = re.compile(r"^\s*BAS\s*\(\s*#TOOL\s*,\s*(\d+)\s*\)", re.IGNORECASE)
+MOTION_PATTERN = re.compile(r"^\s*(PTP|LIN|CIRC|SPL|SLIN|SCIRC)\s+(.*)$", re.IGNORECASE)
+POINT_NAME_PATTERN = re.compile(r"[A-Za-z_]\w*")
+
+class KRLParseError(ValueError):
+    """A program that cannot be read as KRL motion code"""
+
+def parse_dat(text):
+    """
+    Read the E6POS point declarations of a .dat file
+    
+    Args:
+        text: Contents of the .dat file
+    
+    Returns:
+        points: Mapping of upper-case point name to (X, Y, Z) in millimetres
+    """
+    points = {}
+    for line in text.splitlines():
+        match = DECL_PATTERN.match(line)
+        if match is None:
+            continue
+        fields = {name.upper(): float(value) for name, value in FIELD_PATTERN.findall(match.group(2))}
+        points[match.group(1).upper()] = (fields.get("X", 0.0), fields.get("Y", 0.0), fields.get("Z", 0.0))
+    return points
+
+def parse_src(text):
+    """
+    Read the motion commands of a .src file
+    
+    Calls to sub-programs defined in the same file (as in layered programs)
+    are inlined, so the result follows execution order. Tool changes are
+    kept in place as ("TOOL", [routine name, tool number]) entries.
+    
+    Args:
+        text: Contents of the .src file
+    
+    Returns:
+        program_name: Name of the first DEF in the file
+        commands: List of (motion, point names) in execution order, with
+            motion one of PTP, LIN, CIRC, SPL or TOOL
+    """
+    bodies = {}
+    order = []
+    current = None
+    for line in text.splitlines():
+        line = line.split(";", 1)[0]
+        match = DEF_PATTERN.match(line)
+        if match:
+            current = match.group(1).upper()
+            bodies[current] = []
+            order.append(current)
+            continue
+        if current is None:
+            continue
+        if line.strip().upper() == "END":
+            current = None
+            continue
+        
+        match = MOTION_PATTERN.match(line)
+        if match:
+            motion = match.group(1).upper()
+            motion = {"SLIN": "LIN", "SCIRC": "CIRC"}.get(motion, motion)
+            names = [name.upper() for name in POINT_NAME_PATTERN.findall(match.group(2).split(" C_", 1)[0])]
+            bodies[current].append((motion, names))
+            continue
+        
+        match = TOOL_PATTERN.match(line)
+        if match:
+            bodies[current].append(("TOOL", [current, match.group(1)]))
+            continue
+        
+        match = CALL_PATTERN.match(line)
+        if match:
+            bodies[current].append(("CALL", [match.group(1).upper()]))
+    
+    if not order:
+        raise KRLParseError("No DEF found in .src file")
+    
+    commands = []
+    stack = [(order[0], iter(bodies[order[0]]))]
+    active = {order[0]}
+    while stack:
+        name, body = stack[-1]
+        command = next(body, None)
+        if command is None:
+            stack.pop()
+            active.discard(name)
+        elif command[0] != "CALL":
+            commands.append(command)
+        elif command[1][0] in bodies and command[1][0] not in active:
+            callee = command[1][0]
+            stack.append((callee, iter(bodies[callee])))
+            active.add(callee)
+    return order[0], commands
+
+def commands_to_paths(commands, points):
+    """
+    Turn motion commands into pixel paths
+    
+    A PTP that follows LIN, CIRC or SPL moves is a travel move and starts a
+    new path at its target; consecutive PTP targets (as in PTP-only
+    programs) form one path. LIN, CIRC (auxiliary and end point) and SPL
+    points extend the current path. Points without a declaration (HOME, P0)
+    and tool changes end the current path.
+    
+    Args:
+        commands: List of (motion, point names) as returned by parse_src
+        points: Mapping of point name to (X, Y, Z) as returned by parse_dat
+    
+    Returns:
+        paths: List of paths as lists of (x, y) tuples in sketch pixels
+    """
+    paths = []
+    current = []
+    previous = None
+    for motion, names in commands:
+        if motion == "TOOL" or (motion == "PTP" and previous not in (None, "PTP")):
+            if current:
+                paths.append(current)
+                current = []
+        if motion == "TOOL":
+            previous = None
+            continue
+        previous = motion
+        for name in names:
+            point = points.get(name)
+            if point is None:
+                if current:
+                    paths.append(current)
+                    current = []
+                continue
+            current.append((point[0] / WORKSPACE_SCALE, point[1] / WORKSPACE_SCALE))
+    if current:
+        paths.append(current)
+    return paths
+
+def program_stats(commands, points):
+    """
+    Measure a program: distinct points used and distance travelled
+    
+    Args:
+        commands: List of (motion, point names) as returned by parse_src
+        points: Mapping of point name to (X, Y, Z) as returned by parse_dat
+    
+    Returns:
+        stats: Dictionary with "points", "motions" and "path_length_mm"
+    """
+    used = set()
+    length = 0.0
+    previous = None
+    motions = 0
+    for motion, names in commands:
+        if motion == "TOOL":
+            continue
+        motions += 1
+        for name in names:
+            point = points.get(name)
+            if point is None:
+                continue
+            used.add(name)
+            if previous is not None:
+                length += math.dist(previous, point[:2])
+            previous = point[:2]
+    return {"points": len(used), "motions": motions, "path_length_mm": round(length, 1)}
+
+def split_layers(commands):
+    """
+    Split motion commands at tool changes
+    
+    A tool selected in a LAYER_<NAME> sub-program names its layer <name>;
+    one selected elsewhere is named after its routine. Selecting the same
+    tool from the same routine again continues that layer.
+    
+    Args:
+        commands: List of (motion, point names) as returned by parse_src
+    
+    Returns:
+        layers: List of (name, tool, commands) in order of first use; the
+            commands before the first tool change have name and tool None
+            and are only listed when there are any
+    """
+    layers = OrderedDict()
+    current = None
+    for motion, names in commands:
+        if motion != "TOOL":
+            layers.setdefault(current, (None, []))[1].append((motion, names))
+            continue
+        routine, tool = names[0], int(names[1])
+        name = (routine[len("LAYER_"):] if routine.startswith("LAYER_") else routine).lower()
+        if name in layers and layers[name][0] != tool:
+            name = f"{name}_{tool}"
+        layers.setdefault(name, (tool, []))
+        current = name
+    return [(name, tool, layer_commands) for name, (tool, layer_commands) in layers.items()]
+def load_program(src_path, dat_path=None):
+    """
+    Load a .src/.dat pair as pixel paths, grouped by tool
+    
+    Args:
+        src_path: Path to the .src file
+        dat_path: Path to the .dat file (defaults to the .src's sibling)
+    
+    Returns:
+        program_name: Name of the program's DEF
+        layers: List of (name, tool, paths) as in split_layers, with paths
+            in sketch pixels; a program without tool changes is a single
+            (None, None, paths) layer
+        stats: Point count and path length of the program (see program_stats)
+    """
+    dat_path = dat_path or find_dat_file(src_path)
+    if dat_path is None:
+        raise KRLParseError(f"No .dat file found next to {src_path}")
+    
+    with open(src_path, encoding="latin-1") as f:
+        program_name, commands = parse_src(f.read())
+    with open(dat_path, encoding="latin-1") as f:
+        points = parse_dat(f.read())
+    
+    layers = [
+        (name, tool, commands_to_paths(layer_commands, points))
+        for name, tool, layer_commands in split_layers(commands)
+    ]
+    return program_name, layers, program_stats(commands, points)
+
+def find_dat_file(src_path):
+    """Find the .dat file belonging to a .src file, ignoring extension case"""
+    stem, _ = os.path.splitext(src_path)
+    for extension in (".dat", ".DAT", ".Dat"):
+        if os.path.exists(stem + extension):
+            return stem + extension
+    return None
+
+def reoptimize_paths(paths, tolerance=1.0, join_gap=2.0, join_angle=45.0, start=(0, 0)):
+    """
+    Simplify, join and reorder imported paths
+    
+    Args:
+        paths: List of paths in sketch pixels
+        tolerance: Largest deviation in pixels allowed when dropping points
+        join_gap: Largest endpoint distance in pixels bridged when joining paths
+        join_angle: Largest direction change in degrees allowed across a joint
+        start: Position the tool starts from (HOME is the origin)
+    
+    Returns:
+        paths: Optimized paths in drawing order
+    """
+    paths = simplify_paths(paths, tolerance)
+    paths = join_paths(paths, join_gap, join_angle)
+    
+    # Joining may create new removable vertices at the joints
+    paths = simplify_paths(paths, tolerance)
+    return order_paths(paths, start)
+
+def reoptimize_program(src_path, out_dir, dat_path=None, tolerance=1.0, join_gap=2.0,
+                       dedupe_tolerance=0.5, motion_types=None, start_position="HOME"):
+    """
+    Re-optimize one program and write the result
+    
+    Each tool's paths are optimized on their own, so strokes are never
+    joined or reordered across tool changes, and a program with tool
+    changes is written back with one LAYER_<NAME> sub-program per tool.
+    
+    Args:
+        src_path: Path to the legacy .src file
+        out_dir: Directory for the optimized .src/.dat pair
+        dat_path: Path to the legacy .dat file (defaults to the .src's sibling)
+        tolerance: Largest deviation in pixels allowed when dropping points
+        join_gap: Largest endpoint distance in pixels bridged when joining paths
+        dedupe_tolerance: Points closer than this many pixels share one DECL
+        motion_types: List of motion types to use (defaults to LIN)
+        start_position: Starting position ("HOME" or "Anywhere")
+    
+    Returns:
+        report: Dictionary with the program name, output paths and the
+            "before"/"after" stats
+    
+    Raises:
+        KRLParseError: If a program that changes tools draws before
+            selecting one, or nothing drawable is left after optimization
+    """
+    program_name, layers, before = load_program(src_path, dat_path)
+    tools = OrderedDict((name, tool) for name, tool, _ in layers if tool is not None)
+    if tools and any(tool is None and paths for _, tool, paths in layers):
+        raise KRLParseError(f"{src_path} draws before selecting a tool")
+    
+    # Each layer continues from where the previous one ended
+    optimized = OrderedDict()
+    position = (0, 0)
+    for name, tool, paths in layers:
+        if tools and tool is None:
+            continue
+        paths = reoptimize_paths(paths, tolerance, join_gap, start=position)
+        optimized[name] = paths
+        if paths:
+            position = paths[-1][-1]
+    
+    if not any(len(path) >= 2 for paths in optimized.values() for path in paths):
+        raise KRLParseError(f"No drawable paths in {src_path}")
+    
+    # Straight segments simplify to two points; keep them
+    krl_gen = KRLGenerator(program_name, dedupe_tolerance=dedupe_tolerance, min_path_points=2)
+    if tools:
+        src_code = krl_gen.generate_layered_src_code(
+            optimized, start_position, motion_types or ["LIN"], tools
+        )
+    else:
+        src_code = krl_gen.generate_src_code(optimized[None], start_position, motion_types or ["LIN"])
+    dat_code = krl_gen.generate_dat_code()
+    
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, os.path.splitext(os.path.basename(src_path))[0])
+    with open(base + ".src", "w") as f:
+        f.write(src_code)
+    with open(base + ".dat", "w") as f:
+        f.write(dat_code)
+    
+    _, commands = parse_src(src_code)
+    after = program_stats(commands, parse_dat(dat_code))
+    return {
+        "program": program_name,
+        "source": src_path,
+        "output": base + ".src",
+        "before": before,
+        "after": after
+    }
+
+def _reoptimize_job(job):
+    """Run one program in a worker process, reporting errors instead of raising"""
+    src_path, options = job
+    try:
+        return reoptimize_program(src_path, **options)
+    except (OSError, KRLParseError) as error:
+        return {"source": src_path, "error": str(error)}
+
+def iter_src_files(paths):
+    """Expand files, directories and glob patterns into .src files"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(".src"):
+                    yield os.path.join(path, name)
+        elif any(char in path for char in "*?["):
+            yield from sorted(glob.glob(path))
+        else:
+            yield path
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-optimize existing KRL .src/.dat programs")
+    parser.add_argument("inputs", nargs="+", help=".src files, directories or glob patterns")
+    parser.add_argument("--out-dir", required=True, help="Directory for the optimized programs")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="Simplification tolerance in pixels")
+    parser.add_argument("--join-gap", type=float, default=2.0, help="Largest gap in pixels joined between paths")
+    parser.add_argument("--dedupe", type=float, default=0.5, help="Point merge tolerance in pixels")
+    parser.add_argument("--motion", default="LIN", help="Comma-separated motion types")
+    parser.add_argument("--start", default="HOME", choices=["HOME", "Anywhere"], help="Start position")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--report", help="Write the before/after report to this JSON file")
+    args = parser.parse_args()
+    
+    options = {
+        "out_dir": args.out_dir,
+        "tolerance": args.tolerance,
+        "join_gap": args.join_gap,
+        "dedupe_tolerance": args.dedupe,
+        "motion_types": [m.strip().upper() for m in args.motion.split(",") if m.strip()],
+        "start_position": args.start
+    }
+    jobs = [(src_path, options) for src_path in iter_src_files(args.inputs)]
+    if not jobs:
+        parser.error("No .src files found")
+    
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        reports = list(executor.map(_reoptimize_job, jobs))
+    
+    print(f"{'program':<24}  {'points':>15}  {'path length (mm)':>23}")
+    totals = {"before": {"points": 0, "path_length_mm": 0.0}, "after": {"points": 0, "path_length_mm": 0.0}}
+    for report in reports:
+        if "error" in report:
+            print(f"{os.path.basename(report['source']):<24}  error: {report['error']}")
+            continue
+        before, after = report["before"], report["after"]
+        print(
+            f"{report['program']:<24}  {before['points']:>6} -> {after['points']:<6}  "
+            f"{before['path_length_mm']:>10.1f} -> {after['path_length_mm']:<10.1f}"
+        )
+        for side in ("before", "after"):
+            totals[side]["points"] += report[side]["points"]
+            totals[side]["path_length_mm"] += report[side]["path_length_mm"]
+    
+    print(
+        f"{'total':<24}  {totals['before']['points']:>6} -> {totals['after']['points']:<6}  "
+        f"{totals['before']['path_length_mm']:>10.1f} -> {totals['after']['path_length_mm']:<10.1f}"
+    )
+    
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"programs": reports, "totals": totals}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
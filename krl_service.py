@@ -0,0 +1,367 @@
+"""
+Standalone HTTP service for sketch-to-KRL conversion
+
+Runs without Streamlit so that MES and other shop-floor systems can post
+sketch images and receive KRL programs back.
+
+Endpoints:
+    POST /convert   Image bytes in the request body. Query parameters:
+                    format=zip|src|dat (default zip), program=NAME,
+                    start=HOME|Anywhere, motion=LIN,CIRC,...
+    GET  /health    Liveness check
+    GET  /metrics   Queue, worker and latency statistics as JSON
+
+Usage:
+    python krl_service.py --port 8080 --workers 2 --queue-limit 8 --timeout 30 --warm-up
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from conversion import convert_sketch, MOTION_TYPES, START_POSITIONS
+from file_utils import create_zip_bytes
+from lazy_imports import warm_up
+
+PROGRAM_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,23}$")
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    504: "Gateway Timeout"
+}
+
+class RequestError(Exception):
+    """Error that maps directly onto an HTTP error response"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class KRLService:
+    """
+    Asyncio HTTP server that converts sketches on a bounded process pool
+    """
+    
+    def __init__(self, workers=2, queue_limit=8, timeout=30.0, max_body_bytes=20 * 1024 * 1024,
+                 warm_start=False):
+        """
+        Initialize the service
+        
+        Args:
+            workers: Number of worker processes doing the CPU-bound conversion
+            queue_limit: Requests allowed to wait for a worker before 429s are returned
+            timeout: Per-request deadline in seconds, covering queueing and conversion
+            max_body_bytes: Largest accepted image upload
+            warm_start: Start every worker process and preload its libraries
+                before accepting connections
+        """
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.warm_start = warm_start
+        
+        self.executor = None
+        self.slots = None
+        self.pending = 0
+        self.busy_workers = 0
+        self.started_at = time.time()
+        self.counters = {
+            "requests": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "failed": 0
+        }
+        self.latencies = deque(maxlen=1000)
+    
+    async def start(self, host="127.0.0.1", port=8080):
+        """
+        Start the worker pool and begin listening for connections
+        
+        Returns:
+            server: The asyncio server object
+        """
+        # Forked workers would inherit open client sockets and keep those
+        # connections from closing, so start them from a clean server process
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=warm_up if self.warm_start else None
+        )
+        self.slots = asyncio.Semaphore(self.workers)
+        
+        if self.warm_start:
+            # Concurrent no-op jobs make the pool spawn (and warm up) every worker now
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[
+                loop.run_in_executor(self.executor, os.getpid) for _ in range(self.workers)
+            ])
+        
+        return await asyncio.start_server(self.handle_connection, host, port)
+    
+    def close(self):
+        """Shut down the worker pool"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+    
+    async def handle_connection(self, reader, writer):
+        """Serve a single HTTP request on a connection"""
+        try:
+            try:
+                method, target, headers = await self.read_request_head(reader)
+                status, content_type, body, extra_headers = await self.dispatch(method, target, headers, reader)
+            except RequestError as e:
+                status, content_type, extra_headers = e.status, "application/json", {}
+                body = json.dumps({"error": e.message}).encode()
+                if e.status == 429:
+                    extra_headers["Retry-After"] = "1"
+            await self.write_response(writer, status, content_type, body, extra_headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def read_request_head(self, reader):
+        """
+        Read and parse the request line and headers
+        
+        Returns:
+            method: HTTP method
+            target: Request target (path and query)
+            headers: Dictionary of lower-cased header names to values
+        """
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise RequestError(400, "Malformed request line")
+        
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        return parts[0].upper(), parts[1], headers
+    
+    async def dispatch(self, method, target, headers, reader):
+        """
+        Route a request to its handler
+        
+        Returns:
+            status: HTTP status code
+            content_type: Response content type
+            body: Response body bytes
+            extra_headers: Additional response headers
+        """
+        url = urlsplit(target)
+        
+        if url.path == "/health":
+            return 200, "application/json", json.dumps({"status": "ok"}).encode(), {}
+        
+        if url.path == "/metrics":
+            return 200, "application/json", json.dumps(self.metrics(), indent=2).encode(), {}
+        
+        if url.path == "/convert":
+            if method != "POST":
+                raise RequestError(405, "Use POST to submit an image")
+            body = await self.read_body(reader, headers)
+            return await self.handle_convert(parse_qs(url.query), body)
+        
+        raise RequestError(404, f"Unknown path {url.path}")
+    
+    async def read_body(self, reader, headers):
+        """Read the request body, enforcing the upload size limit"""
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise RequestError(400, "Invalid Content-Length")
+        if length <= 0:
+            raise RequestError(400, "Request body must contain image data")
+        if length > self.max_body_bytes:
+            raise RequestError(413, f"Image exceeds {self.max_body_bytes} bytes")
+        return await reader.readexactly(length)
+    
+    async def handle_convert(self, query, image_bytes):
+        """Validate options, run the conversion and package the result"""
+        output_format = query.get("format", ["zip"])[0]
+        program_name = query.get("program", ["PATH_PROGRAM"])[0]
+        start_position = query.get("start", ["HOME"])[0]
+        motion_types = [m for m in query.get("motion", ["LIN"])[0].upper().split(",") if m]
+        
+        if output_format not in ("zip", "src", "dat"):
+            raise RequestError(400, "format must be zip, src or dat")
+        if not PROGRAM_NAME_PATTERN.match(program_name):
+            raise RequestError(400, "program must be a valid KRL identifier")
+        if start_position not in START_POSITIONS:
+            raise RequestError(400, f"start must be one of {START_POSITIONS}")
+        if not motion_types or any(m not in MOTION_TYPES for m in motion_types):
+            raise RequestError(400, f"motion must be a comma separated subset of {MOTION_TYPES}")
+        
+        result = await self.submit(image_bytes, program_name, start_position, motion_types)
+        
+        if output_format == "src":
+            return 200, "text/plain; charset=utf-8", result["src"].encode(), {}
+        if output_format == "dat":
+            return 200, "text/plain; charset=utf-8", result["dat"].encode(), {}
+        
+        zip_bytes = create_zip_bytes({
+            f"{program_name}.src": result["src"],
+            f"{program_name}.dat": result["dat"]
+        })
+        disposition = {"Content-Disposition": f'attachment; filename="{program_name}.zip"'}
+        return 200, "application/zip", zip_bytes, disposition
+    
+    async def submit(self, *args):
+        """
+        Admit a conversion job, applying backpressure and the request deadline
+        
+        Returns:
+            result: Conversion result dictionary from convert_sketch
+        """
+        self.counters["requests"] += 1
+        
+        # Reject when every worker is busy and the waiting queue is full
+        if self.pending >= self.workers + self.queue_limit:
+            self.counters["rejected"] += 1
+            raise RequestError(429, "Server is at capacity, retry later")
+        
+        self.pending += 1
+        job = {"started": False}
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.run_in_pool(job, *args), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            raise RequestError(504, f"Conversion did not finish within {self.timeout:.1f}s")
+        except ValueError as e:
+            self.counters["failed"] += 1
+            raise RequestError(400, str(e))
+        except Exception as e:
+            self.counters["failed"] += 1
+            raise RequestError(500, f"Conversion failed: {e}")
+        finally:
+            # A job that reached a worker stays pending until the worker finishes it
+            if not job["started"]:
+                self.pending -= 1
+        
+        self.counters["completed"] += 1
+        self.latencies.append(time.perf_counter() - start)
+        return result
+    
+    async def run_in_pool(self, job, *args):
+        """
+        Run convert_sketch on a free worker process
+        
+        Args:
+            job: Dictionary whose "started" flag is set once the job is
+                handed to a worker
+        """
+        await self.slots.acquire()
+        self.busy_workers += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, convert_sketch, *args)
+        
+        # A process cannot be interrupted, so a timed-out job keeps its
+        # slot and its place in the admission count until the worker actually finishes
+        future.add_done_callback(self.release_slot)
+        job["started"] = True
+        return await asyncio.shield(future)
+    
+    def release_slot(self, future):
+        """Return a worker slot and an admission place once its job has finished"""
+        self.busy_workers -= 1
+        self.pending -= 1
+        self.slots.release()
+    
+    async def write_response(self, writer, status, content_type, body, extra_headers):
+        """Write a complete HTTP response and flush it"""
+        head = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close"
+        ]
+        head.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+    
+    def metrics(self):
+        """
+        Collect service statistics
+        
+        Returns:
+            metrics: Dictionary of counters, queue state and latency percentiles
+        """
+        latencies = sorted(self.latencies)
+        
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+        
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "busy_workers": self.busy_workers,
+            "queued": max(0, self.pending - self.busy_workers),
+            "queue_limit": self.queue_limit,
+            "counters": dict(self.counters),
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p90": percentile(0.90),
+                "p99": percentile(0.99)
+            }
+        }
+
+async def serve(host, port, **service_options):
+    """Run the service until interrupted"""
+    service = KRLService(**service_options)
+    server = await service.start(host, port)
+    print(f"Serving sketch-to-KRL on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Sketch-to-KRL HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2, help="Conversion worker processes")
+    parser.add_argument("--queue-limit", type=int, default=8, help="Waiting requests before 429")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request deadline in seconds")
+    parser.add_argument("--warm-up", action="store_true", help="Preload libraries in every worker at startup")
+    args = parser.parse_args()
+    
+    try:
+        asyncio.run(serve(
+            args.host, args.port,
+            workers=args.workers,
+            queue_limit=args.queue_limit,
+            timeout=args.timeout,
+            warm_start=args.warm_up
+        ))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Deferred loading of heavy third-party libraries
+
+OpenCV, Matplotlib and Pillow take hundreds of milliseconds to import. The
+modules in this project bind them through lazy_import() so they are only
+loaded when the stage that needs them first runs, which keeps the cold
+start of the app, the HTTP service and the batch workers short.
+"""
+import importlib
+import sys
+import threading
+import time
+
+# Heavy modules needed by each pipeline stage, used by warm_up()
+STAGE_MODULES = {
+    "extraction": ["cv2"],
+    "visualization": ["matplotlib.pyplot"],
+    "canvas": ["PIL.Image", "PIL.ImageDraw"]
+}
+
+class LazyModule:
+    """
+    Stand-in for a module that imports the real module on first attribute access
+    """
+    
+    def __init__(self, name):
+        """
+        Args:
+            name: Fully qualified module name, e.g. "matplotlib.pyplot"
+        """
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+    
+    def _load(self):
+        """Import the wrapped module (once) and return it"""
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self._name)
+            self.__dict__["_module"] = module
+        return module
+    
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+    
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+    
+    def __dir__(self):
+        return dir(self._load())
+    
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    """
+    Return a lazily loaded module
+    
+    If the module has already been imported elsewhere the real module is
+    returned directly.
+    
+    Args:
+        name: Fully qualified module name
+        
+    Returns:
+        module: The module, or a LazyModule proxy for it
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+def warm_up(stages=None, background=False):
+    """
+    Import the heavy libraries for the given stages ahead of the first request
+    
+    Args:
+        stages: Stage names from STAGE_MODULES (defaults to all stages)
+        background: Run in a daemon thread and return immediately
+        
+    Returns:
+        timings: Dictionary of {module name: import seconds}, or the thread
+            when running in the background
+    """
+    if background:
+        thread = threading.Thread(target=warm_up, args=(stages,), daemon=True, name="warm-up")
+        thread.start()
+        return thread
+    
+    timings = {}
+    for stage in stages or STAGE_MODULES:
+        for name in STAGE_MODULES[stage]:
+            start = time.perf_counter()
+            importlib.import_module(name)
+            timings[name] = time.perf_counter() - start
+    
+    # Run a tiny extraction so OpenCV's first-call initialization is paid too
+    if stages is None or "extraction" in stages:
+        import numpy as np
+        from path_extraction import extract_paths_from_sketch
+        
+        start = time.perf_counter()
+        image = np.full((32, 32, 3), 255, np.uint8)
+        image[8:24, 15:17] = 0
+        extract_paths_from_sketch(image)
+        timings["extraction_first_call"] = time.perf_counter() - start
+    
+    return timings
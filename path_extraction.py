@@ -1,66 +1,673 @@
-import cv2
 import numpy as np
-from skimage import measure
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-def extract_paths_from_sketch(image):
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Below this many contours the thread pool costs more than it saves
+PARALLEL_CONTOUR_THRESHOLD = 512
+
+# Number of contours handed to a worker at a time
+CONTOUR_CHUNK_SIZE = 256
+
+# Binarization and filtering parameters; auto_tune.py searches over these
+DEFAULT_EXTRACTION_PARAMS = {
+    "blur_kernel": 5,           # Gaussian blur kernel size (odd)
+    "block_size": 11,           # Adaptive threshold neighbourhood (odd)
+    "threshold_c": 2,           # Constant subtracted from the neighbourhood mean
+    "morph_iterations": 1,      # Closing iterations that bridge small gaps
+    "min_contour_points": 10    # Contours with this many points or fewer are dropped
+}
+
+def extraction_params(params=None):
+    """
+    Fill in missing extraction parameters with their defaults
+    
+    Args:
+        params: Partial or complete parameter dictionary (None for defaults)
+        
+    Returns:
+        params: Complete parameter dictionary
+    """
+    return {**DEFAULT_EXTRACTION_PARAMS, **(params or {})}
+
+def extract_paths_from_sketch(image, join_strokes=False, join_gap=8.0, join_angle=45.0, params=None):
     """
     Extract paths from a sketch image using OpenCV
     
     Args:
         image: Input image as numpy array (BGR format)
+        join_strokes: Open single-line strokes and merge fragments separated by small gaps
+        join_gap: Largest gap in pixels bridged when joining strokes
+        join_angle: Largest direction change in degrees allowed across a joint
+        params: Extraction parameters overriding DEFAULT_EXTRACTION_PARAMS
         
     Returns:
         processed_image: Visualization of the processed image
         paths: List of extracted paths as coordinate points
     """
+    params = extraction_params(params)
+    
+    # Threshold, thin and trace the strokes
+    contours, paths = trace_strokes(
+        binarize_sketch(image, params), join_strokes, join_gap, join_angle, params["min_contour_points"]
+    )
+    
+    # Create a visualization image
+    vis_image = image.copy()
+    cv2.drawContours(vis_image, contours, -1, (0, 255, 0), 2)
+    
+    return vis_image, paths
+
+def trace_strokes(mask, join_strokes=False, join_gap=8.0, join_angle=45.0, min_points=10):
+    """
+    Thin a binary stroke mask and trace it into paths
+    
+    Args:
+        mask: Binary uint8 image with strokes set to 255
+        join_strokes: Open single-line strokes and merge fragments separated by small gaps
+        join_gap: Largest gap in pixels bridged when joining strokes
+        join_angle: Largest direction change in degrees allowed across a joint
+        min_points: Contours with this many points or fewer are dropped; when
+            joining, strokes shorter than this many pixels are dropped after
+            the fragments have been joined (a skeleton contour has about one
+            point per pixel of stroke)
+        
+    Returns:
+        contours: Raw skeleton contours as returned by OpenCV
+        paths: List of extracted paths as coordinate points
+    """
+    # Find contours in the skeletonized image
+    contours = find_skeleton_contours(skeletonize(mask))
+    
+    if join_strokes:
+        # Keep short fragments until after joining, then drop what is still too short
+        coords, offsets = simplify_contours(contours, min_points=0, open_strokes=True)
+        paths = join_paths(paths_from_arrays(coords, offsets), join_gap, join_angle, min_length=min_points)
+        return contours, paths
+    
+    # Simplify the contours into a packed coordinate array
+    coords, offsets = simplify_contours(contours, min_points=min_points)
+    return contours, paths_from_arrays(coords, offsets)
+
+def binarize_sketch(image, params=None):
+    """
+    Turn a sketch into a clean binary stroke mask
+    
+    Args:
+        image: Input image as numpy array (BGR format)
+        params: Extraction parameters overriding DEFAULT_EXTRACTION_PARAMS
+        
+    Returns:
+        cleaned: Binary uint8 image with strokes set to 255
+    """
+    params = extraction_params(params)
+    
     # Convert to grayscale
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    blur_kernel = int(params["blur_kernel"])
+    blurred = cv2.GaussianBlur(gray, (blur_kernel, blur_kernel), 0) if blur_kernel > 1 else gray
     
     # Apply adaptive thresholding to handle different lighting conditions
     thresh = cv2.adaptiveThreshold(
         blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-        cv2.THRESH_BINARY_INV, 11, 2
+        cv2.THRESH_BINARY_INV, int(params["block_size"]), params["threshold_c"]
     )
     
     # Perform morphological operations to clean up the image
+    if params["morph_iterations"] <= 0:
+        return thresh
     kernel = np.ones((3, 3), np.uint8)
-    cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=1)
-    
-    # Skeletonize the image to get thin lines
-    skeleton = skeletonize(cleaned)
+    return cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=int(params["morph_iterations"]))
+
+def find_skeleton_contours(skeleton):
+    """
+    Find the outer contours of a skeletonized image
     
-    # Find contours in the skeletonized image
+    Args:
+        skeleton: Skeleton image as returned by skeletonize
+        
+    Returns:
+        contours: Contours as returned by cv2.findContours
+    """
     contours, _ = cv2.findContours(
         skeleton.astype(np.uint8), 
         cv2.RETR_EXTERNAL, 
         cv2.CHAIN_APPROX_NONE
     )
+    return contours
+
+def _crosses_edge(edge, beyond):
+    """
+    Check whether a set pixel on a window edge has a set 8-neighbour just outside it
     
-    # Create a visualization image
-    vis_image = image.copy()
-    cv2.drawContours(vis_image, contours, -1, (0, 255, 0), 2)
+    Args:
+        edge: Pixels along the edge inside the window
+        beyond: Pixels along the same edge one step outside, extended by one
+            pixel at each end (len(edge) + 2)
+    """
+    reach = (beyond[:-2] > 0) | (beyond[1:-1] > 0) | (beyond[2:] > 0)
+    return bool(np.any((edge > 0) & reach))
+
+def _line_segment(line, start, stop):
+    """Slice line[start:stop], padding with zeros where the range leaves the line"""
+    segment = line[max(0, start):min(len(line), stop)]
+    return np.pad(segment, (max(0, -start), max(0, stop - len(line))))
+
+def grow_region_over_strokes(mask, region, step=16):
+    """
+    Expand a changed region until no stroke of a mask crosses its edge
     
-    # Extract paths from contours
-    paths = []
-    for contour in contours:
-        if len(contour) > 10:  # Filter out very small contours
-            # Simplify contour to reduce number of points
-            epsilon = 0.01 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
+    Every stroke that reaches into the returned window lies entirely inside
+    it, so thinning or tracing the window gives the same result as
+    processing the whole mask. Edges that strokes cross move out by a step
+    that doubles on every round, so long strokes need only a few rounds.
+    
+    Args:
+        mask: Full binary or skeleton image
+        region: Changed rectangle as (x0, y0, x1, y1), exclusive of x1/y1
+        step: Pixels an edge moves out in the first round
+        
+    Returns:
+        window: Grown rectangle as [x0, y0, x1, y1]
+    """
+    height, width = mask.shape
+    x0, y0, x1, y1 = max(0, region[0]), max(0, region[1]), min(width, region[2]), min(height, region[3])
+    while True:
+        # Compare each inner edge with the line just outside it, corners included
+        left = x0 > 0 and _crosses_edge(mask[y0:y1, x0], _line_segment(mask[:, x0 - 1], y0 - 1, y1 + 1))
+        right = x1 < width and _crosses_edge(mask[y0:y1, x1 - 1], _line_segment(mask[:, x1], y0 - 1, y1 + 1))
+        top = y0 > 0 and _crosses_edge(mask[y0, x0:x1], _line_segment(mask[y0 - 1], x0 - 1, x1 + 1))
+        bottom = y1 < height and _crosses_edge(mask[y1 - 1, x0:x1], _line_segment(mask[y1], x0 - 1, x1 + 1))
+        if not (left or right or top or bottom):
+            return [x0, y0, x1, y1]
+        
+        x0 = max(0, x0 - step) if left else x0
+        x1 = min(width, x1 + step) if right else x1
+        y0 = max(0, y0 - step) if top else y0
+        y1 = min(height, y1 + step) if bottom else y1
+        step *= 2
+
+def _skeletonize_window(mask, window):
+    """
+    Thin one window of a mask exactly as thinning the whole mask would
+    
+    The window must not be crossed by any stroke (see
+    grow_region_over_strokes). Erosion treats pixels beyond the image as
+    set, so the window is padded with background only on the sides that
+    are not the image edge.
+    """
+    x0, y0, x1, y1 = window
+    height, width = mask.shape
+    pad = ((int(y0 > 0), int(y1 < height)), (int(x0 > 0), int(x1 < width)))
+    skeleton = skeletonize(np.pad(mask[y0:y1, x0:x1], pad))
+    return skeleton[pad[0][0]:pad[0][0] + y1 - y0, pad[1][0]:pad[1][0] + x1 - x0]
+
+def binarization_reach(params=None):
+    """
+    Distance in pixels over which binarize_sketch lets one pixel affect another
+    
+    Args:
+        params: Extraction parameters overriding DEFAULT_EXTRACTION_PARAMS
+        
+    Returns:
+        reach: Blur, threshold and closing radii added up
+    """
+    params = extraction_params(params)
+    blur = int(params["blur_kernel"]) // 2 if params["blur_kernel"] > 1 else 0
+    closing = 2 * max(0, int(params["morph_iterations"]))
+    return blur + int(params["block_size"]) // 2 + closing
+
+class IncrementalExtractor:
+    """
+    Keeps the stroke mask, skeleton and path set of an image and updates only edited regions
+    
+    Updates give the same paths as a full extraction of the edited image:
+    thresholding is redone with enough context around the edit, and thinning
+    and tracing are redone over every stroke the edit touches, end to end.
+    """
+    
+    def __init__(self, margin=16):
+        """
+        Initialize the extractor
+        
+        Args:
+            margin: Pixels a re-processed window first grows by when strokes
+                cross its edge
+        """
+        self.margin = margin
+        self.mask = None
+        self.skeleton = None
+        self.paths = []
+        self._canvas_id = None
+    
+    def reset(self, image):
+        """
+        Run a full extraction and remember its stroke mask and skeleton
+        
+        Args:
+            image: Input image as numpy array (BGR format)
             
-            # Extract points from the contour
-            points = []
-            for point in approx:
-                x, y = point[0]
-                points.append((x, y))
+        Returns:
+            paths: List of extracted paths
+        """
+        self.mask = binarize_sketch(image)
+        self.skeleton = skeletonize(self.mask)
+        coords, offsets = simplify_contours(find_skeleton_contours(self.skeleton))
+        self.paths = paths_from_arrays(coords, offsets)
+        return self.paths
+    
+    def update(self, image, regions):
+        """
+        Re-threshold, re-thin and retrace only what the edited regions affect
+        
+        Args:
+            image: Full, already edited image (BGR format)
+            regions: Edited rectangles as (x0, y0, x1, y1), exclusive of x1/y1
             
-            paths.append(points)
+        Returns:
+            paths: Updated list of paths
+        """
+        if self.skeleton is None or self.skeleton.shape != image.shape[:2]:
+            return self.reset(image)
+        
+        height, width = self.skeleton.shape
+        reach = binarization_reach()
+        for region in regions:
+            x0, y0, x1, y1 = region
+            
+            # The edit changes the mask up to `reach` pixels away, and
+            # thresholding those pixels needs as much context again
+            ix0, iy0 = max(0, x0 - reach), max(0, y0 - reach)
+            ix1, iy1 = min(width, x1 + reach), min(height, y1 + reach)
+            cx0, cy0 = max(0, ix0 - reach), max(0, iy0 - reach)
+            cx1, cy1 = min(width, ix1 + reach), min(height, iy1 + reach)
+            local = binarize_sketch(image[cy0:cy1, cx0:cx1])
+            self.mask[iy0:iy1, ix0:ix1] = local[iy0 - cy0:iy1 - cy0, ix0 - cx0:ix1 - cx0]
+            
+            # Thin and retrace every stroke the edit touches, end to end. The
+            # skeleton lies within the mask, so no skeleton stroke crosses the
+            # window edge either, and paths inside the window come from
+            # strokes that are retraced.
+            window = grow_region_over_strokes(self.mask, (ix0, iy0, ix1, iy1), self.margin)
+            wx0, wy0, wx1, wy1 = window
+            self.skeleton[wy0:wy1, wx0:wx1] = _skeletonize_window(self.mask, window)
+            contours = find_skeleton_contours(self.skeleton[wy0:wy1, wx0:wx1])
+            coords, offsets = simplify_contours(contours)
+            coords += (wx0, wy0)
+            
+            boxes = path_bounding_boxes(self.paths)
+            affected = (
+                (boxes[:, 0] >= wx0) & (boxes[:, 2] <= wx1) &
+                (boxes[:, 1] >= wy0) & (boxes[:, 3] <= wy1)
+            )
+            kept = [path for path, is_affected in zip(self.paths, affected) if not is_affected]
+            self.paths = kept + paths_from_arrays(coords, offsets)
+        
+        return self.paths
     
-    return vis_image, paths
+    def sync_canvas(self, canvas):
+        """
+        Bring the path set up to date with a CanvasBuffer
+        
+        Consumes the canvas dirty regions; a new canvas (e.g. after
+        clearing) triggers a full extraction.
+        
+        Args:
+            canvas: CanvasBuffer from drawing_canvas
+            
+        Returns:
+            paths: Current list of paths
+        """
+        regions = canvas.take_dirty_regions()
+        if canvas.canvas_id != self._canvas_id:
+            self._canvas_id = canvas.canvas_id
+            return self.reset(canvas.pixels)
+        if regions:
+            return self.update(canvas.pixels, regions)
+        return self.paths
+
+def path_bounding_boxes(paths):
+    """
+    Compute the bounding box of every path
+    
+    Args:
+        paths: List of paths as coordinate points
+        
+    Returns:
+        boxes: (M, 4) array of (x0, y0, x1, y1), exclusive of x1/y1
+    """
+    boxes = np.zeros((len(paths), 4), dtype=np.int64)
+    for i, path in enumerate(paths):
+        if len(path):
+            points = np.asarray(path)
+            boxes[i, :2] = np.floor(points.min(axis=0))
+            boxes[i, 2:] = np.floor(points.max(axis=0)) + 1
+    return boxes
+
+def simplify_contours(contours, min_points=10, epsilon_ratio=0.01,
+                      max_workers=None, chunk_size=CONTOUR_CHUNK_SIZE, open_strokes=False):
+    """
+    Simplify contours and pack the resulting vertices into flat arrays
+    
+    Large contour sets are split into chunks and simplified on a thread
+    pool; OpenCV releases the GIL inside arcLength/approxPolyDP, so the
+    chunks run concurrently.
+    
+    Args:
+        contours: Contours as returned by cv2.findContours
+        min_points: Contours with this many points or fewer are skipped
+        epsilon_ratio: Simplification tolerance as a fraction of arc length
+        max_workers: Thread pool size (None lets the executor decide,
+            1 forces serial processing)
+        chunk_size: Number of contours per work item
+        open_strokes: Turn contours that trace a single-pixel line out and
+            back into open polylines (see open_retraced_contour)
+        
+    Returns:
+        coords: (N, 2) int32 array holding the vertices of every path
+        offsets: (M + 1,) int64 array; path i is coords[offsets[i]:offsets[i + 1]]
+    """
+    kept = [contour for contour in contours if len(contour) > min_points]
+    
+    # Simplify chunk by chunk, in parallel when it pays off
+    chunks = [kept[i:i + chunk_size] for i in range(0, len(kept), chunk_size)]
+    simplify = partial(_simplify_chunk, epsilon_ratio=epsilon_ratio, open_strokes=open_strokes)
+    if max_workers == 1 or len(kept) < PARALLEL_CONTOUR_THRESHOLD:
+        results = [simplify(chunk) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(simplify, chunks))
+    approximations = [approx for chunk in results for approx in chunk]
+    
+    # Preallocate the output and copy every approximation into place
+    offsets = np.zeros(len(approximations) + 1, dtype=np.int64)
+    np.cumsum([len(approx) for approx in approximations], out=offsets[1:])
+    coords = np.empty((offsets[-1], 2), dtype=np.int32)
+    if approximations:
+        # approxPolyDP returns (k, 1, 2) arrays; write them through a matching view
+        np.concatenate(approximations, out=coords.reshape(-1, 1, 2))
+    
+    return coords, offsets
+
+def _simplify_chunk(contours, epsilon_ratio, open_strokes=False):
+    """Simplify one chunk of contours (runs on a worker thread)"""
+    approximations = []
+    for contour in contours:
+        opened = open_retraced_contour(contour) if open_strokes else None
+        if opened is not None:
+            epsilon = epsilon_ratio * cv2.arcLength(opened, False)
+            approximations.append(cv2.approxPolyDP(opened, epsilon, False))
+        else:
+            epsilon = epsilon_ratio * cv2.arcLength(contour, True)
+            approximations.append(cv2.approxPolyDP(contour, epsilon, True))
+    return approximations
+
+def open_retraced_contour(contour):
+    """
+    Turn the contour of a one-pixel-wide open stroke into a polyline
+    
+    The outer contour of a skeleton line runs from one end to the other
+    and back again, so it encloses (almost) no area. For such a contour
+    the two stroke ends are found as the farthest pair of points (two
+    sweeps from an arbitrary point) and one pass between them is kept.
+    
+    Args:
+        contour: Contour as returned by cv2.findContours (CHAIN_APPROX_NONE)
+        
+    Returns:
+        polyline: (k, 1, 2) contour of the open stroke, or None if the
+            contour encloses an area (a closed shape)
+    """
+    points = contour.reshape(-1, 2)
+    if len(points) < 3:
+        return None
+    
+    # Staircase pixels add at most about half a pixel of area per contour point
+    if abs(cv2.contourArea(contour)) > 0.5 * len(points):
+        return None
+    
+    a = int(np.argmax(((points - points[0]) ** 2).sum(axis=1)))
+    b = int(np.argmax(((points - points[a]) ** 2).sum(axis=1)))
+    start, end = min(a, b), max(a, b)
+    return np.ascontiguousarray(points[start:end + 1]).reshape(-1, 1, 2)
+
+def join_paths(paths, max_gap=8.0, max_angle=45.0, min_length=0.0):
+    """
+    Merge open paths whose endpoints meet within a distance and angle tolerance
+    
+    Endpoints are bucketed in a uniform grid with max_gap sized cells, so
+    only neighbouring cells are compared. Candidate joints are accepted
+    greedily from the shortest gap up, each endpoint joins at most once and
+    no joint may close a loop, so every result is a simple chain.
+    
+    Args:
+        paths: List of paths as coordinate points
+        max_gap: Largest endpoint distance in pixels that may be bridged
+        max_angle: Largest change of direction in degrees across a joint
+        min_length: Drop joined paths shorter than this many pixels
+        
+    Returns:
+        paths: List of joined paths as lists of (x, y) tuples
+    """
+    arrays = [np.asarray(path) for path in paths]
+    cos_limit = np.cos(np.radians(max_angle))
+    
+    # Endpoint e = 2 * path + side (0 = start, 1 = end) with its outward direction
+    open_paths = [
+        i for i, points in enumerate(arrays)
+        if len(points) >= 2 and np.hypot(*(points[0] - points[-1])) > 1.0
+    ]
+    is_open = np.zeros(len(arrays), dtype=bool)
+    is_open[open_paths] = True
+    positions = {}
+    directions = {}
+    grid = {}
+    for i in open_paths:
+        points = arrays[i].astype(float)
+        for side, ordered in ((0, points), (1, points[::-1])):
+            # Measure the direction over a few pixels so staircase noise at the tip doesn't dominate
+            e = 2 * i + side
+            tip = ordered[0]
+            distances = np.hypot(*(ordered - tip).T)
+            far_enough = np.flatnonzero(distances >= max(3.0, max_gap))
+            inner = ordered[far_enough[0]] if len(far_enough) else ordered[np.argmax(distances)]
+            outward = tip - inner
+            positions[e] = tip
+            directions[e] = outward / max(np.hypot(*outward), 1e-9)
+            grid.setdefault((int(tip[0] // max_gap), int(tip[1] // max_gap)), []).append(e)
+    
+    # Collect candidate joints between endpoints in neighbouring cells
+    candidates = []
+    for (cx, cy), cell in grid.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for e in cell:
+                    for f in grid.get((cx + dx, cy + dy), ()):
+                        if f <= e or f // 2 == e // 2:
+                            continue
+                        gap = positions[f] - positions[e]
+                        distance = np.hypot(*gap)
+                        if distance > max_gap:
+                            continue
+                        # The strokes must continue each other...
+                        if np.dot(directions[e], -directions[f]) < cos_limit:
+                            continue
+                        # ...and the gap must lie along that direction
+                        if distance > 1.0:
+                            gap_direction = gap / distance
+                            if (np.dot(directions[e], gap_direction) < cos_limit or
+                                    np.dot(-directions[f], gap_direction) < cos_limit):
+                                continue
+                        candidates.append((distance, e, f))
+    candidates.sort()
+    
+    # Accept the shortest joints first without reusing endpoints or closing loops
+    parent = list(range(len(arrays)))
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    links = {}
+    for _, e, f in candidates:
+        if e in links or f in links:
+            continue
+        root_e, root_f = find(e // 2), find(f // 2)
+        if root_e == root_f:
+            continue
+        parent[root_e] = root_f
+        links[e] = f
+        links[f] = e
+    
+    # Walk every chain from one free end to the other
+    joined = []
+    visited = np.zeros(len(arrays), dtype=bool)
+    for i in range(len(arrays)):
+        if visited[i] or len(arrays[i]) == 0:
+            continue
+        if not is_open[i]:
+            visited[i] = True
+            joined.append(arrays[i])
+            continue
+        
+        # Find the free end of this chain by walking out through path starts
+        current, out = i, 0
+        while 2 * current + out in links:
+            f = links[2 * current + out]
+            current, out = f // 2, 1 - f % 2
+        
+        pieces = []
+        entry = out
+        while True:
+            visited[current] = True
+            points = arrays[current] if entry == 0 else arrays[current][::-1]
+            if pieces and np.array_equal(pieces[-1][-1], points[0]):
+                points = points[1:]
+            pieces.append(points)
+            f = links.get(2 * current + 1 - entry)
+            if f is None:
+                break
+            current, entry = f // 2, f % 2
+        joined.append(np.concatenate(pieces))
+    
+    result = []
+    for points in joined:
+        if min_length > 0:
+            segments = np.diff(points.astype(float), axis=0)
+            if np.hypot(segments[:, 0], segments[:, 1]).sum() < min_length:
+                continue
+        result.append(list(map(tuple, points.tolist())))
+    return result
+
+def simplify_paths(paths, tolerance=1.0):
+    """
+    Simplify open polylines with a fixed distance tolerance
+    
+    Unlike simplify_contours, which works on traced contours and scales its
+    tolerance with their length, this keeps every path's end points and
+    removes only vertices within `tolerance` pixels of the simplified line.
+    
+    Args:
+        paths: List of paths as coordinate points
+        tolerance: Largest allowed deviation in pixels
+        
+    Returns:
+        paths: List of simplified paths as lists of (x, y) tuples
+    """
+    simplified = []
+    for path in paths:
+        points = np.asarray(path, dtype=np.float32).reshape(-1, 1, 2)
+        if len(points) > 2:
+            points = cv2.approxPolyDP(points, tolerance, False)
+        simplified.append(list(map(tuple, points.reshape(-1, 2).tolist())))
+    return simplified
+
+def order_paths(paths, start=(0, 0), allow_reverse=True):
+    """
+    Order paths to shorten the travel between them
+    
+    Greedy nearest neighbour: from the current position, the path with the
+    closest end point is drawn next, reversed if its last point is closer.
+    
+    Args:
+        paths: List of paths as coordinate points
+        start: Position the tool starts from
+        allow_reverse: Whether paths may be drawn backwards
+        
+    Returns:
+        paths: The non-empty paths in drawing order
+    """
+    paths = [path for path in paths if len(path)]
+    if not paths:
+        return []
+    
+    starts = np.array([path[0] for path in paths], dtype=float)
+    ends = np.array([path[-1] for path in paths], dtype=float)
+    remaining = np.ones(len(paths), dtype=bool)
+    position = np.asarray(start, dtype=float)
+    
+    ordered = []
+    for _ in range(len(paths)):
+        to_start = np.hypot(*(starts - position).T)
+        to_end = np.hypot(*(ends - position).T) if allow_reverse else np.full(len(paths), np.inf)
+        to_start[~remaining] = np.inf
+        to_end[~remaining] = np.inf
+        
+        i = int(np.argmin(np.minimum(to_start, to_end)))
+        remaining[i] = False
+        if to_end[i] < to_start[i]:
+            ordered.append(list(paths[i])[::-1])
+            position = starts[i]
+        else:
+            ordered.append(list(paths[i]))
+            position = ends[i]
+    return ordered
+
+def paths_from_arrays(coords, offsets):
+    """
+    Convert packed path arrays into the list-of-tuples path format
+    
+    Args:
+        coords: (N, 2) array of vertices
+        offsets: (M + 1,) array of path boundaries into coords
+        
+    Returns:
+        paths: List of paths as lists of (x, y) tuples
+    """
+    points = list(map(tuple, coords.tolist()))
+    return [points[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+def paths_from_shapes(shapes, circle_segments=20):
+    """
+    Convert recorded canvas primitives into polyline paths
+    
+    Args:
+        shapes: Shape dictionaries as returned by DrawingCanvas.get_drawing_shapes
+        circle_segments: Number of segments used to approximate a circle
+        
+    Returns:
+        paths: List of paths as lists of (x, y) tuples
+    """
+    paths = []
+    for shape in shapes:
+        if shape["type"] == "circle":
+            cx, cy = shape["center"]
+            radius = shape["radius"]
+            angles = np.linspace(0, 2 * np.pi, circle_segments + 1)
+            paths.append([
+                (cx + radius * np.cos(angle), cy + radius * np.sin(angle))
+                for angle in angles
+            ])
+        else:
+            paths.append(list(shape["points"]))
+    return paths
 
 def skeletonize(img):
     """
@@ -145,7 +752,7 @@ def extract_dimensions(image, paths):
     
     # For now, just calculate the bounding box of each path
     for i, path in enumerate(paths):
-        if path:
+        if len(path):
             xs = [p[0] for p in path]
             ys = [p[1] for p in path]
             width = max(xs) - min(xs)
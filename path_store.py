@@ -0,0 +1,266 @@
+"""
+Compact binary storage for extracted paths
+
+A path file holds every path of an extraction as one (N, 2) coordinate
+array plus an (M + 1,) offsets array, behind a small JSON header that
+records the source image hash and the extraction parameters:
+
+    8 bytes   magic b"SKPATHS\\0"
+    8 bytes   header length (little-endian uint64)
+    header    UTF-8 JSON, padded with spaces to a 64-byte boundary
+    coords    raw coordinate array (dtype given in the header)
+    offsets   raw little-endian int64 array, 8-byte aligned
+
+Files are memory-mapped on load, so paths are read without copying and
+can be handed straight to KRLGenerator and the visualizers.
+
+Usage:
+    python path_store.py extract sketch.png sketch.skpaths [--join --join-gap 8]
+    python path_store.py info sketch.skpaths
+    python path_store.py generate sketch.skpaths --out-dir programs --motion LIN,CIRC
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"SKPATHS\0"
+FORMAT_VERSION = 1
+FILE_EXTENSION = ".skpaths"
+
+class PathSet:
+    """
+    Read-only sequence of paths backed by a coordinate array and an offsets array
+    """
+    
+    def __init__(self, coords, offsets, header=None):
+        """
+        Args:
+            coords: (N, 2) array of vertices
+            offsets: (M + 1,) array; path i is coords[offsets[i]:offsets[i + 1]]
+            header: Metadata dictionary (source hash, parameters, ...)
+        """
+        self.coords = coords
+        self.offsets = offsets
+        self.header = header or {}
+    
+    @classmethod
+    def from_paths(cls, paths, header=None):
+        """
+        Pack a list of paths
+        
+        Integer coordinates are stored as int32, anything else as float32.
+        
+        Args:
+            paths: List of paths as coordinate points
+            header: Metadata dictionary
+            
+        Returns:
+            path_set: New PathSet
+        """
+        lengths = [len(path) for path in paths]
+        offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        
+        non_empty = [np.asarray(path).reshape(-1, 2) for path in paths if len(path)]
+        if non_empty:
+            coords = np.concatenate(non_empty)
+        else:
+            coords = np.empty((0, 2), dtype=np.int32)
+        if np.issubdtype(coords.dtype, np.integer):
+            coords = coords.astype(np.int32, copy=False)
+        else:
+            coords = coords.astype(np.float32, copy=False)
+        return cls(coords, offsets, header)
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("path index out of range")
+        return self.coords[self.offsets[index]:self.offsets[index + 1]]
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.coords[self.offsets[i]:self.offsets[i + 1]]
+    
+    def to_list(self):
+        """Convert to the list-of-tuples path format"""
+        points = list(map(tuple, self.coords.tolist()))
+        bounds = self.offsets.tolist()
+        return [points[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def image_fingerprint(image):
+    """
+    Hash an image array, including its shape and dtype
+    
+    Args:
+        image: Image as numpy array
+        
+    Returns:
+        digest: SHA-256 hex digest
+    """
+    image = np.ascontiguousarray(image)
+    digest = hashlib.sha256(f"{image.shape}{image.dtype.str}".encode())
+    digest.update(image.data)
+    return digest.hexdigest()
+
+def save_paths(file_path, paths, source_image=None, params=None):
+    """
+    Write paths to a path file
+    
+    Args:
+        file_path: Destination file
+        paths: PathSet or list of paths
+        source_image: Image the paths were extracted from (its hash is recorded)
+        params: Extraction parameters to record
+        
+    Returns:
+        header: The header that was written
+    """
+    path_set = paths if isinstance(paths, PathSet) else PathSet.from_paths(paths)
+    coords = np.ascontiguousarray(path_set.coords)
+    coords = coords.astype(coords.dtype.newbyteorder("<"), copy=False)
+    offsets = np.ascontiguousarray(path_set.offsets, dtype="<i8")
+    
+    header = {
+        "version": FORMAT_VERSION,
+        "coords_dtype": coords.dtype.str,
+        "num_paths": len(offsets) - 1,
+        "num_points": len(coords),
+        "source_sha256": image_fingerprint(source_image) if source_image is not None else None,
+        "params": params or {},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    
+    # Lay out the sections; the offsets must be known before the header is final
+    header_json = json.dumps(header).encode()
+    while True:
+        data_start = -(-(16 + len(header_json)) // 64) * 64
+        header["coords_offset"] = data_start
+        header["offsets_offset"] = -(-(data_start + coords.nbytes) // 8) * 8
+        encoded = json.dumps(header).encode()
+        if 16 + len(encoded) <= data_start:
+            header_json = encoded.ljust(data_start - 16, b" ")
+            break
+        header_json = encoded
+    
+    with open(file_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_json)))
+        f.write(header_json)
+        f.write(coords.tobytes())
+        f.write(b"\0" * (header["offsets_offset"] - data_start - coords.nbytes))
+        f.write(offsets.tobytes())
+    
+    return header
+
+def read_header(file_path):
+    """
+    Read only the JSON header of a path file
+    
+    Returns:
+        header: Header dictionary
+    """
+    with open(file_path, "rb") as f:
+        if f.read(8) != MAGIC:
+            raise ValueError(f"{file_path} is not a path file")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported path file version {header.get('version')}")
+    return header
+
+def load_paths(file_path):
+    """
+    Memory-map a path file
+    
+    The returned arrays are read-only views into the mapped file; no
+    coordinate data is copied.
+    
+    Args:
+        file_path: Path file to open
+        
+    Returns:
+        path_set: PathSet backed by the file
+    """
+    header = read_header(file_path)
+    dtype = np.dtype(header["coords_dtype"])
+    
+    raw = np.memmap(file_path, dtype=np.uint8, mode="r")
+    coords_end = header["coords_offset"] + header["num_points"] * 2 * dtype.itemsize
+    coords = raw[header["coords_offset"]:coords_end].view(dtype).reshape(-1, 2)
+    offsets_end = header["offsets_offset"] + 8 * (header["num_paths"] + 1)
+    offsets = raw[header["offsets_offset"]:offsets_end].view("<i8")
+    return PathSet(coords, offsets, header)
+
+def main():
+    parser = argparse.ArgumentParser(description="Save, inspect and use extracted path files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    extract = commands.add_parser("extract", help="Extract paths from an image into a path file")
+    extract.add_argument("image")
+    extract.add_argument("output")
+    extract.add_argument("--join", action="store_true", help="Join fragmented strokes")
+    extract.add_argument("--join-gap", type=float, default=8.0, help="Largest gap in pixels bridged when joining")
+    extract.add_argument("--join-angle", type=float, default=45.0, help="Largest direction change in degrees across a joint")
+    
+    info = commands.add_parser("info", help="Show a path file header")
+    info.add_argument("file")
+    
+    generate = commands.add_parser("generate", help="Generate KRL from a path file")
+    generate.add_argument("file")
+    generate.add_argument("--out-dir", default=".")
+    generate.add_argument("--program", default="PATH_PROGRAM")
+    generate.add_argument("--start", default="HOME", choices=["HOME", "Anywhere"])
+    generate.add_argument("--motion", default="LIN", help="Comma separated motion types")
+    
+    args = parser.parse_args()
+    
+    if args.command == "extract":
+        import cv2
+        from path_extraction import extract_paths_from_sketch, extraction_params
+        
+        image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+        if image is None:
+            parser.error(f"Could not read {args.image}")
+        _, paths = extract_paths_from_sketch(
+            image, join_strokes=args.join, join_gap=args.join_gap, join_angle=args.join_angle
+        )
+        # Record every setting, so the file says exactly how to reproduce it
+        params = {
+            **extraction_params(),
+            "join_strokes": args.join,
+            "join_gap": args.join_gap,
+            "join_angle": args.join_angle
+        }
+        header = save_paths(args.output, paths, source_image=image, params=params)
+        print(f"Wrote {header['num_paths']} paths ({header['num_points']} points) to {args.output}")
+    
+    elif args.command == "info":
+        print(json.dumps(read_header(args.file), indent=2))
+    
+    else:
+        from krl_generator import KRLGenerator
+        
+        paths = load_paths(args.file)
+        krl_gen = KRLGenerator(args.program)
+        src_code = krl_gen.generate_src_code(paths, args.start, args.motion.upper().split(","))
+        dat_code = krl_gen.generate_dat_code()
+        os.makedirs(args.out_dir, exist_ok=True)
+        for extension, code in ((".src", src_code), (".dat", dat_code)):
+            with open(os.path.join(args.out_dir, args.program + extension), "w") as f:
+                f.write(code)
+        print(f"Generated {args.program}.src/.dat from {len(paths)} paths")
+
+if __name__ == "__main__":
+    main()
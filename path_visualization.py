@@ -1,8 +1,11 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import io
 import base64
-from PIL import Image
+
+from lazy_imports import lazy_import
+
+plt = lazy_import("matplotlib.pyplot")
+Image = lazy_import("PIL.Image")
 
 def visualize_robot_path(paths, motion_types, figsize=(8, 6)):
     """
@@ -28,7 +31,7 @@ def visualize_robot_path(paths, motion_types, figsize=(8, 6)):
     
     # Plot each path
     for path_idx, path in enumerate(paths):
-        if not path:
+        if len(path) == 0:
             continue
         
         # Extract x and y coordinates
@@ -130,7 +133,7 @@ def overlay_path_on_image(image, paths, motion_types):
     
     # Draw each path
     for path_idx, path in enumerate(paths):
-        if not path:
+        if len(path) == 0:
             continue
         
         # Draw lines connecting points
@@ -0,0 +1,190 @@
+"""
+Progressive extraction: a fast preview first, full resolution in the background
+
+A large upload is first extracted on a heavily downscaled copy so the
+operator sees paths almost immediately. The full-resolution extraction is
+submitted to a shared background executor (through the CPU governor) and
+replaces the preview once it finishes. A refinement that is no longer
+wanted, e.g. because a different image was uploaded, can be cancelled.
+A job only holds on to its input image until it finishes or is cancelled.
+"""
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from path_extraction import extract_paths_from_sketch
+from cpu_governor import get_governor
+
+cv2 = lazy_import("cv2")
+
+# Longest side of the image used for the preview extraction
+PREVIEW_MAX_SIDE = 512
+
+def downscale_image(image, max_side=PREVIEW_MAX_SIDE):
+    """
+    Shrink an image so its longest side is at most max_side
+    
+    Args:
+        image: Input image as numpy array
+        max_side: Longest side of the result in pixels
+    
+    Returns:
+        small_image: Downscaled image (the input itself if already small enough)
+        scale: Factor applied to the image (<= 1.0)
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width)))
+    if scale >= 1.0:
+        return image, 1.0
+    
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+def scale_paths(paths, factor):
+    """
+    Multiply every path coordinate by a factor
+    
+    Args:
+        paths: List of paths as coordinate points
+        factor: Scale factor
+    
+    Returns:
+        scaled_paths: List of paths with integer (x, y) tuples
+    """
+    scaled_paths = []
+    for path in paths:
+        points = np.rint(np.asarray(path, dtype=np.float64).reshape(-1, 2) * factor).astype(int)
+        scaled_paths.append([(int(x), int(y)) for x, y in points])
+    return scaled_paths
+
+def extract_preview(image, max_side=PREVIEW_MAX_SIDE, join_strokes=False, join_gap=8.0):
+    """
+    Extract paths from a downscaled copy and map them back to full resolution
+    
+    Args:
+        image: Input image as numpy array (BGR format)
+        max_side: Longest side of the image used for extraction
+        join_strokes: Open single-line strokes and merge fragments separated by small gaps
+        join_gap: Largest gap in full-resolution pixels bridged when joining strokes
+    
+    Returns:
+        processed_image: The downscaled image with the preview paths drawn
+        paths: Preview paths in full-resolution pixel coordinates
+    """
+    small_image, scale = downscale_image(image, max_side)
+    processed_image, paths = extract_paths_from_sketch(
+        small_image, join_strokes, max(1.0, join_gap * scale)
+    )
+    return processed_image, scale_paths(paths, 1.0 / scale)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_refinement_executor():
+    """
+    Get the process-wide executor that runs full-resolution refinements
+    
+    It has one worker per governor slot; the governor still decides which
+    session's job runs next.
+    
+    Returns:
+        executor: The shared ThreadPoolExecutor
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_governor().max_jobs,
+                thread_name_prefix="refine"
+            )
+        return _executor
+
+class RefinementJob:
+    """
+    Full-resolution extraction running in the background
+    """
+    
+    def __init__(self, key, session_id, image, join_strokes=False, join_gap=8.0):
+        """
+        Submit the extraction to the shared executor
+        
+        Args:
+            key: Identifier of the input (e.g. the upload's file ID)
+            session_id: ID of the requesting session, used for fair queueing
+            image: Input image as numpy array (BGR format)
+            join_strokes: Open single-line strokes and merge fragments separated by small gaps
+            join_gap: Largest gap in pixels bridged when joining strokes
+        """
+        self.key = key
+        self.session_id = session_id
+        self.ticket = None
+        self._image = image
+        self._cancelled = threading.Event()
+        self._future = get_refinement_executor().submit(self._run, join_strokes, join_gap)
+    
+    def _run(self, join_strokes, join_gap):
+        """Wait for a CPU slot and extract, unless cancelled in the meantime"""
+        try:
+            if self._cancelled.is_set():
+                return None
+            with get_governor().slot(self.session_id) as ticket:
+                self.ticket = ticket
+                image = self._image
+                if self._cancelled.is_set() or image is None:
+                    return None
+                return extract_paths_from_sketch(image, join_strokes, join_gap)
+        finally:
+            # The full-resolution input is not needed once the job has finished
+            self._image = None
+    
+    def cancel(self):
+        """
+        Drop the job; a queued job never runs, a running one is discarded
+        """
+        self._cancelled.set()
+        self._future.cancel()
+        self._image = None
+    
+    @property
+    def cancelled(self):
+        """Whether cancel() has been called"""
+        return self._cancelled.is_set()
+    
+    def done(self):
+        """Check whether a usable result is ready"""
+        return not self.cancelled and self._future.done()
+    
+    def wait(self, timeout=None):
+        """
+        Block until the job finishes or the timeout passes
+        
+        Args:
+            timeout: Seconds to wait at most (None waits until finished)
+        
+        Returns:
+            done: Whether a usable result is ready
+        """
+        wait([self._future], timeout)
+        return self.done()
+    
+    def result(self, timeout=None):
+        """
+        Get the full-resolution result, waiting for it if necessary
+        
+        Args:
+            timeout: Seconds to wait (None waits until finished)
+        
+        Returns:
+            result: (processed_image, paths), or None if the job was cancelled
+        
+        Raises:
+            Exception: Whatever the extraction raised
+        """
+        if self.cancelled:
+            return None
+        try:
+            return self._future.result(timeout)
+        except CancelledError:
+            return None
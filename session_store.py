@@ -0,0 +1,282 @@
+"""
+Compact, budgeted image storage shared by all Streamlit sessions
+
+Sessions used to keep every full-resolution image as an uncompressed array
+in st.session_state. The ImageStore keeps one compressed copy per distinct
+image (content addressed, so identical uploads are stored once), decodes
+on demand and enforces per-session and global byte budgets with LRU
+eviction. Sessions left idle for longer than a time-to-live are dropped,
+so abandoned browser tabs don't hold images forever. Pinned images, such as
+a drawing still being edited, are never evicted or expired; they are only
+freed when replaced, deleted or when their session is dropped.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+MB = 1024 * 1024
+
+class ImageStore:
+    """
+    Thread-safe, content-addressed store of compressed images
+    """
+    
+    def __init__(self, session_budget_bytes=64 * MB, global_budget_bytes=512 * MB, image_format=".png",
+                 session_ttl=2 * 60 * 60):
+        """
+        Initialize the store
+        
+        Args:
+            session_budget_bytes: Compressed bytes a single session may reference
+            global_budget_bytes: Compressed bytes held by the whole process
+            image_format: ".png" or ".webp" (both stored losslessly)
+            session_ttl: Seconds a session may stay unused before its images
+                are dropped (None keeps them until drop_session)
+        """
+        if image_format not in (".png", ".webp"):
+            raise ValueError("image_format must be '.png' or '.webp'")
+        
+        self.session_budget_bytes = session_budget_bytes
+        self.global_budget_bytes = global_budget_bytes
+        self.image_format = image_format
+        self.session_ttl = session_ttl
+        
+        self._lock = threading.Lock()
+        # digest -> encoded bytes, least recently used first
+        self._entries = OrderedDict()
+        # digest -> set of (session_id, key) referencing it
+        self._owners = {}
+        # session_id -> OrderedDict of key -> digest, least recently used first
+        self._sessions = {}
+        # session_id -> time.monotonic() of its last access
+        self._last_used = {}
+        # (session_id, key) pairs exempt from eviction and expiry
+        self._pinned = set()
+        self._next_expiry_check = 0.0
+        self._global_bytes = 0
+        self.evictions = 0
+        self.expired_sessions = 0
+    
+    def _encode(self, image):
+        """Losslessly compress an image array"""
+        if self.image_format == ".webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, 101]  # >100 selects lossless WebP
+        else:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, 1]  # Fast; most of the gain comes at level 1
+        ok, buffer = cv2.imencode(self.image_format, image, params)
+        if not ok:
+            raise ValueError("Could not encode image for storage")
+        return buffer.tobytes()
+    
+    def put(self, session_id, key, image, pinned=False):
+        """
+        Store an image for a session under a key
+        
+        Args:
+            session_id: ID of the owning session
+            key: Name of the image within the session, e.g. "original_image"
+            image: Image as numpy array (uint8, grayscale or BGR)
+            pinned: Never evict or expire the image; it still counts
+                towards the budgets
+        """
+        image = np.ascontiguousarray(image)
+        digest = hashlib.sha1(image.data).hexdigest() + f"-{'x'.join(map(str, image.shape))}"
+        
+        with self._lock:
+            known = digest in self._entries
+        # Encode outside the lock; this is the expensive part
+        data = None if known else self._encode(image)
+        
+        with self._lock:
+            self._touch(session_id)
+            self._release(session_id, key)
+            if digest not in self._entries:
+                if data is None:
+                    data = self._encode(image)
+                self._entries[digest] = data
+                self._owners[digest] = set()
+                self._global_bytes += len(data)
+            self._entries.move_to_end(digest)
+            self._owners[digest].add((session_id, key))
+            session = self._sessions.setdefault(session_id, OrderedDict())
+            session[key] = digest
+            session.move_to_end(key)
+            if pinned:
+                self._pinned.add((session_id, key))
+            self._enforce_budgets(session_id)
+    
+    def get(self, session_id, key):
+        """
+        Decode a stored image
+        
+        Returns:
+            image: Image as numpy array, or None if missing or evicted
+        """
+        data = self.get_encoded(session_id, key)
+        if data is None:
+            return None
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    
+    def get_encoded(self, session_id, key):
+        """
+        Get a stored image without decoding it
+        
+        Returns:
+            data: The compressed file contents in image_format, or None if
+                missing or evicted
+        """
+        with self._lock:
+            self._touch(session_id)
+            session = self._sessions.get(session_id)
+            if session is None or key not in session:
+                return None
+            digest = session[key]
+            session.move_to_end(key)
+            self._entries.move_to_end(digest)
+            return self._entries[digest]
+    
+    def has(self, session_id, key):
+        """Check whether a session still holds an image under a key"""
+        with self._lock:
+            self._touch(session_id)
+            return key in self._sessions.get(session_id, {})
+    
+    def delete(self, session_id, key):
+        """Drop one image from a session"""
+        with self._lock:
+            self._release(session_id, key)
+    
+    def drop_session(self, session_id):
+        """Drop every image held by a session"""
+        with self._lock:
+            for key in list(self._sessions.get(session_id, {})):
+                self._release(session_id, key)
+            self._sessions.pop(session_id, None)
+            self._last_used.pop(session_id, None)
+    
+    def _touch(self, session_id):
+        """Record a session access and drop sessions idle past the TTL (lock held)"""
+        now = time.monotonic()
+        if self.session_ttl is not None and now >= self._next_expiry_check:
+            # Scanning every session is cheap, but there is no need to do it on every access
+            self._next_expiry_check = now + min(60.0, self.session_ttl / 10)
+            for idle_session, last_used in list(self._last_used.items()):
+                if idle_session != session_id and now - last_used > self.session_ttl:
+                    keys = [
+                        key for key in self._sessions.get(idle_session, {})
+                        if (idle_session, key) not in self._pinned
+                    ]
+                    for key in keys:
+                        self._release(idle_session, key)
+                    if not self._sessions.get(idle_session):
+                        self._sessions.pop(idle_session, None)
+                        del self._last_used[idle_session]
+                    if keys:
+                        self.expired_sessions += 1
+        self._last_used[session_id] = now
+    
+    def _release(self, session_id, key):
+        """Remove a session reference, freeing the entry when nobody uses it (lock held)"""
+        session = self._sessions.get(session_id)
+        if session is None or key not in session:
+            return
+        digest = session.pop(key)
+        self._pinned.discard((session_id, key))
+        owners = self._owners[digest]
+        owners.discard((session_id, key))
+        if not owners:
+            self._global_bytes -= len(self._entries.pop(digest))
+            del self._owners[digest]
+    
+    def _session_bytes(self, session_id):
+        """Compressed bytes referenced by a session (lock held)"""
+        digests = set(self._sessions.get(session_id, {}).values())
+        return sum(len(self._entries[digest]) for digest in digests)
+    
+    def _enforce_budgets(self, session_id):
+        """Evict least recently used images until both budgets hold (lock held)"""
+        session = self._sessions[session_id]
+        while self._session_bytes(session_id) > self.session_budget_bytes:
+            # Always keep the most recent image, even if it alone exceeds the budget
+            key = next((key for key in list(session)[:-1] if (session_id, key) not in self._pinned), None)
+            if key is None:
+                break
+            self._release(session_id, key)
+            self.evictions += 1
+        
+        while self._global_bytes > self.global_budget_bytes:
+            digest = next(
+                (digest for digest in list(self._entries)[:-1] if not self._owners[digest] & self._pinned),
+                None
+            )
+            if digest is None:
+                break
+            for owner_session, owner_key in list(self._owners[digest]):
+                self._release(owner_session, owner_key)
+            self.evictions += 1
+    
+    def session_stats(self, session_id):
+        """
+        Memory used by one session
+        
+        Returns:
+            stats: Dictionary with "images" and compressed "bytes"
+        """
+        with self._lock:
+            return {
+                "images": len(self._sessions.get(session_id, {})),
+                "bytes": self._session_bytes(session_id)
+            }
+    
+    def stats(self):
+        """
+        Memory used by the whole store
+        
+        Returns:
+            stats: Dictionary with entry, session and byte counts and budgets
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "sessions": len(self._sessions),
+                "bytes": self._global_bytes,
+                "global_budget_bytes": self.global_budget_bytes,
+                "session_budget_bytes": self.session_budget_bytes,
+                "pinned": len(self._pinned),
+                "evictions": self.evictions,
+                "expired_sessions": self.expired_sessions
+            }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_image_store():
+    """
+    Get the process-wide ImageStore, configured from the environment
+    
+    SKETCH_TO_KRL_SESSION_BUDGET_MB, SKETCH_TO_KRL_GLOBAL_BUDGET_MB,
+    SKETCH_TO_KRL_IMAGE_FORMAT (png or webp) and SKETCH_TO_KRL_SESSION_TTL_MIN
+    (0 disables expiry) override the defaults.
+    
+    Returns:
+        store: The shared ImageStore
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            ttl_minutes = float(os.environ.get("SKETCH_TO_KRL_SESSION_TTL_MIN", 120))
+            _store = ImageStore(
+                session_budget_bytes=float(os.environ.get("SKETCH_TO_KRL_SESSION_BUDGET_MB", 64)) * MB,
+                global_budget_bytes=float(os.environ.get("SKETCH_TO_KRL_GLOBAL_BUDGET_MB", 512)) * MB,
+                image_format="." + os.environ.get("SKETCH_TO_KRL_IMAGE_FORMAT", "png").lstrip("."),
+                session_ttl=ttl_minutes * 60 if ttl_minutes > 0 else None
+            )
+        return _store
@@ -0,0 +1,98 @@
+"""
+Auto-tuning: parameter scaling, candidate ranking and cache keys
+"""
+import math
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auto_tune import TUNE_GRID, cache_key, evaluate_candidates, rank_candidates, scale_params
+from path_extraction import extract_paths_from_sketch, extraction_params
+
+
+def sketch(size=200):
+    image = np.full((size, size, 3), 255, np.uint8)
+    cv2.rectangle(image, (20, 20), (120, 100), (0, 0, 0), 2)
+    # A dashed line, so joining makes a difference
+    for x in range(30, 180, 20):
+        cv2.line(image, (x, 150), (x + 14, 150), (0, 0, 0), 2)
+    return image
+
+
+def candidate(**metrics):
+    result = {"params": {}, "endpoint_density": 0.1, "fragments": 10, "points": 100, "stroke_length": 1000}
+    result.update(metrics)
+    return result
+
+
+def test_scale_params_keeps_sizes_odd_and_scales_iterations():
+    params = extraction_params({"blur_kernel": 3, "block_size": 11, "threshold_c": 5,
+                                "morph_iterations": 1, "min_contour_points": 10})
+    scaled = scale_params(params, 4.0)
+    assert scaled["blur_kernel"] == 13 and scaled["block_size"] == 45
+    assert scaled["morph_iterations"] == 4
+    assert scaled["min_contour_points"] == 40
+    assert scaled["threshold_c"] == 5
+    assert params["morph_iterations"] == 1
+
+
+def test_scale_params_respects_minimums():
+    params = extraction_params({"blur_kernel": 3, "block_size": 11, "morph_iterations": 2, "min_contour_points": 5})
+    scaled = scale_params(params, 0.1)
+    assert scaled["blur_kernel"] == 1
+    assert scaled["block_size"] == 3
+    assert scaled["morph_iterations"] == 1
+    assert scaled["min_contour_points"] == 2
+    assert scale_params(dict(params, morph_iterations=0), 4.0)["morph_iterations"] == 0
+
+
+def test_rank_candidates_prefers_fewer_fragments_and_points():
+    best = candidate(fragments=5, points=60)
+    ranked = rank_candidates([candidate(), best, candidate(fragments=20, points=200)])
+    assert ranked[0] is best
+    assert [result["score"] for result in ranked] == sorted(result["score"] for result in ranked)
+
+
+def test_rank_candidates_penalizes_lost_and_noisy_strokes():
+    typical = candidate()
+    lost = candidate(stroke_length=100)
+    noisy = candidate(stroke_length=10000)
+    ranked = rank_candidates([lost, noisy, typical])
+    assert ranked[0] is typical
+    assert lost["score"] == pytest.approx(noisy["score"])
+
+
+def test_rank_candidates_puts_empty_results_last():
+    empty = candidate(fragments=0, points=0, stroke_length=0)
+    ranked = rank_candidates([empty, candidate()])
+    assert ranked[-1] is empty and math.isinf(empty["score"])
+
+
+def test_cache_key_covers_every_setting():
+    image = sketch()
+    key = cache_key(image)
+    assert cache_key(image.copy()) == key
+    assert cache_key(sketch(201)) != key
+    assert cache_key(image, grid=dict(TUNE_GRID, threshold_c=(2, 5))) != key
+    assert cache_key(image, max_side=256) != key
+    assert cache_key(image, weights={"continuity": 2.0, "fragments": 1.0, "points": 0.5, "coverage": 2.0}) != key
+    assert cache_key(image, join_strokes=True) != key
+    assert cache_key(image, join_strokes=True, join_gap=12) != cache_key(image, join_strokes=True)
+    # The gap only matters when joining
+    assert cache_key(image, join_gap=12) == key
+
+
+def test_joined_candidates_match_joined_extraction():
+    image = sketch()
+    params = extraction_params({"min_contour_points": 20})
+    result = evaluate_candidates(image, [params], join_strokes=True, join_gap=15.0)[0]
+    _, paths = extract_paths_from_sketch(image, True, 15.0, params=params)
+    assert result["fragments"] == len(paths)
+    assert result["points"] == sum(len(path) for path in paths)
+    # Each dash alone is shorter than min_contour_points; joined, the dashed line is kept
+    assert result["fragments"] > evaluate_candidates(image, [params])[0]["fragments"]
@@ -0,0 +1,69 @@
+"""
+IncrementalExtractor must give the same paths as a full extraction
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_extraction import (
+    IncrementalExtractor, extract_paths_from_sketch, grow_region_over_strokes, binarize_sketch, skeletonize
+)
+
+
+def normalized(paths):
+    """Paths as a sorted list of tuples, so splice order doesn't matter"""
+    return sorted(tuple(map(tuple, np.asarray(path).tolist())) for path in paths)
+
+
+def assert_matches_full_extraction(size, strokes, seed):
+    rng = np.random.default_rng(seed)
+    image = np.full((size, size, 3), 255, np.uint8)
+    extractor = IncrementalExtractor()
+    extractor.reset(image)
+    
+    for i in range(strokes):
+        start = rng.integers(0, size, size=2)
+        end = start + rng.integers(-size // 2, size // 2, size=2)
+        thickness = int(rng.integers(1, 6))
+        cv2.line(image, tuple(map(int, start)), tuple(map(int, end)), (0, 0, 0), thickness)
+        region = (
+            int(min(start[0], end[0])) - thickness, int(min(start[1], end[1])) - thickness,
+            int(max(start[0], end[0])) + thickness + 1, int(max(start[1], end[1])) + thickness + 1
+        )
+        extractor.update(image, [region])
+        
+        _, full = extract_paths_from_sketch(image)
+        assert normalized(extractor.paths) == normalized(full), f"edit {i} differs"
+        assert np.array_equal(extractor.skeleton, skeletonize(binarize_sketch(image))), f"edit {i} skeleton differs"
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_long_strokes_crossing_the_window(seed):
+    # Strokes up to half the canvas long cross many earlier edits' windows
+    assert_matches_full_extraction(400, 40, seed)
+
+
+def test_short_strokes():
+    rng = np.random.default_rng(7)
+    image = np.full((300, 300, 3), 255, np.uint8)
+    extractor = IncrementalExtractor()
+    extractor.reset(image)
+    for _ in range(30):
+        x, y = (int(v) for v in rng.integers(10, 250, size=2))
+        cv2.line(image, (x, y), (x + 40, y + int(rng.integers(-20, 21))), (0, 0, 0), 3)
+        extractor.update(image, [(x - 3, y - 24, x + 44, y + 24)])
+    _, full = extract_paths_from_sketch(image)
+    assert normalized(extractor.paths) == normalized(full)
+
+
+def test_window_grows_over_whole_stroke():
+    mask = np.zeros((100, 200), np.uint8)
+    mask[50, 10:190] = 255
+    window = grow_region_over_strokes(mask, (90, 45, 110, 55), step=4)
+    assert window[0] <= 10 and window[2] >= 190
+    assert window[1] == 45 and window[3] == 55
@@ -0,0 +1,56 @@
+"""
+Job queue resubmission and lease expiry
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import JobQueue
+
+
+def make_queue(tmp_path, **kwargs):
+    sketch = tmp_path / "sketch.png"
+    sketch.write_bytes(b"sketch")
+    return JobQueue(str(tmp_path / "jobs.db"), **kwargs), str(sketch)
+
+
+def fail_job(queue, worker_id="w1"):
+    job = queue.claim(worker_id)
+    queue.fail(job["id"], worker_id, "boom")
+    return job
+
+
+def test_duplicate_submission_is_skipped(tmp_path):
+    queue, sketch = make_queue(tmp_path)
+    job_id, created = queue.submit(sketch)
+    assert created
+    assert queue.submit(sketch) == (job_id, False)
+
+
+def test_failed_job_can_be_resubmitted(tmp_path):
+    queue, sketch = make_queue(tmp_path, max_attempts=1)
+    job_id, _ = queue.submit(sketch)
+    fail_job(queue)
+    assert queue.status()["failed"] == 1
+    
+    assert queue.submit(sketch) == (job_id, True)
+    job = queue.claim("w2")
+    assert job["id"] == job_id
+    assert job["attempts"] == 1
+    assert job["error"] is None
+    assert job["finished_at"] is None
+
+
+def test_expired_lease_marks_final_attempt_finished(tmp_path):
+    queue, sketch = make_queue(tmp_path, lease_timeout=-1.0, max_attempts=1)
+    queue.submit(sketch)
+    job = queue.claim("w1")
+    
+    assert queue.requeue_stale() == 1
+    assert queue.status()["failed"] == 1
+    assert not queue.heartbeat(job["id"], "w1")
+    with queue._connect() as conn:
+        row = conn.execute("SELECT finished_at, error FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+    assert row["finished_at"] is not None
+    assert row["error"] == "worker lease expired"
@@ -0,0 +1,80 @@
+"""
+Joining broken strokes with join_paths
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_extraction import extract_paths_from_sketch, join_paths
+
+
+def line(start, end, steps=4):
+    """Straight path from start to end with evenly spaced integer points"""
+    xs = np.linspace(start[0], end[0], steps + 1).round().astype(int)
+    ys = np.linspace(start[1], end[1], steps + 1).round().astype(int)
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def test_gap_within_limit_is_bridged():
+    joined = join_paths([line((0, 0), (20, 0)), line((25, 0), (45, 0))], max_gap=8.0)
+    assert joined == [line((0, 0), (20, 0)) + line((25, 0), (45, 0))]
+
+
+def test_gap_beyond_limit_is_kept():
+    paths = [line((0, 0), (20, 0)), line((32, 0), (52, 0))]
+    assert len(join_paths(paths, max_gap=8.0)) == 2
+    assert len(join_paths(paths, max_gap=15.0)) == 1
+
+
+def test_turn_beyond_angle_limit_is_kept():
+    # The second stroke leaves the shared point 60 degrees off the first one's direction
+    bend = (20 + round(20 * np.cos(np.radians(60))), round(20 * np.sin(np.radians(60))))
+    paths = [line((0, 0), (20, 0)), line((20, 0), bend)]
+    assert len(join_paths(paths, max_angle=45.0)) == 2
+    assert len(join_paths(paths, max_angle=70.0)) == 1
+
+
+def test_chain_is_walked_end_to_end():
+    # Three pieces of one stroke, shuffled and partly reversed
+    paths = [line((40, 0), (60, 0)), line((20, 0), (0, 0)), line((22, 0), (38, 0))]
+    joined = join_paths(paths)
+    assert len(joined) == 1
+    xs = [x for x, _ in joined[0]]
+    if xs[0] > xs[-1]:
+        xs.reverse()
+    assert xs[0] == 0 and xs[-1] == 60
+    assert all(a < b for a, b in zip(xs, xs[1:]))
+
+
+def test_shared_endpoint_is_not_repeated():
+    joined = join_paths([line((0, 0), (20, 0)), line((20, 0), (40, 0))])
+    assert joined == [line((0, 0), (40, 0), steps=8)]
+
+
+def test_closed_paths_are_left_alone():
+    square = [(0, 0), (20, 0), (20, 20), (0, 20), (0, 0)]
+    joined = join_paths([square, line((0, 0), (-20, 0))])
+    assert square in joined
+    assert len(joined) == 2
+
+
+def test_min_length_applies_after_joining():
+    short_pieces = [line((0, 0), (6, 0), steps=2), line((8, 0), (14, 0), steps=2)]
+    isolated = line((100, 100), (106, 100), steps=2)
+    joined = join_paths(short_pieces + [isolated], min_length=10.0)
+    assert joined == [line((0, 0), (6, 0), steps=2) + line((8, 0), (14, 0), steps=2)]
+
+
+def test_joined_extraction_applies_min_points_after_joining():
+    image = np.full((120, 200, 3), 255, np.uint8)
+    for x in range(20, 170, 20):
+        cv2.line(image, (x, 60), (x + 14, 60), (0, 0, 0), 2)
+    
+    _, joined = extract_paths_from_sketch(image, True, 15.0, params={"min_contour_points": 40})
+    assert len(joined) == 1
+    _, dropped = extract_paths_from_sketch(image, True, 15.0, params={"min_contour_points": 400})
+    assert dropped == []
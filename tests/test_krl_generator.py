@@ -0,0 +1,77 @@
+"""
+Point table and motion compilation of the KRL generator
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from krl_generator import KRLGenerator, WORKSPACE_SCALE, compile_program, render_src
+
+
+def declared_points(dat_code):
+    """The (X, Y) of every DECL E6POS Pn in a .dat file"""
+    points = []
+    for line in dat_code.splitlines():
+        if line.startswith("DECL E6POS P"):
+            fields = dict(field.split() for field in line.split("{")[1].rstrip("}").split(","))
+            points.append((float(fields["X"]), float(fields["Y"])))
+    return points
+
+
+def test_repeated_point_after_unmerged_point_in_same_cell():
+    generator = KRLGenerator("X", dedupe_tolerance=5.0)
+    generator.generate_src_code([[(3, 3), (7, 7), (7, 7), (20, 20)]], "HOME", ["LIN"])
+    points = declared_points(generator.generate_dat_code())
+    assert len(points) == len(set(points)) == 3
+
+
+@pytest.mark.parametrize("tolerance", [0.5, 1.0, 2.5, 5.0, 10.0])
+def test_repeated_points_are_declared_once(tolerance):
+    rng = np.random.default_rng(int(tolerance * 10))
+    base = [tuple(point) for point in rng.uniform(0, 200, size=(60, 2)).round(1).tolist()]
+    # Every point twice, in a different order the second time
+    path = base + [base[i] for i in rng.permutation(len(base))]
+    
+    program = compile_program([path], "HOME", ["LIN"], dedupe_tolerance=tolerance)
+    points = program.point_list()
+    
+    assert len(points) == len(set(points))
+    for x, y in base:
+        # Every source point maps to a stored point within tolerance
+        assert min((px - x) ** 2 + (py - y) ** 2 for px, py in points) <= tolerance ** 2
+    for i, (x, y) in enumerate(points):
+        for px, py in points[i + 1:]:
+            assert (px - x) ** 2 + (py - y) ** 2 > tolerance ** 2
+
+
+def src_point_numbers(src_code):
+    """The P numbers referenced by motion lines, in order"""
+    numbers = []
+    for line in src_code.splitlines():
+        fields = line.replace(",", " ").split()
+        if fields and fields[0] in ("LIN", "PTP", "CIRC", "SPL"):
+            numbers.extend(int(field[1:]) for field in fields[1:] if field.startswith("P"))
+    return numbers
+
+
+@pytest.mark.parametrize("length", range(3, 12))
+def test_circ_programs_every_vertex(length):
+    path = [(10 * i, (i % 3) * 7) for i in range(length)]
+    generator = KRLGenerator("X")
+    src_code = generator.generate_src_code([path], "HOME", ["CIRC"])
+    points = declared_points(generator.generate_dat_code())
+    
+    # Every source vertex is declared and reached in order, each once
+    reached = [points[number - 1] for number in src_point_numbers(src_code)]
+    assert reached == [(x * WORKSPACE_SCALE, y * WORKSPACE_SCALE) for x, y in path]
+    assert "CIRC" in src_code
+
+
+def test_circ_uses_previous_point_as_start():
+    program = compile_program([[(0, 0), (10, 10), (20, 0), (30, 10)]], "HOME", ["CIRC"])
+    motions = [line.strip() for line in render_src(program).splitlines() if line.strip().startswith(("LIN", "CIRC"))]
+    assert motions == ["LIN P1", "CIRC P2, P3", "LIN P4"]
@@ -0,0 +1,116 @@
+"""
+Re-optimizing programs written by KRLGenerator
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from krl_generator import KRLGenerator
+from krl_import import (
+    KRLParseError, commands_to_paths, load_program, parse_dat, parse_src, reoptimize_program, split_layers
+)
+
+# A zig-zag with an extra point halfway along every segment, so simplification has work to do
+ZIGZAG = [(20 + 20 * i, 60 if i % 2 else 20) for i in range(6)]
+PATHS = [
+    [point for a, b in zip(ZIGZAG, ZIGZAG[1:]) for point in (a, ((a[0] + b[0]) // 2, (a[1] + b[1]) // 2))]
+    + [ZIGZAG[-1]],
+    [(200, 200), (240, 200), (240, 240), (200, 240), (200, 280), (240, 280)]
+]
+
+
+def write_program(tmp_path, generate):
+    """Write a program produced by a generator call and return its .src path"""
+    krl_gen = KRLGenerator("LEGACY")
+    src_code = generate(krl_gen)
+    src_path = tmp_path / "legacy.src"
+    src_path.write_text(src_code)
+    (tmp_path / "legacy.dat").write_text(krl_gen.generate_dat_code())
+    return str(src_path)
+
+
+def round_trip(tmp_path, motion_types, layers=None):
+    if layers:
+        tools = {"black": 1, "red": 2}
+        src_path = write_program(
+            tmp_path, lambda krl_gen: krl_gen.generate_layered_src_code(layers, "HOME", motion_types, tools)
+        )
+    else:
+        src_path = write_program(tmp_path, lambda krl_gen: krl_gen.generate_src_code(PATHS, "HOME", motion_types))
+    report = reoptimize_program(src_path, str(tmp_path / "out"))
+    return src_path, report
+
+
+def read_output(report):
+    with open(report["output"]) as f:
+        src_code = f.read()
+    with open(os.path.splitext(report["output"])[0] + ".dat") as f:
+        points = parse_dat(f.read())
+    return src_code, points
+
+
+def program_vertices(points):
+    return {(round(x), round(y)) for x, y, _ in points.values()}
+
+
+@pytest.mark.parametrize("motion_types", [["LIN"], ["CIRC"], ["SPLINE"], ["LIN", "CIRC"]])
+def test_program_round_trip_keeps_the_drawing(tmp_path, motion_types):
+    _, report = round_trip(tmp_path, motion_types)
+    before, after = report["before"], report["after"]
+    
+    # The midpoints are gone, the corners and the drawn length are kept
+    assert 0 < after["points"] < before["points"]
+    assert after["path_length_mm"] == pytest.approx(before["path_length_mm"], abs=0.5)
+    _, points = read_output(report)
+    corners = {(2 * x, 2 * y) for x, y in ZIGZAG + PATHS[1]}
+    assert corners <= program_vertices(points)
+
+
+def test_ptp_only_program_keeps_its_points(tmp_path):
+    src_path, report = round_trip(tmp_path, ["PTP"])
+    _, layers, _ = load_program(src_path)
+    assert [len(paths) for _, _, paths in layers] == [1]
+    
+    src_code, _ = read_output(report)
+    assert report["before"]["points"] == sum(len(path) for path in PATHS)
+    assert report["after"]["points"] > 0
+    assert "LIN P1" in src_code
+    assert report["after"]["path_length_mm"] == pytest.approx(report["before"]["path_length_mm"], abs=0.5)
+
+
+def test_ptp_after_drawing_moves_starts_a_new_path(tmp_path):
+    src_path = write_program(tmp_path, lambda krl_gen: krl_gen.generate_src_code(PATHS, "HOME", ["LIN"]))
+    text = open(src_path).read().replace("LIN P12", "PTP P12")
+    _, commands = parse_src(text)
+    with open(os.path.splitext(src_path)[0] + ".dat") as f:
+        points = parse_dat(f.read())
+    assert [len(path) for path in commands_to_paths(commands, points)] == [11, 6]
+
+
+def test_layered_program_keeps_layers_and_tools(tmp_path):
+    layers = {"black": [PATHS[0]], "red": [PATHS[1]]}
+    _, report = round_trip(tmp_path, ["LIN"], layers)
+    src_code, points = read_output(report)
+    
+    assert "DEF LAYER_BLACK()\n   BAS (#TOOL,1)" in src_code
+    assert "DEF LAYER_RED()\n   BAS (#TOOL,2)" in src_code
+    _, commands = parse_src(src_code)
+    by_layer = {
+        name: {(round(points[n][0]), round(points[n][1])) for _, names in layer_commands for n in names if n in points}
+        for name, tool, layer_commands in split_layers(commands) if name is not None
+    }
+    assert {(2 * x, 2 * y) for x, y in ZIGZAG} <= by_layer["black"]
+    assert {(2 * x, 2 * y) for x, y in PATHS[1]} == by_layer["red"]
+    assert report["after"]["points"] < report["before"]["points"]
+
+
+def test_program_without_drawable_paths_is_an_error(tmp_path):
+    src_path = tmp_path / "empty.src"
+    src_path.write_text("DEF EMPTY()\n   BAS (#INITMOV,0)\n   PTP HOME\n   PTP HOME\nEND\n")
+    (tmp_path / "empty.dat").write_text("DEFDAT EMPTY\nENDDAT\n")
+    with pytest.raises(KRLParseError):
+        reoptimize_program(str(src_path), str(tmp_path / "out"))
+    assert not os.path.exists(tmp_path / "out" / "empty.src")
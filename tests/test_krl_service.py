@@ -0,0 +1,136 @@
+"""
+HTTP conversion service: admission, deadlines and the /convert endpoint
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import krl_service
+from krl_service import KRLService, RequestError
+
+
+def slow_convert(release, *args):
+    """Stand-in for convert_sketch that blocks until released"""
+    release.wait(5)
+    return {"src": "", "dat": "", "path_count": 0}
+
+
+def sketch_bytes():
+    image = np.full((120, 160, 3), 255, np.uint8)
+    cv2.line(image, (20, 20), (140, 100), (0, 0, 0), 3)
+    cv2.circle(image, (60, 70), 25, (0, 0, 0), 2)
+    ok, buffer = cv2.imencode(".png", image)
+    return buffer.tobytes()
+
+
+def thread_service(workers, queue_limit, timeout):
+    """A service whose jobs run on threads, so tests can control them"""
+    service = KRLService(workers=workers, queue_limit=queue_limit, timeout=timeout)
+    service.executor = ThreadPoolExecutor(max_workers=workers)
+    service.slots = asyncio.Semaphore(workers)
+    return service
+
+
+def test_timed_out_job_stays_pending_until_its_worker_finishes(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(krl_service, "convert_sketch", lambda *args: slow_convert(release, *args))
+    
+    async def scenario():
+        service = thread_service(workers=1, queue_limit=0, timeout=0.1)
+        with pytest.raises(RequestError) as timed_out:
+            await service.submit(b"x")
+        assert timed_out.value.status == 504
+        
+        # The worker is still busy, so there is no room for another job
+        assert service.pending == 1
+        assert service.metrics()["busy_workers"] == 1
+        with pytest.raises(RequestError) as rejected:
+            await service.submit(b"x")
+        assert rejected.value.status == 429
+        
+        release.set()
+        for _ in range(100):
+            if service.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert service.pending == 0 and service.busy_workers == 0
+        assert service.metrics()["queued"] == 0
+        service.executor.shutdown()
+    
+    asyncio.run(scenario())
+
+
+def test_job_timing_out_in_the_queue_frees_its_place(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(krl_service, "convert_sketch", lambda *args: slow_convert(release, *args))
+    
+    async def scenario():
+        service = thread_service(workers=1, queue_limit=1, timeout=0.2)
+        running = asyncio.ensure_future(service.submit(b"x"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(RequestError):
+            await service.submit(b"x")
+        # The queued job never reached a worker; only the running one counts
+        assert service.pending == 1
+        assert service.metrics()["queued"] == 0
+        
+        release.set()
+        with pytest.raises(RequestError):
+            await running
+        for _ in range(100):
+            if service.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert service.pending == 0
+        service.executor.shutdown()
+    
+    asyncio.run(scenario())
+
+
+def test_convert_endpoint():
+    async def request(port, head, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        status_line, _, rest = response.partition(b"\r\n")
+        return int(status_line.split()[1]), rest.partition(b"\r\n\r\n")[2]
+    
+    async def scenario():
+        service = KRLService(workers=1, queue_limit=1, timeout=60)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            image = sketch_bytes()
+            status, body = await request(
+                port,
+                f"POST /convert?format=src&program=TEST HTTP/1.1\r\nContent-Length: {len(image)}\r\n\r\n",
+                image
+            )
+            assert status == 200
+            assert body.startswith(b"DEF TEST")
+            
+            status, body = await request(port, "POST /convert?format=xml HTTP/1.1\r\nContent-Length: 1\r\n\r\n", b"x")
+            assert status == 400
+            
+            status, body = await request(port, "GET /metrics HTTP/1.1\r\n\r\n")
+            metrics = json.loads(body)
+            assert metrics["counters"]["completed"] == 1
+            assert metrics["queued"] == 0
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+    
+    asyncio.run(scenario())
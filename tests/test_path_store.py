@@ -0,0 +1,96 @@
+"""
+Path file round trips and the memory-mapped loader
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import path_store
+from path_extraction import extraction_params
+from path_store import PathSet, load_paths, read_header, save_paths
+
+
+INT_PATHS = [[(0, 0), (10, 5), (20, 0)], [(3, 4), (5, 6)], [], [(-7, 9)]]
+
+
+def is_mapped(array):
+    """Whether an array is a view into a memory-mapped file"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def test_integer_paths_round_trip(tmp_path):
+    file_path = str(tmp_path / "int.skpaths")
+    save_paths(file_path, INT_PATHS)
+    loaded = load_paths(file_path)
+    assert loaded.coords.dtype == np.int32
+    assert len(loaded) == len(INT_PATHS)
+    assert loaded.to_list() == INT_PATHS
+
+
+def test_float_paths_round_trip(tmp_path):
+    paths = [[(0.5, 1.25), (2.75, 3.5)], [(10.0, -4.5)]]
+    file_path = str(tmp_path / "float.skpaths")
+    save_paths(file_path, paths)
+    loaded = load_paths(file_path)
+    assert loaded.coords.dtype == np.float32
+    assert loaded.to_list() == paths
+
+
+def test_header_records_source_and_params(tmp_path):
+    image = np.zeros((8, 8, 3), np.uint8)
+    file_path = str(tmp_path / "meta.skpaths")
+    written = save_paths(file_path, INT_PATHS, source_image=image, params={"join_strokes": True})
+    header = read_header(file_path)
+    assert header == written
+    assert header["source_sha256"] == path_store.image_fingerprint(image)
+    assert header["params"] == {"join_strokes": True}
+    assert header["num_paths"] == 4 and header["num_points"] == 6
+    assert header["coords_offset"] % 64 == 0 and header["offsets_offset"] % 8 == 0
+
+
+def test_loader_maps_the_file_without_copying(tmp_path):
+    file_path = str(tmp_path / "map.skpaths")
+    save_paths(file_path, PathSet.from_paths(INT_PATHS))
+    loaded = load_paths(file_path)
+    assert is_mapped(loaded.coords) and is_mapped(loaded.offsets)
+    assert not loaded.coords.flags.writeable
+    # Indexing returns views into the mapped coordinates
+    assert np.shares_memory(loaded[0], loaded.coords)
+    assert loaded[-1].tolist() == [[-7, 9]]
+    assert [path.tolist() for path in loaded[1:3]] == [[[3, 4], [5, 6]], []]
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    file_path = tmp_path / "other.skpaths"
+    file_path.write_bytes(b"not a path file")
+    with pytest.raises(ValueError):
+        read_header(str(file_path))
+
+
+def test_extract_command_records_every_setting(tmp_path, monkeypatch):
+    image = np.full((120, 120, 3), 255, np.uint8)
+    cv2.line(image, (10, 10), (110, 100), (0, 0, 0), 3)
+    image_path = str(tmp_path / "sketch.png")
+    cv2.imwrite(image_path, image)
+    output = str(tmp_path / "sketch.skpaths")
+    
+    monkeypatch.setattr(sys, "argv", [
+        "path_store.py", "extract", image_path, output, "--join", "--join-gap", "12"
+    ])
+    path_store.main()
+    
+    header = read_header(output)
+    assert header["params"] == {
+        **extraction_params(), "join_strokes": True, "join_gap": 12.0, "join_angle": 45.0
+    }
+    assert header["source_sha256"] == path_store.image_fingerprint(cv2.imread(image_path, cv2.IMREAD_COLOR))
+    assert len(load_paths(output)) == header["num_paths"] > 0
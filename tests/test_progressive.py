@@ -0,0 +1,43 @@
+"""
+Background refinement jobs
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progressive import RefinementJob
+
+
+def sketch():
+    image = np.full((200, 200, 3), 255, np.uint8)
+    cv2.rectangle(image, (30, 40), (160, 170), (0, 0, 0), 3)
+    return image
+
+
+def test_finished_job_releases_its_image():
+    job = RefinementJob("key", "session", sketch())
+    assert job.wait(30)
+    processed_image, paths = job.result()
+    assert paths
+    assert job._image is None
+
+
+def test_cancelled_job_releases_its_image():
+    job = RefinementJob("key", "session", sketch())
+    job.cancel()
+    assert job._image is None
+    assert job.result() is None
+    assert not job.done()
+
+
+def test_failed_extraction_is_raised_by_result():
+    job = RefinementJob("key", "session", np.zeros((0, 0, 3), np.uint8))
+    job.wait(30)
+    with pytest.raises(Exception):
+        job.result()
+    assert job._image is None
@@ -0,0 +1,65 @@
+"""
+Image store budgets, expiry and pinned images
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawing_canvas import CanvasBuffer
+from session_store import ImageStore
+
+
+def noise(seed, size=64):
+    return np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+def test_budget_evicts_least_recently_used():
+    store = ImageStore(session_budget_bytes=20000)
+    for i in range(4):
+        store.put("s", f"image{i}", noise(i))
+    assert not store.has("s", "image0")
+    assert store.has("s", "image3")
+    assert store.evictions > 0
+
+
+def test_pinned_image_survives_budgets():
+    store = ImageStore(session_budget_bytes=20000, global_budget_bytes=20000)
+    store.put("s", "canvas", noise(0), pinned=True)
+    for i in range(1, 5):
+        store.put("s", f"image{i}", noise(i))
+        store.put("other", f"image{i}", noise(10 + i))
+    assert np.array_equal(store.get("s", "canvas"), noise(0))
+
+
+def test_pinned_image_survives_session_expiry():
+    store = ImageStore(session_ttl=0.01)
+    store.put("idle", "canvas", noise(0), pinned=True)
+    store.put("idle", "original_image", noise(1))
+    time.sleep(0.05)
+    store.put("active", "original_image", noise(2))
+    assert store.has("idle", "canvas")
+    assert not store.has("idle", "original_image")
+    
+    store.drop_session("idle")
+    assert store.stats()["pinned"] == 0
+
+
+def test_restored_canvas_decodes_pixels_on_first_use():
+    canvas = CanvasBuffer(40, 30)
+    canvas.draw_line((0, 0), (39, 29), (0, 0, 0), 3)
+    loads = []
+    
+    def load_pixels():
+        loads.append(1)
+        return canvas.pixels.copy()
+    
+    restored = CanvasBuffer.restore(canvas.state(), load_pixels, canvas.to_png())
+    assert restored.to_png() == canvas.to_png()
+    assert not loads
+    assert np.array_equal(restored.to_array(), canvas.pixels)
+    restored.draw_circle((20, 15), 5, (255, 0, 0), 1)
+    assert len(loads) == 1
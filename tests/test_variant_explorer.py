@@ -0,0 +1,64 @@
+"""
+Variant scoring and ranking
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from krl_generator import compile_program
+from variant_explorer import explore_variants, missed_vertices, rank_variants, score_variant
+
+
+PATHS = [
+    [(10 * i, 20 + (i % 4) * 5) for i in range(12)],
+    [(50, 100), (80, 130), (120, 110), (150, 160), (190, 140)]
+]
+
+
+def test_every_variant_reaches_every_vertex():
+    for result in explore_variants(PATHS, max_workers=1):
+        assert result["missed_points"] == 0, result["motion_types"]
+
+
+def test_lost_vertices_are_counted():
+    program = compile_program([path[::2] for path in PATHS], "HOME", ["LIN"])
+    assert missed_vertices(PATHS, program) == sum(len(path) // 2 for path in PATHS)
+
+
+def test_lossy_variant_never_ranks_first():
+    lossless = score_variant(PATHS, {"motion_types": ["LIN"], "start_position": "HOME", "dedupe_tolerance": None})
+    lossy = dict(lossless, points=1, dat_bytes=1, path_length=1.0, missed_points=3)
+    assert rank_variants([lossy, lossless])[0] is lossless
+
+
+def test_ptp_ranks_after_lin():
+    variants = [
+        {"motion_types": ["PTP"], "start_position": "HOME", "dedupe_tolerance": None},
+        {"motion_types": ["LIN"], "start_position": "HOME", "dedupe_tolerance": None}
+    ]
+    ranked = explore_variants(PATHS, variants, max_workers=1)
+    assert ranked[0]["motion_types"] == ["LIN"]
+    assert ranked[0]["score"] < ranked[1]["score"]
+
+
+def test_small_sketch_is_scored_without_the_pool(monkeypatch):
+    import variant_explorer
+    
+    def no_pool(workers):
+        raise AssertionError("small sketches must not start a pool")
+    
+    monkeypatch.setattr(variant_explorer, "get_variant_executor", no_pool)
+    assert len(explore_variants(PATHS, max_workers=4)) == len(variant_explorer.enumerate_variants())
+
+
+def test_pool_is_reused_and_matches_serial_ranking(monkeypatch):
+    import variant_explorer
+    
+    monkeypatch.setattr(variant_explorer, "PARALLEL_MIN_WORK", 0)
+    serial = explore_variants(PATHS, max_workers=1)
+    parallel = explore_variants(PATHS, max_workers=2)
+    executor = variant_explorer.get_variant_executor(2)
+    assert explore_variants(PATHS, max_workers=2) == parallel
+    assert variant_explorer.get_variant_executor(2) is executor
+    assert parallel == serial
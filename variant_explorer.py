@@ -0,0 +1,344 @@
+"""
+Variant explorer: generate and rank programs for many option combinations
+
+Instead of guessing motion types and start position and regenerating by
+hand, every combination is generated and scored on point count, .dat size,
+the length of the programmed path and how much of it is left to PTP moves.
+Variants that lose source vertices rank last. Large sketches are scored on
+a process pool that is started once and kept; small ones are scored
+serially, since handing them to the pool costs more than it saves.
+
+Usage:
+    python variant_explorer.py sketch.png --top 10
+"""
+import argparse
+import math
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import combinations, product
+
+from lazy_imports import lazy_import
+from path_extraction import extract_paths_from_sketch
+from krl_generator import (
+    compile_program, compile_layered_program, render_dat,
+    OP_HOME, OP_START, OP_PTP, OP_LIN, OP_CIRC, OP_SPL
+)
+from conversion import MOTION_TYPES, START_POSITIONS
+
+cv2 = lazy_import("cv2")
+
+# Relative weight of each metric in the combined score
+DEFAULT_WEIGHTS = {"points": 1.0, "dat_bytes": 1.0, "path_length": 1.0, "ptp_share": 1.0}
+
+# Metrics scored relative to their best value over all variants; the others
+# are already fractions and are scored as they are
+RELATIVE_METRICS = ("points", "dat_bytes", "path_length")
+
+# Paths with fewer points are skipped by every variant
+MIN_PATH_POINTS = 3
+
+# A source vertex counts as reached when a programmed point is this close (pixels)
+FIDELITY_TOLERANCE = 1.0
+
+# Path points times variants below which scoring serially is faster than the pool
+# (about 10 us per point and variant against the cost of shipping chunks to workers)
+PARALLEL_MIN_WORK = 50000
+
+def enumerate_variants(motion_types=MOTION_TYPES, start_positions=START_POSITIONS, dedupe_tolerances=(None, 1.0)):
+    """
+    List every option combination worth generating
+    
+    Motion types are used in the order given, so each non-empty subset is
+    tried once in that order.
+    
+    Args:
+        motion_types: Motion types to combine
+        start_positions: Start positions to try
+        dedupe_tolerances: Point merge tolerances to try (None disables merging)
+    
+    Returns:
+        variants: List of dictionaries with "motion_types", "start_position"
+            and "dedupe_tolerance"
+    """
+    subsets = [
+        list(subset)
+        for size in range(1, len(motion_types) + 1)
+        for subset in combinations(motion_types, size)
+    ]
+    return [
+        {"motion_types": subset, "start_position": start, "dedupe_tolerance": tolerance}
+        for subset, start, tolerance in product(subsets, start_positions, dedupe_tolerances)
+    ]
+
+def program_lengths(program):
+    """
+    Measure the distance travelled through the programmed points
+    
+    Moves to HOME count as moves to the origin; a program starting from
+    the current position (PTP P0) starts measuring at its first point.
+    
+    Args:
+        program: Compiled MotionProgram
+    
+    Returns:
+        length: Path length in pixels
+        ptp_length: Part of the length travelled by PTP moves, whose path
+            between points is not controlled
+    """
+    points = program.points.tolist()
+    previous = None
+    length = ptp_length = 0.0
+    for opcode, a, b in program.commands.tolist():
+        if opcode == OP_HOME:
+            targets = [(0.0, 0.0)]
+        elif opcode == OP_START:
+            previous = None
+            continue
+        elif opcode in (OP_PTP, OP_LIN, OP_SPL):
+            targets = [points[a]]
+        elif opcode == OP_CIRC:
+            targets = [points[a], points[b]]
+        else:
+            continue
+        
+        for target in targets:
+            if previous is not None:
+                step = math.hypot(target[0] - previous[0], target[1] - previous[1])
+                length += step
+                if opcode == OP_PTP:
+                    ptp_length += step
+            previous = target
+    return length, ptp_length
+
+def programmed_path_length(program):
+    """
+    Measure the distance travelled through the programmed points
+    
+    Args:
+        program: Compiled MotionProgram
+    
+    Returns:
+        length: Path length in pixels (see program_lengths)
+    """
+    return program_lengths(program)[0]
+
+def missed_vertices(paths, program, tolerance=FIDELITY_TOLERANCE):
+    """
+    Count source vertices that no programmed point reaches
+    
+    Args:
+        paths: Paths the program was compiled from
+        program: Compiled MotionProgram
+        tolerance: Largest distance in pixels that counts as reached
+    
+    Returns:
+        missed: Number of vertices of paths with at least MIN_PATH_POINTS
+            points that have no programmed point within tolerance
+    """
+    grid = defaultdict(list)
+    for x, y in program.points.tolist():
+        grid[math.floor(x / tolerance), math.floor(y / tolerance)].append((x, y))
+    
+    missed = 0
+    for path in paths:
+        if len(path) < MIN_PATH_POINTS:
+            continue
+        for x, y in path:
+            cell_x, cell_y = math.floor(x / tolerance), math.floor(y / tolerance)
+            if not any(
+                (px - x) ** 2 + (py - y) ** 2 <= tolerance ** 2
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                for px, py in grid.get((cell_x + dx, cell_y + dy), ())
+            ):
+                missed += 1
+    return missed
+
+def score_variant(paths, variant, layers=None):
+    """
+    Compile one variant and measure it
+    
+    Only the .dat file is rendered; point count, path lengths and missed
+    vertices come straight from the compiled program.
+    
+    Args:
+        paths: List of paths as coordinate points
+        variant: Dictionary as returned by enumerate_variants
+        layers: Optional mapping of layer name to paths; when given, a
+            layered program is compiled instead
+    
+    Returns:
+        result: The variant extended with "points", "dat_bytes", "path_length",
+            "ptp_share" (fraction of the path length moved by PTP) and
+            "missed_points" (source vertices not reached)
+    """
+    if layers:
+        program = compile_layered_program(
+            layers, variant["start_position"], variant["motion_types"],
+            dedupe_tolerance=variant["dedupe_tolerance"], min_path_points=MIN_PATH_POINTS
+        )
+        paths = [path for layer_paths in layers.values() for path in layer_paths]
+    else:
+        program = compile_program(
+            paths, variant["start_position"], variant["motion_types"],
+            dedupe_tolerance=variant["dedupe_tolerance"], min_path_points=MIN_PATH_POINTS
+        )
+    
+    length, ptp_length = program_lengths(program)
+    result = dict(variant)
+    result["points"] = len(program.points)
+    result["dat_bytes"] = len(render_dat(program).encode())
+    result["path_length"] = length
+    result["ptp_share"] = ptp_length / length if length else 0.0
+    result["missed_points"] = missed_vertices(paths, program)
+    return result
+
+def _score_chunk(paths, layers, variants):
+    """Score several variants in one worker call so the paths are sent once"""
+    return [score_variant(paths, variant, layers) for variant in variants]
+
+def rank_variants(results, weights=None):
+    """
+    Order scored variants, best first
+    
+    Point count, .dat size and path length are divided by their best
+    value over all variants and the PTP share is added as it is, so with
+    the default weights 3.0 means best on every metric and no PTP moves.
+    Variants that miss source vertices always rank after those that reach
+    every one, however small their programs are.
+    
+    Args:
+        results: Scored variants as returned by score_variant
+        weights: Mapping of metric name to weight (defaults to DEFAULT_WEIGHTS)
+    
+    Returns:
+        ranked: The results sorted by score, each with "score" and "rank"
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    best = {
+        metric: min(result[metric] for result in results)
+        for metric in weights if metric in RELATIVE_METRICS
+    }
+    
+    for result in results:
+        result["score"] = round(sum(
+            weight * (
+                (result[metric] / best[metric] if best[metric] else 1.0)
+                if metric in RELATIVE_METRICS else result[metric]
+            )
+            for metric, weight in weights.items()
+        ), 3)
+    
+    ranked = sorted(results, key=lambda result: (result["missed_points"], result["score"]))
+    for rank, result in enumerate(ranked, 1):
+        result["rank"] = rank
+    return ranked
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def get_variant_executor(workers):
+    """
+    Get the process-wide pool that scores variants, starting it on first use
+    
+    Starting worker processes costs more than scoring a typical sketch, so
+    the pool is kept for the life of the process and only replaced when a
+    caller needs more workers than it has.
+    
+    Args:
+        workers: Worker processes the caller wants to use
+    
+    Returns:
+        executor: The shared ProcessPoolExecutor
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers < workers:
+            if _executor is not None:
+                # Jobs already submitted to the old pool still finish
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_workers = workers
+        return _executor
+
+def _discard_executor(executor):
+    """Forget a pool whose workers died, so the next call starts a fresh one"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+            _executor_workers = 0
+    executor.shutdown(wait=False)
+
+def explore_variants(paths, variants=None, layers=None, max_workers=None, weights=None):
+    """
+    Generate and rank program variants concurrently
+    
+    Args:
+        paths: List of paths as coordinate points
+        variants: Variants to try (defaults to enumerate_variants())
+        layers: Optional mapping of layer name to paths for layered programs
+        max_workers: Worker processes (defaults to the CPU count); sketches
+            below PARALLEL_MIN_WORK are always scored in this process
+        weights: Mapping of metric name to weight
+    
+    Returns:
+        ranked: Scored variants, best first (see rank_variants)
+    """
+    variants = variants if variants is not None else enumerate_variants()
+    if not variants:
+        return []
+    
+    paths = [list(path) for path in paths]
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(variants)))
+    scored_paths = [path for layer_paths in layers.values() for path in layer_paths] if layers else paths
+    work = len(variants) * sum(len(path) for path in scored_paths)
+    if workers == 1 or work < PARALLEL_MIN_WORK:
+        return rank_variants(_score_chunk(paths, layers, variants), weights)
+    
+    # One chunk per worker keeps pickling the paths to a minimum
+    chunks = [variants[i::workers] for i in range(workers)]
+    executor = get_variant_executor(workers)
+    try:
+        chunk_results = list(executor.map(_score_chunk, [paths] * workers, [layers] * workers, chunks))
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        return rank_variants(_score_chunk(paths, layers, variants), weights)
+    
+    # Restore the original order so ties rank the same for any worker count
+    results = [None] * len(variants)
+    for i, chunk in enumerate(chunk_results):
+        results[i::workers] = chunk
+    
+    return rank_variants(results, weights)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and rank KRL program variants for a sketch")
+    parser.add_argument("image", help="Sketch image")
+    parser.add_argument("--top", type=int, default=10, help="Number of variants to print")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    args = parser.parse_args()
+    
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        parser.error(f"Could not read image: {args.image}")
+    
+    _, paths = extract_paths_from_sketch(image)
+    ranked = explore_variants(paths, max_workers=args.workers)
+    
+    print(f"{'rank':>4}  {'score':>6}  {'points':>6}  {'dat':>8}  {'length':>9}  {'ptp':>4}  {'missed':>6}  "
+          f"start     dedupe  motion")
+    for result in ranked[:args.top]:
+        print(
+            f"{result['rank']:>4}  {result['score']:>6.3f}  {result['points']:>6}  "
+            f"{result['dat_bytes']:>8}  {result['path_length']:>9.1f}  {result['ptp_share']:>4.0%}  "
+            f"{result['missed_points']:>6}  "
+            f"{result['start_position']:<8}  {str(result['dedupe_tolerance']):<6}  "
+            f"{','.join(result['motion_types'])}"
+        )
+
+if __name__ == "__main__":
+    main()